@@ -1,33 +1,78 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
+import json
 import os
+import queue
+import threading
+import uuid
 from pdf_parser import PDFParser
-from translator import PDFTranslator
+from translator import get_translator, TranslationCancelled
+from client_pool import get_client_pool
+from translation_memory import get_translation_memory
+from translation_cache import get_translation_cache
+from document_store import get_document_store, is_file_id
+from job_manager import FINISHED_STATUSES, get_job_manager
+from metrics import REGISTRY, read_job_trace, trace_context
+from rate_limiter import get_rate_limiter
+from upload_store import UploadError, get_upload_store
+from compression import init_compression, send_static
+from pdf_writer import EXPORT_LAYOUTS
 from config import Config
 
 # 开发模式：前端在3000端口，后端在5000端口
-# 生产模式：前端构建后放在dist目录
-if os.path.exists('frontend/dist'):
-    app = Flask(__name__, static_folder='frontend/dist', static_url_path='')
-else:
-    app = Flask(__name__)
+# 生产模式：前端构建后放在frontend/dist目录，由serve_static发送（预压缩文件和缓存头）
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'frontend', 'dist')
+app = Flask(__name__, static_folder=None)
+# 进程准备退出时置位（gunicorn收到SIGTERM时由wsgi.begin_shutdown设置），SSE连接随即结束，不占用平滑停止的时间
+SHUTDOWN_EVENT = threading.Event()
 
 CORS(app)  # 允许跨域请求
 
 app.config['UPLOAD_FOLDER'] = Config.UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = Config.MAX_CONTENT_LENGTH
+init_compression(app)  # 按Accept-Encoding压缩JSON响应（gzip/br）
 
 # 确保上传目录存在
 os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
 
+# 启动时创建共享客户端（连接池和代理健康检查），避免在请求路径上初始化
+if Config.API_KEY:
+    try:
+        get_client_pool()
+    except Exception as e:
+        print(f"⚠️  警告: 客户端初始化失败 ({str(e)})")
+
+    # 启动任务管理器，从检查点继续上次中断的任务（debug模式下跳过负责重载的父进程）
+    if __name__ != '__main__' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        get_job_manager()
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
 
+def request_user(data=None):
+    """请求方标识，用于在用户之间公平分配翻译名额：请求体中的user、X-User-Id请求头，或客户端地址"""
+    return (data or {}).get('user') or request.headers.get('X-User-Id') or request.remote_addr
+
+def ensure_parsed(file_id):
+    """
+    确保已上传的文件已解析并存入文档存储，相同内容的文件只会解析一次
+    文件路径由file_id从上传存储推导，不接受客户端提供的路径；文件不存在时返回False
+    """
+    store = get_document_store()
+    if store.has(file_id):
+        return True
+    upload_store = get_upload_store()
+    if not upload_store.has_content(file_id):
+        return False
+    store.save(file_id, PDFParser(upload_store.content_path(file_id)).extract_text())
+    return True
+
 @app.route('/')
 def index():
-    if app.static_folder and os.path.exists(os.path.join(app.static_folder, 'index.html')):
-        return send_from_directory(app.static_folder, 'index.html')
+    if os.path.exists(os.path.join(STATIC_FOLDER, 'index.html')):
+        # index.html每次重新验证，使部署新版本后立即生效
+        return send_static(STATIC_FOLDER, 'index.html')
     else:
         # 开发模式，返回简单提示
         return jsonify({
@@ -35,10 +80,27 @@ def index():
             'frontend': '请访问 http://localhost:3000 查看前端界面',
             'api_docs': {
                 'upload': '/api/upload (POST)',
-                'translate': '/api/translate (POST)'
+                'document_pages': '/api/documents/<file_id>/pages (GET, ?start=&end=&limit=)',
+                'chunked_upload': '/api/uploads (POST), /api/uploads/<upload_id> (GET, PUT)',
+                'translate': '/api/translate (POST)',
+                'translate_stream': '/api/translate/stream (GET, Server-Sent Events)',
+                'jobs': '/api/jobs (POST, 修订版传parent_job_id或parent_file_id), /api/jobs/<job_id> (GET), '
+                        '/api/jobs/<job_id>/result (GET), /api/jobs/<job_id>/cancel (POST), '
+                        '/api/jobs/<job_id>/resume (POST), '
+                        '/api/jobs/<job_id>/export (GET, PDF, ?layout=bilingual|translated), '
+                        '/api/jobs/<job_id>/trace (GET)',
+                'batches': '/api/batches (POST, multipart files 或 JSON documents), /api/batches/<batch_id> (GET), '
+                           '/api/batches/<batch_id>/cancel (POST)',
+                'metrics': '/metrics (GET, Prometheus)'
             }
         })
 
+@app.route('/<path:filename>')
+def serve_static(filename):
+    # vite构建的assets/下的文件名带内容哈希，可以长期缓存
+    max_age = Config.STATIC_MAX_AGE if filename.startswith('assets/') else 0
+    return send_static(STATIC_FOLDER, filename, max_age)
+
 @app.route('/api/upload', methods=['POST'])
 @app.route('/upload', methods=['POST'])  # 保持向后兼容
 def upload_file():
@@ -50,59 +112,514 @@ def upload_file():
         return jsonify({'error': '未选择文件'}), 400
 
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-
         try:
-            # 解析PDF
-            parser = PDFParser(filepath)
-            pdf_data = parser.extract_text()
-
-            return jsonify({
-                'success': True,
-                'filename': filename,
-                'filepath': filepath,
-                'total_pages': pdf_data['total_pages'],
-                'pages': pdf_data['pages']
-            })
+            # 边读取边计算哈希，按内容保存，同名文件不会互相覆盖
+            file_id, _ = get_upload_store().save_stream(file.stream)
+            return jsonify(upload_result(secure_filename(file.filename), file_id))
+        except UploadError as e:
+            return jsonify({'error': str(e)}), e.status
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
     return jsonify({'error': '不支持的文件类型'}), 400
 
+def upload_result(filename, file_id):
+    """
+    上传完成后的响应：解析PDF（相同内容已解析过时直接读取存储）
+    """
+    ensure_parsed(file_id)
+    store = get_document_store()
+    result = {
+        'success': True,
+        'completed': True,
+        'filename': filename,
+        'file_id': file_id,
+        'total_pages': store.get_total_pages(file_id)
+    }
+    # 页面内容通过 /api/documents/<file_id>/pages 分页读取，include_pages=1时兼容旧客户端一并返回
+    if request.args.get('include_pages') == '1':
+        result['pages'] = store.load_pages(file_id)
+    return result
+
+def page_range_args():
+    """
+    读取分页参数：start、end为页码区间（包含两端），limit为最多返回的页数（超出上限时截断）
+    """
+    start = max(1, request.args.get('start', 1, type=int))
+    end = request.args.get('end', type=int)
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        limit = max(1, min(limit, Config.RESULT_PAGE_MAX_LIMIT))
+    return start, end, limit
+
+def json_stream(fields, list_key, items):
+    """
+    流式序列化JSON对象：先输出fields中的字段，再逐项输出items数组，不在内存中拼接完整响应
+    """
+    def generate():
+        head = json.dumps(fields, ensure_ascii=False)
+        yield head[:-1] + (', ' if fields else '') + json.dumps(list_key) + ': ['
+        for i, item in enumerate(items):
+            yield (', ' if i else '') + json.dumps(item, ensure_ascii=False)
+        yield ']}'
+
+    return Response(generate(), mimetype='application/json')
+
+@app.route('/api/documents/<file_id>/pages', methods=['GET'])
+def get_document_pages(file_id):
+    """
+    分页读取已解析的原文：?start=1&end=100&limit=50，include_bbox=1时返回页面尺寸，
+    include_blocks=1时按列返回文本块（text/x0/top/x1/bottom/size/kind 各为一个数组）
+    next_start为下一页的起始页码，没有更多页面时为null
+    """
+    store = get_document_store()
+    if not is_file_id(file_id) or not store.has(file_id):
+        return jsonify({'error': '文件不存在，请重新上传'}), 404
+
+    start, end, limit = page_range_args()
+    limit = limit or Config.RESULT_PAGE_LIMIT
+    include_bbox = request.args.get('include_bbox') == '1'
+    include_blocks = request.args.get('include_blocks') == '1'
+    pages = store.load_page_range(file_id, start, end, limit + 1, include_bbox, include_blocks)
+    for page in pages:
+        if 'blocks' in page:
+            page['blocks'] = page['blocks'].to_dict()
+
+    return json_stream({
+        'success': True,
+        'file_id': file_id,
+        'total_pages': store.get_total_pages(file_id),
+        'start': start,
+        'next_start': pages[limit]['page'] if len(pages) > limit else None
+    }, 'pages', pages[:limit])
+
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    """
+    创建分块上传会话：{filename, size, sha256(可选)}
+    提供的sha256对应的文件已上传并解析过时直接返回结果，不需要再传输数据
+    """
+    data = request.json or {}
+    # 文件名只用于展示，文件按内容哈希保存
+    filename = os.path.basename(data.get('filename') or '')
+    if not allowed_file(filename):
+        return jsonify({'error': '不支持的文件类型'}), 400
+
+    upload_store = get_upload_store()
+    sha256 = (data.get('sha256') or '').lower()
+    if sha256 and get_document_store().has(sha256) and upload_store.has_content(sha256):
+        return jsonify(upload_result(filename, sha256, upload_store.content_path(sha256)))
+
+    try:
+        session = upload_store.create_session(filename, int(data.get('size') or 0))
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+
+    return jsonify({'success': True, 'completed': False, 'chunk_size': Config.UPLOAD_CHUNK_SIZE, **session}), 201
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    """查询上传会话已接收的字节数，断线后从该偏移续传"""
+    session = get_upload_store().get_session(upload_id)
+    if not session:
+        return jsonify({'error': '上传会话不存在或已过期'}), 404
+
+    return jsonify({'success': True, 'completed': False, 'chunk_size': Config.UPLOAD_CHUNK_SIZE, **session})
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """
+    上传一个分块：请求体为原始字节，Upload-Offset请求头为该分块在文件中的起始位置
+    最后一个分块完成后解析PDF并返回与 /api/upload 相同的结果
+    """
+    offset = request.headers.get('Upload-Offset', type=int)
+    if offset is None:
+        return jsonify({'error': '缺少Upload-Offset请求头'}), 400
+
+    try:
+        session = get_upload_store().append(upload_id, offset, request.stream)
+    except UploadError as e:
+        body = {'error': str(e)}
+        if e.offset is not None:
+            body['offset'] = e.offset
+        return jsonify(body), e.status
+
+    if 'file_id' not in session:
+        return jsonify({'success': True, 'completed': False, **session})
+
+    try:
+        return jsonify(upload_result(session['filename'], session['file_id']))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/translate', methods=['POST'])
 @app.route('/translate', methods=['POST'])  # 保持向后兼容
 def translate():
     data = request.json
-    filepath = data.get('filepath')
+    file_id = data.get('file_id')
     page_numbers = data.get('page_numbers', [])  # 可选：指定翻译的页面
 
-    if not filepath:
-        return jsonify({'error': '缺少文件路径'}), 400
+    if not file_id:
+        return jsonify({'error': '缺少file_id'}), 400
+    if not is_file_id(file_id):
+        return jsonify({'error': '无效的file_id'}), 400
 
     try:
-        # 解析PDF
-        parser = PDFParser(filepath)
-        pdf_data = parser.extract_text()
+        if not ensure_parsed(file_id):
+            return jsonify({'error': '文件不存在，请重新上传'}), 404
 
-        # 选择要翻译的页面
-        if page_numbers:
-            pages_to_translate = [p for p in pdf_data['pages'] if p['page'] in page_numbers]
-        else:
-            pages_to_translate = pdf_data['pages']
+        # 只读取要翻译的页面
+        pages_to_translate = get_document_store().load_pages(file_id, page_numbers, include_blocks=True)
 
         # 翻译
-        translator = PDFTranslator()
-        translated_pages = translator.translate_pages(pages_to_translate)
+        translator = get_translator()
+        with trace_context(request_id=uuid.uuid4().hex, file_id=file_id):
+            translated_pages = translator.translate_pages(pages_to_translate)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        return jsonify({
-            'success': True,
-            'translated_pages': translated_pages,
-            'total_pages': len(translated_pages)
-        })
+    # 客户端已有原文时可传 include_original=false，只返回译文
+    if data.get('include_original', True) is False:
+        translated_pages = [{k: v for k, v in p.items() if k != 'original'} for p in translated_pages]
+
+    return json_stream({'success': True, 'total_pages': len(translated_pages)}, 'translated_pages', translated_pages)
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route('/api/translate/stream', methods=['GET'])
+def translate_stream():
+    """
+    以Server-Sent Events流式返回翻译结果
+    事件：start（页面列表）、page_start（页面开始输出）、delta（增量译文）、page（页面完成）、done、error
+    """
+    file_id = request.args.get('file_id')
+    page_numbers = [int(p) for p in request.args.get('pages', '').split(',') if p.strip().isdigit()]
+    stream_tokens = request.args.get('tokens', '1' if Config.STREAM_TOKENS else '0') == '1'
+
+    if not file_id:
+        return jsonify({'error': '缺少file_id'}), 400
+    if not is_file_id(file_id):
+        return jsonify({'error': '无效的file_id'}), 400
+
+    try:
+        if not ensure_parsed(file_id):
+            return jsonify({'error': '文件不存在，请重新上传'}), 404
+        pages = get_document_store().load_pages(file_id, page_numbers, include_blocks=True)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+    events = queue.Queue()
+    cancel_event = threading.Event()
+    originals = {p['page']: p['text'] for p in pages}
+    started_pages = set()
+    started_lock = threading.Lock()
+
+    def on_delta(page, chunk_index, delta):
+        with started_lock:
+            first = page not in started_pages
+            started_pages.add(page)
+        if first:
+            events.put(('page_start', {'page': page, 'original': originals[page]}))
+        events.put(('delta', {'page': page, 'chunk': chunk_index, 'text': delta}))
+
+    def run():
+        try:
+            translator = get_translator()
+            with trace_context(request_id=uuid.uuid4().hex, file_id=file_id):
+                translator.translate_pages(
+                    pages,
+                    on_page_done=lambda page_result: events.put(('page', page_result)),
+                    cancel_event=cancel_event,
+                    on_delta=on_delta if stream_tokens else None
+                )
+            events.put(('done', {'total_pages': len(pages)}))
+        except TranslationCancelled:
+            pass
+        except Exception as e:
+            events.put(('error', {'error': str(e)}))
+        finally:
+            events.put(None)
+
+    threading.Thread(target=run, daemon=True).start()
+
+    def generate():
+        try:
+            yield sse_event('start', {'total_pages': len(pages), 'pages': [p['page'] for p in pages]})
+            idle = 0
+            while True:
+                if SHUTDOWN_EVENT.is_set():
+                    yield sse_event('error', {'error': '服务正在重启，请稍后重新翻译'})
+                    break
+                try:
+                    item = events.get(timeout=1)
+                except queue.Empty:
+                    idle += 1
+                    if idle >= 15:
+                        # 保持连接，防止代理超时断开
+                        idle = 0
+                        yield ': keep-alive\n\n'
+                    continue
+                idle = 0
+                if item is None:
+                    break
+                yield sse_event(*item)
+        finally:
+            # 客户端断开时停止翻译
+            cancel_event.set()
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    data = request.json or {}
+    file_id = data.get('file_id')
+    page_numbers = data.get('page_numbers') or []
+    # 修订版：parent_job_id为上一版的翻译任务，或parent_file_id为上一版文件的哈希（取该文件最近的任务）
+    parent_job_id = data.get('parent_job_id')
+    parent_file_id = data.get('parent_file_id')
+
+    if not file_id:
+        return jsonify({'error': '缺少file_id'}), 400
+    if not is_file_id(file_id) or (parent_file_id and not is_file_id(parent_file_id)):
+        return jsonify({'error': '无效的file_id'}), 400
+
+    try:
+        manager = get_job_manager()
+        if parent_job_id:
+            if manager.store.get(parent_job_id) is None:
+                return jsonify({'error': '上一版的翻译任务不存在'}), 404
+        elif parent_file_id:
+            parent_job_id = manager.store.find_latest(parent_file_id)
+            if parent_job_id is None:
+                return jsonify({'error': '上一版文件没有已翻译的任务'}), 404
+
+        if not ensure_parsed(file_id):
+            return jsonify({'error': '文件不存在，请重新上传'}), 404
+
+        job_id = manager.submit(file_id, page_numbers, parent_job_id, request_user(data))
+        return jsonify({'success': True, 'job_id': job_id, 'status': 'queued', 'parent_id': parent_job_id}), 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = get_job_manager().store.get(job_id)
+    if not job:
+        return jsonify({'error': '任务不存在'}), 404
+
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    manager = get_job_manager()
+    job = manager.store.get(job_id)
+    if not job:
+        return jsonify({'error': '任务不存在'}), 404
+
+    # 任务未完成时返回已翻译的部分页面
+    # 支持 ?start=&end=&limit= 分页，include_original=0 时不返回原文
+    start, end, limit = page_range_args()
+    include_original = request.args.get('include_original', '1') != '0'
+    fields = {
+        'success': True,
+        'status': job['status'],
+        'total_pages': job['total_pages'],
+        'completed_pages': job['completed_pages'],
+        'failed_pages': job['failed_pages'],
+        'start': start
+    }
+
+    if limit is None:
+        # 未指定limit时分批读取并流式返回区间内的全部结果
+        fields['next_start'] = None
+        return json_stream(fields, 'translated_pages',
+                           manager.store.iter_results(job_id, start, end, include_original))
+
+    translated_pages = manager.store.get_results(job_id, start, end, limit + 1, include_original)
+    fields['next_start'] = translated_pages[limit]['page'] if len(translated_pages) > limit else None
+    return json_stream(fields, 'translated_pages', translated_pages[:limit])
+
+@app.route('/api/batches', methods=['POST'])
+def create_batch():
+    """
+    批量翻译：multipart上传多个文件（字段名files），或JSON {documents: [{file_id, page_numbers}], user}
+    文件较大时先通过分块上传接口上传，再按file_id提交；文档在后台解析和翻译
+    """
+    store = get_document_store()
+    upload_store = get_upload_store()
+    documents = []
+    try:
+        if request.files:
+            files = request.files.getlist('files')
+            user = request_user(request.form)
+            if len(files) > Config.BATCH_MAX_FILES:
+                return jsonify({'error': f'单个批量任务最多{Config.BATCH_MAX_FILES}个文件'}), 400
+            for file in files:
+                if not file.filename or not allowed_file(file.filename):
+                    return jsonify({'error': f'不支持的文件类型: {file.filename}'}), 400
+                file_id, _ = upload_store.save_stream(file.stream)
+                documents.append({'file_id': file_id, 'filename': secure_filename(file.filename)})
+        else:
+            data = request.json or {}
+            user = request_user(data)
+            items = data.get('documents') or [{'file_id': file_id} for file_id in data.get('file_ids') or []]
+            if len(items) > Config.BATCH_MAX_FILES:
+                return jsonify({'error': f'单个批量任务最多{Config.BATCH_MAX_FILES}个文件'}), 400
+            for item in items:
+                file_id = item.get('file_id') if isinstance(item, dict) else None
+                # file_id会拼接为上传文件的路径，先校验格式再查询
+                if not is_file_id(file_id):
+                    return jsonify({'error': f'无效的file_id: {file_id}'}), 400
+                if not (store.has(file_id) or upload_store.has_content(file_id)):
+                    return jsonify({'error': f'文件不存在，请重新上传: {file_id}'}), 404
+                documents.append({'file_id': file_id, 'page_numbers': item.get('page_numbers') or None})
+
+        if not documents:
+            return jsonify({'error': '没有要翻译的文件'}), 400
+
+        batch_id, job_ids = get_job_manager().submit_batch(documents, user)
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify({
+        'success': True,
+        'batch_id': batch_id,
+        'status': 'queued',
+        'documents': [{**document, 'job_id': job_id} for document, job_id in zip(documents, job_ids)]
+    }), 202
+
+@app.route('/api/batches/<batch_id>', methods=['GET'])
+def get_batch(batch_id):
+    batch = get_job_manager().store.get_batch(batch_id)
+    if not batch:
+        return jsonify({'error': '批量任务不存在'}), 404
+
+    return jsonify(batch)
+
+@app.route('/api/batches/<batch_id>/cancel', methods=['POST'])
+def cancel_batch(batch_id):
+    manager = get_job_manager()
+    if not manager.store.get_batch(batch_id):
+        return jsonify({'error': '批量任务不存在'}), 404
+
+    return jsonify({'success': True, 'batch_id': batch_id, 'cancelled': manager.cancel_batch(batch_id)})
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    manager = get_job_manager()
+    job = manager.store.get(job_id)
+    if not job:
+        return jsonify({'error': '任务不存在'}), 404
+
+    if not manager.cancel(job_id):
+        return jsonify({'error': f"任务已结束（{job['status']}）"}), 409
+
+    return jsonify({'success': True, 'job_id': job_id})
+
+@app.route('/api/jobs/<job_id>/resume', methods=['POST'])
+def resume_job(job_id):
+    """
+    恢复失败或已取消的任务，只翻译未完成和失败的页面，已完成的分块不会重复请求
+    """
+    manager = get_job_manager()
+    job = manager.store.get(job_id)
+    if not job:
+        return jsonify({'error': '任务不存在'}), 404
+
+    if not manager.resume(job_id):
+        return jsonify({'error': f"任务无需恢复（{job['status']}）"}), 409
+
+    return jsonify({'success': True, 'job_id': job_id, 'status': 'queued'}), 202
+
+@app.route('/api/jobs/<job_id>/export', methods=['GET'])
+def export_job(job_id):
+    """
+    下载翻译结果PDF：?layout=bilingual（左原文右译文）或 translated（仅译文），默认取EXPORT_LAYOUT
+    支持Range请求（断点续传、浏览器分段加载）；任务执行中返回409
+    """
+    manager = get_job_manager()
+    job = manager.store.get(job_id)
+    if not job:
+        return jsonify({'error': '任务不存在'}), 404
+
+    layout = request.args.get('layout', Config.EXPORT_LAYOUT)
+    if layout not in EXPORT_LAYOUTS:
+        return jsonify({'error': f"不支持的导出版式: {layout}"}), 400
+    if job['status'] not in FINISHED_STATUSES:
+        return jsonify({'error': '任务尚未结束，结束后可下载PDF'}), 409
+    if not job['completed_pages']:
+        return jsonify({'error': '没有已翻译的页面'}), 404
+
+    try:
+        path = os.path.abspath(manager.export(job_id, layout))
+    except Exception as e:
+        return jsonify({'error': f"导出PDF失败: {str(e)}"}), 500
+
+    return send_file(path, mimetype='application/pdf', as_attachment=True,
+                     download_name=f"translation_{job_id[:8]}_{layout}.pdf", conditional=True)
+
+@app.route('/api/jobs/<job_id>/trace', methods=['GET'])
+def get_job_trace(job_id):
+    """
+    返回任务的跟踪日志（需开启TRACE_LOG），可按span或page筛选，用于定位慢页面
+    """
+    if not get_job_manager().store.get(job_id):
+        return jsonify({'error': '任务不存在'}), 404
+
+    records = read_job_trace(job_id)
+    span_name = request.args.get('span')
+    if span_name:
+        records = [r for r in records if r.get('span') == span_name]
+    page = request.args.get('page', type=int)
+    if page is not None:
+        records = [r for r in records if r.get('page') == page or page in r.get('pages', [])]
+
+    return jsonify({'enabled': Config.TRACE_LOG, 'job_id': job_id, 'spans': records})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus格式的指标：各阶段耗时、模型调用、token用量、缓存命中和任务状态
+    """
+    gauges = {}
+    cache = get_translation_cache()
+    if cache:
+        stats = cache.stats()
+        gauges['pdftranslator_cache_entries'] = {'help': '翻译缓存条目数', 'value': stats['entries']}
+        gauges['pdftranslator_cache_bytes'] = {'help': '翻译缓存占用字节数', 'value': stats['bytes']}
+    memory = get_translation_memory()
+    if memory:
+        gauges['pdftranslator_memory_segments'] = {'help': '翻译记忆句对数', 'value': memory.stats()['segments']}
+    limiter = get_rate_limiter(Config.API_PROVIDER, Config.MODEL)
+    stats = limiter.stats()
+    gauges['pdftranslator_rate_limit_concurrency'] = {'help': '模型请求的当前并发上限', 'value': stats['concurrency_limit']}
+    gauges['pdftranslator_rate_limit_in_flight'] = {'help': '进行中的模型请求数', 'value': stats['in_flight']}
+    gauges['pdftranslator_rate_limit_waiting'] = {'help': '等待并发名额的模型请求数', 'value': stats['waiting']}
+
+    return Response(REGISTRY.render(gauges), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    cache = get_translation_cache()
+    if not cache:
+        return jsonify({'enabled': False})
+
+    return jsonify({'enabled': True, **cache.stats()})
+
+@app.route('/api/memory/stats', methods=['GET'])
+def memory_stats():
+    memory = get_translation_memory()
+    if not memory:
+        return jsonify({'enabled': False})
+
+    return jsonify({'enabled': True, **memory.stats()})
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # 开发服务器（自动重载）；生产环境使用 gunicorn -c gunicorn.conf.py wsgi:app
+    app.run(debug=True, host=Config.SERVER_HOST, port=Config.SERVER_PORT)
@@ -0,0 +1,93 @@
+"""
+生成基准测试用的PDF语料（不依赖第三方库，使用项目的流式PDF写入器 pdf_writer.py）
+拉丁文本使用Helvetica，中文使用Acrobat预置的STSong-Light字体（无需嵌入）
+"""
+import os
+import random
+import sys
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf_writer import PDFWriter, text_ops
+
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+FONT_SIZE = 10
+LEADING = 14
+LINES_PER_PAGE = 50
+
+_WORDS = (
+    'the pump valve pressure system must be installed by qualified technician check voltage before use '
+    'warranty lasts years device operating temperature range maximum minimum input output signal '
+    'controller module firmware update configure network interface default settings safety warning '
+    'ensure that all connections are secure and the power supply is disconnected during maintenance'
+).split()
+_HANZI = (
+    '的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所'
+    '民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那'
+)
+
+# 预设语料：名称 -> (页数, 文字类型)
+CORPUS = {
+    'latin-10': (10, 'latin'),
+    'latin-100': (100, 'latin'),
+    'cjk-10': (10, 'cjk'),
+    'cjk-100': (100, 'cjk'),
+    'mixed-300': (300, 'mixed'),
+}
+
+
+def _latin_line(rng: random.Random) -> str:
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(8, 14))]
+    return ' '.join(words).capitalize() + '.'
+
+
+def _cjk_line(rng: random.Random) -> str:
+    return ''.join(rng.choice(_HANZI) for _ in range(rng.randint(20, 34))) + '。'
+
+
+def generate_pages(page_count: int, script: str, seed: int = 0) -> List[Dict]:
+    """
+    生成页面内容：每页若干段落，mixed类型奇数页为拉丁文、偶数页为中文
+    每隔几页插入一个只有标题的短页面，覆盖短页面合并的路径
+    """
+    rng = random.Random(seed)
+    pages = []
+    for page_num in range(1, page_count + 1):
+        page_script = script if script != 'mixed' else ('latin' if page_num % 2 else 'cjk')
+        make_line = _latin_line if page_script == 'latin' else _cjk_line
+
+        if page_num % 7 == 0:
+            lines = [make_line(rng)]
+        else:
+            lines = []
+            for _ in range(LINES_PER_PAGE):
+                # 约每8行一个空行作为段落分隔
+                lines.append('' if rng.random() < 0.12 else make_line(rng))
+        pages.append({'script': page_script, 'lines': lines})
+    return pages
+
+
+def write_pdf(path: str, pages: List[Dict]):
+    """
+    逐页写出PDF文件，内存占用与页数无关
+    """
+    with PDFWriter(path) as writer:
+        for page in pages:
+            writer.add_page(PAGE_WIDTH, PAGE_HEIGHT, text_ops(page['lines'], 50, PAGE_HEIGHT - 60, FONT_SIZE, LEADING))
+
+
+def build_corpus(output_dir: str, names: List[str] = None) -> Dict[str, str]:
+    """
+    生成语料文件（已存在则跳过），返回 名称 -> 文件路径
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {}
+    for name in names or CORPUS:
+        page_count, script = CORPUS[name]
+        path = os.path.join(output_dir, f"{name}.pdf")
+        if not os.path.exists(path):
+            write_pdf(path, generate_pages(page_count, script, seed=page_count))
+        paths[name] = path
+    return paths
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+本地OpenAI兼容的模拟大模型服务，用于基准测试
+支持可配置的延迟、抖动、错误率和每分钟请求数限制，GET /stats 返回请求计数
+
+用法: python benchmarks/mock_llm_server.py --port 8765 --latency 300 --jitter 100 --error-rate 0.01 --rpm 600
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockLLMState:
+    """模拟服务的配置和计数（线程安全）"""
+
+    def __init__(self, latency_ms: float = 200, jitter_ms: float = 50, error_rate: float = 0.0,
+                 rpm: int = 0, tokens_per_second: float = 200):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rpm = rpm
+        self.tokens_per_second = tokens_per_second
+        self.counts = {'requests': 0, 'ok': 0, 'errors': 0, 'rate_limited': 0, 'prompt_chars': 0}
+        self._window = []
+        self._lock = threading.Lock()
+
+    def count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.counts[key] += amount
+
+    def allow(self) -> bool:
+        """滑动窗口限流：最近60秒内的请求数不超过rpm"""
+        if self.rpm <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            self._window = [t for t in self._window if now - t < 60]
+            if len(self._window) >= self.rpm:
+                return False
+            self._window.append(now)
+            return True
+
+    def delay(self) -> float:
+        return max(0.0, random.gauss(self.latency_ms, self.jitter_ms) / 1000.0) if self.jitter_ms else self.latency_ms / 1000.0
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts)
+
+
+def fake_translate(content: str) -> str:
+    """
+    生成"译文"：从提示词中取出原文并加上标记；JSON数组请求返回等长数组
+    """
+    start = content.find('原文：\n')
+    end = content.rfind('\n\n翻译结果')
+    source = content[start + 4:end] if start >= 0 and end > start else content
+
+    if 'JSON' in content:
+        try:
+            items = json.loads(source)
+            return json.dumps([f"[译] {item}" for item in items], ensure_ascii=False)
+        except ValueError:
+            pass
+    return f"[译] {source}"
+
+
+def make_handler(state: MockLLMState):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, body: dict, headers: dict = None):
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip('/') == '/stats':
+                self._send_json(200, state.stats())
+            else:
+                self._send_json(404, {'error': {'message': 'not found'}})
+
+        def do_POST(self):
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                self._send_json(404, {'error': {'message': 'not found'}})
+                return
+
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            state.count('requests')
+
+            if not state.allow():
+                state.count('rate_limited')
+                self._send_json(429, {'error': {'message': 'rate limit exceeded', 'type': 'rate_limit'}},
+                                {'Retry-After': '1'})
+                return
+
+            time.sleep(state.delay())
+
+            if random.random() < state.error_rate:
+                state.count('errors')
+                self._send_json(500, {'error': {'message': 'mock internal error', 'type': 'server_error'}})
+                return
+
+            content = payload['messages'][-1]['content']
+            state.count('prompt_chars', len(content))
+            answer = fake_translate(content)
+            state.count('ok')
+
+            if payload.get('stream'):
+                self._stream(payload, answer)
+            else:
+                self._send_json(200, {
+                    'id': f"chatcmpl-{uuid.uuid4().hex}",
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': payload.get('model', 'mock-model'),
+                    'choices': [{
+                        'index': 0,
+                        'message': {'role': 'assistant', 'content': answer},
+                        'finish_reason': 'stop'
+                    }],
+                    'usage': {
+                        'prompt_tokens': len(content) // 4,
+                        'completion_tokens': len(answer) // 4,
+                        'total_tokens': (len(content) + len(answer)) // 4
+                    }
+                })
+
+        def _stream(self, payload: dict, answer: str):
+            """按tokens_per_second的速度以SSE分块返回"""
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+
+            completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+            piece_size = 16
+            for i in range(0, len(answer), piece_size):
+                chunk = {
+                    'id': completion_id,
+                    'object': 'chat.completion.chunk',
+                    'created': int(time.time()),
+                    'model': payload.get('model', 'mock-model'),
+                    'choices': [{'index': 0, 'delta': {'content': answer[i:i + piece_size]}, 'finish_reason': None}]
+                }
+                self._write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+                time.sleep(piece_size / 4 / state.tokens_per_second)
+
+            if (payload.get('stream_options') or {}).get('include_usage'):
+                chunk = {
+                    'id': completion_id,
+                    'object': 'chat.completion.chunk',
+                    'created': int(time.time()),
+                    'model': payload.get('model', 'mock-model'),
+                    'choices': [],
+                    'usage': {
+                        'prompt_tokens': len(payload['messages'][-1]['content']) // 4,
+                        'completion_tokens': len(answer) // 4,
+                        'total_tokens': (len(payload['messages'][-1]['content']) + len(answer)) // 4
+                    }
+                }
+                self._write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+
+            self._write_chunk('data: [DONE]\n\n')
+            self.wfile.write(b'0\r\n\r\n')
+
+        def _write_chunk(self, text: str):
+            data = text.encode('utf-8')
+            self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b'\r\n')
+            self.wfile.flush()
+
+    return Handler
+
+
+def start_server(state: MockLLMState, host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+    """
+    在后台线程启动模拟服务，port为0时自动分配端口（通过server.server_address读取）
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='mock-llm', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OpenAI兼容的模拟大模型服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=200, help='平均延迟（毫秒）')
+    parser.add_argument('--jitter', type=float, default=50, help='延迟标准差（毫秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回500的概率')
+    parser.add_argument('--rpm', type=int, default=0, help='每分钟请求数上限，超出返回429，0表示不限制')
+    args = parser.parse_args()
+
+    state = MockLLMState(args.latency, args.jitter, args.error_rate, args.rpm)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    print(f"模拟服务已启动: http://{args.host}:{args.port}/v1  (按 Ctrl+C 停止)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n请求统计: {state.stats()}")
+
+
+if __name__ == '__main__':
+    main()
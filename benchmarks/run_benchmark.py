@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+端到端基准测试：PDFParser解析 + PDFTranslator翻译，模型接口由本地模拟服务代替
+
+用法:
+  python benchmarks/run_benchmark.py                                  # 运行全部语料
+  python benchmarks/run_benchmark.py --corpus latin-10 cjk-10 --latency 300 --error-rate 0.02
+  python benchmarks/run_benchmark.py --output result.json             # 保存结果
+  python benchmarks/run_benchmark.py --baseline result.json --max-regression 0.1   # 回归检查
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+sys.path.insert(0, BENCHMARK_DIR)
+
+from corpus import CORPUS, build_corpus
+from mock_llm_server import MockLLMState, start_server
+
+
+def configure_env(args, port: int, data_dir: str):
+    """
+    在导入config之前设置环境变量，让翻译器连接模拟服务（config在导入时读取环境变量）
+    """
+    os.environ.update({
+        'API_PROVIDER': 'openai',
+        'API_KEY': 'benchmark',
+        'BASE_URL': f"http://127.0.0.1:{port}/v1",
+        'MODEL': args.model,
+        'PROXY': '',
+        'DATA_FOLDER': data_dir,
+        'CACHE_ENABLED': 'true' if args.cache else 'false',
+        'MEMORY_ENABLED': 'true' if args.cache else 'false',
+        'MAX_CONCURRENCY': str(args.concurrency),
+        'RATE_LIMIT_RPM': str(args.client_rpm),
+    })
+
+
+def percentile(values, p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def peak_rss_mb() -> float:
+    """本进程和已结束子进程（并行解析）的峰值常驻内存，Linux下ru_maxrss单位为KB"""
+    unit = 1 if sys.platform == 'darwin' else 1024  # macOS下单位为字节
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) * unit / (1024 * 1024), 1)
+
+
+def fetch_stats(port: int) -> dict:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/stats", timeout=5) as resp:
+        return json.loads(resp.read())
+
+
+def run_corpus(name: str, path: str, port: int) -> dict:
+    from pdf_parser import PDFParser
+    from translator import PDFTranslator
+
+    latencies = []
+    latencies_lock = threading.Lock()
+
+    class TimedTranslator(PDFTranslator):
+        """记录每次模型调用（含限流等待和重试）的耗时"""
+
+        def _create_completion(self, messages, **kwargs):
+            start = time.perf_counter()
+            try:
+                return super()._create_completion(messages, **kwargs)
+            finally:
+                with latencies_lock:
+                    latencies.append(time.perf_counter() - start)
+
+    stats_before = fetch_stats(port)
+
+    start = time.perf_counter()
+    pages = PDFParser(path).extract_text()['pages']
+    parse_seconds = time.perf_counter() - start
+
+    translator = TimedTranslator()
+    start = time.perf_counter()
+    results = translator.translate_pages(pages)
+    translate_seconds = time.perf_counter() - start
+
+    stats_after = fetch_stats(port)
+    total_seconds = parse_seconds + translate_seconds
+
+    return {
+        'corpus': name,
+        'pages': len(pages),
+        'failed_pages': sum(1 for r in results if r.get('error')),
+        'parse_seconds': round(parse_seconds, 3),
+        'translate_seconds': round(translate_seconds, 3),
+        'pages_per_sec': round(len(pages) / total_seconds, 2) if total_seconds else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50) * 1000, 1),
+            'p95': round(percentile(latencies, 95) * 1000, 1),
+            'p99': round(percentile(latencies, 99) * 1000, 1),
+        },
+        'calls': len(latencies),
+        'requests': {key: stats_after[key] - stats_before.get(key, 0) for key in stats_after},
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def check_regression(results: list, baseline_path: str, max_regression: float) -> list:
+    """
+    与基线结果比较：吞吐下降或p95延迟上升超过max_regression（比例）视为回归
+    """
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {r['corpus']: r for r in json.load(f)['results']}
+
+    failures = []
+    for result in results:
+        base = baseline.get(result['corpus'])
+        if not base:
+            continue
+        if result['pages_per_sec'] < base['pages_per_sec'] * (1 - max_regression):
+            failures.append(
+                f"{result['corpus']}: 吞吐 {result['pages_per_sec']} 页/秒，基线 {base['pages_per_sec']} 页/秒"
+            )
+        if result['latency_ms']['p95'] > base['latency_ms']['p95'] * (1 + max_regression):
+            failures.append(
+                f"{result['corpus']}: p95延迟 {result['latency_ms']['p95']}ms，基线 {base['latency_ms']['p95']}ms"
+            )
+    return failures
+
+
+def print_table(results: list):
+    header = f"{'语料':<12}{'页数':>6}{'失败':>6}{'页/秒':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'请求':>8}{'429':>6}{'5xx':>6}{'RSS(MB)':>10}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f"{r['corpus']:<12}{r['pages']:>6}{r['failed_pages']:>6}{r['pages_per_sec']:>10}"
+              f"{r['latency_ms']['p50']:>10}{r['latency_ms']['p95']:>10}{r['latency_ms']['p99']:>10}"
+              f"{r['requests']['requests']:>8}{r['requests']['rate_limited']:>6}{r['requests']['errors']:>6}"
+              f"{r['peak_rss_mb']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PDF翻译端到端基准测试')
+    parser.add_argument('--corpus', nargs='+', choices=list(CORPUS), default=list(CORPUS), help='要运行的语料')
+    parser.add_argument('--corpus-dir', default=os.path.join(BENCHMARK_DIR, 'corpus'), help='语料PDF目录')
+    parser.add_argument('--latency', type=float, default=200, help='模拟服务平均延迟（毫秒）')
+    parser.add_argument('--jitter', type=float, default=50, help='模拟服务延迟标准差（毫秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='模拟服务返回500的概率')
+    parser.add_argument('--rpm', type=int, default=0, help='模拟服务每分钟请求数上限，0表示不限制')
+    parser.add_argument('--client-rpm', type=int, default=0, help='客户端限流RATE_LIMIT_RPM，0表示不限制')
+    parser.add_argument('--concurrency', type=int, default=4, help='MAX_CONCURRENCY')
+    parser.add_argument('--model', default='deepseek-chat', help='模型名称（影响分块预算）')
+    parser.add_argument('--cache', action='store_true', help='启用翻译缓存和翻译记忆（默认关闭以测量真实请求）')
+    parser.add_argument('--seed', type=int, default=0, help='模拟服务延迟和错误的随机种子')
+    parser.add_argument('--output', help='将结果保存为JSON文件')
+    parser.add_argument('--baseline', help='基线结果JSON文件，用于回归检查')
+    parser.add_argument('--max-regression', type=float, default=0.1, help='允许的最大回归比例')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+
+    state = MockLLMState(args.latency, args.jitter, args.error_rate, args.rpm)
+    server = start_server(state)
+    port = server.server_address[1]
+
+    with tempfile.TemporaryDirectory(prefix='pdf-benchmark-') as data_dir:
+        configure_env(args, port, data_dir)
+        paths = build_corpus(args.corpus_dir, args.corpus)
+
+        results = []
+        for name in args.corpus:
+            print(f"▶ {name} ...", flush=True)
+            results.append(run_corpus(name, paths[name], port))
+
+    server.shutdown()
+
+    print()
+    print_table(results)
+
+    report = {
+        'settings': {
+            'latency_ms': args.latency,
+            'jitter_ms': args.jitter,
+            'error_rate': args.error_rate,
+            'server_rpm': args.rpm,
+            'client_rpm': args.client_rpm,
+            'concurrency': args.concurrency,
+            'model': args.model,
+            'cache': args.cache,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到 {args.output}")
+
+    if args.baseline:
+        failures = check_regression(results, args.baseline, args.max_regression)
+        if failures:
+            print(f"\n❌ 性能回归（阈值 {args.max_regression:.0%}）:")
+            for failure in failures:
+                print(f"  - {failure}")
+            sys.exit(1)
+        print(f"\n✅ 未发现超过 {args.max_regression:.0%} 的性能回归")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import re
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Set
+
+from layout import TRANSLATABLE_KINDS
+
+_LETTER = re.compile(r'[^\W\d_]')
+# 太短的行（如单个单词的图表标签）重复出现不一定是样板内容
+MIN_LINE_CHARS = 4
+
+
+def normalize_line(text: str) -> str:
+    """规整空白字符，重新解析造成的空格差异不影响匹配"""
+    return ' '.join(text.split())
+
+
+def candidate_lines(page_data: Dict) -> Iterator[str]:
+    """
+    页面中可能是样板内容的行：按块提取的页面为正文和标题块，整页提取的页面为逐行文本
+    """
+    blocks = page_data.get('blocks')
+    if blocks:
+        texts = (block.text for block in blocks if block.kind in TRANSLATABLE_KINDS)
+    else:
+        texts = page_data['text'].split('\n')
+    for text in texts:
+        line = normalize_line(text)
+        if len(line) >= MIN_LINE_CHARS and _LETTER.search(line):
+            yield line
+
+
+def find_boilerplate(documents: Iterable[List[Dict]], min_pages: int) -> Set[str]:
+    """
+    找出在至少min_pages个页面中出现的行（可跨多个文档统计），返回规整后的行文本
+    同一页面内重复出现只计一次
+    """
+    counts = Counter()
+    for pages in documents:
+        for page_data in pages:
+            counts.update(set(candidate_lines(page_data)))
+    return {line for line, count in counts.items() if count >= min_pages}
+
+
+def split_boilerplate(text: str, translations: Dict[str, str]) -> List[tuple]:
+    """
+    把整页提取的文本按行切开，已有译文的样板行单独成段，其余连续的行保持原有换行
+    返回 [(分隔符, 文本, 样板行译文或None), ...]，分隔符为该段之前原有的换行和空行（第一段之前没有时为空），
+    按顺序拼接 分隔符 + 文本 即还原原文（末尾的空行除外）
+    """
+    lines = text.split('\n')
+    # 各段在lines中的行号区间 [start, end)，普通文本段去掉首尾的空行（空行归入分隔符）
+    spans = []
+    start = None
+    for index, line in enumerate(lines):
+        translated = translations.get(normalize_line(line)) if line.strip() else None
+        if translated is None:
+            if start is None and line.strip():
+                start = index
+            continue
+        if start is not None:
+            spans.append((_trim_blank_lines(lines, start, index), None))
+            start = None
+        spans.append(((index, index + 1), translated))
+    if start is not None:
+        spans.append((_trim_blank_lines(lines, start, len(lines)), None))
+
+    segments = []
+    previous_end = 0
+    for (span_start, span_end), translated in spans:
+        if segments:
+            separator = '\n'.join([''] + lines[previous_end:span_start] + [''])
+        else:
+            separator = '\n'.join(lines[:span_start] + ['']) if span_start else ''
+        segments.append((separator, '\n'.join(lines[span_start:span_end]), translated))
+        previous_end = span_end
+    return segments
+
+
+def _trim_blank_lines(lines: List[str], start: int, end: int) -> tuple:
+    while end > start and not lines[end - 1].strip():
+        end -= 1
+    return start, end
@@ -0,0 +1,188 @@
+import re
+from typing import Callable, List
+
+try:
+    import tiktoken
+except ImportError:  # 可选依赖，未安装时使用字符估算
+    tiktoken = None
+
+# 各模型单次请求的原文token预算（译文长度与原文相当，需同时给输出留出空间）
+MODEL_TOKEN_BUDGETS = {
+    'deepseek-chat': 3000,
+    'deepseek-coder': 3000,
+    'gpt-4o': 3000,
+    'gpt-4-turbo': 3000,
+    'gpt-4': 1800,
+    'gpt-3.5-turbo': 1500,
+}
+DEFAULT_TOKEN_BUDGET = 1500
+
+_CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]')
+_SENTENCE_PATTERN = re.compile(r'.+?(?:[.!?;]+(?:\s+|$)|[。！？；]+\s*|$)', re.DOTALL)
+_encoders = {}
+
+
+def estimate_tokens(text: str, model: str = None) -> int:
+    """
+    估算文本的token数，优先使用tiktoken
+    未安装时按中日韩字符约1个token、其他字符约4个字符1个token估算
+    """
+    if not text:
+        return 0
+
+    if tiktoken is not None:
+        encoder = _get_encoder(model)
+        if encoder is not None:
+            return len(encoder.encode(text, disallowed_special=()))
+
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _get_encoder(model: str):
+    if model not in _encoders:
+        try:
+            _encoders[model] = tiktoken.encoding_for_model(model)
+        except Exception:
+            # 非OpenAI模型（如DeepSeek）没有对应编码，用cl100k_base近似
+            try:
+                _encoders[model] = tiktoken.get_encoding('cl100k_base')
+            except Exception:
+                _encoders[model] = None
+    return _encoders[model]
+
+
+def token_budget(model: str, override: int = 0) -> int:
+    """
+    返回模型的单次请求token预算，override大于0时优先使用
+    """
+    if override and override > 0:
+        return override
+
+    for prefix, budget in MODEL_TOKEN_BUDGETS.items():
+        if model and model.startswith(prefix):
+            return budget
+    return DEFAULT_TOKEN_BUDGET
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    按句末标点切分句子（中英文标点均可），每句保留其后的空白，拼接后与原文一致
+    """
+    return [s for s in _SENTENCE_PATTERN.findall(text) if s.strip()]
+
+
+def chunk_text(text: str, budget: int, count: Callable[[str], int] = estimate_tokens) -> List[str]:
+    """
+    将文本按段落装箱为不超过budget个token的分块
+    超长段落在句子边界处切分，超长句子再按行/字符硬切分
+    """
+    if count(text) <= budget:
+        return [text]
+
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    def flush():
+        nonlocal current, current_tokens
+        if current:
+            chunks.append('\n\n'.join(current))
+        current = []
+        current_tokens = 0
+
+    for para in text.split('\n\n'):
+        if not para.strip():
+            continue
+
+        para_tokens = count(para)
+        if para_tokens > budget:
+            flush()
+            chunks.extend(_split_paragraph(para, budget, count))
+            continue
+
+        # 段落间的空行约占1个token
+        if current and current_tokens + para_tokens + 1 > budget:
+            flush()
+        current.append(para)
+        current_tokens += para_tokens + 1
+
+    flush()
+    return chunks
+
+
+def _split_paragraph(para: str, budget: int, count: Callable[[str], int]) -> List[str]:
+    """在句子边界处切分超长段落"""
+    pieces = []
+    current = ''
+
+    for sentence in split_sentences(para):
+        if count(sentence) > budget:
+            if current:
+                pieces.append(current)
+                current = ''
+            pieces.extend(_hard_split(sentence, budget, count))
+            continue
+
+        candidate = current + sentence if current else sentence
+        if current and count(candidate) > budget:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = candidate
+
+    if current:
+        pieces.append(current)
+    return [p.strip() for p in pieces if p.strip()]
+
+
+def _hard_split(text: str, budget: int, count: Callable[[str], int]) -> List[str]:
+    """没有句子边界的超长文本：先按行，再按字符切分"""
+    lines = text.split('\n')
+    if len(lines) > 1:
+        pieces = []
+        current = ''
+        for line in lines:
+            candidate = current + '\n' + line if current else line
+            if current and count(candidate) > budget:
+                pieces.append(current)
+                current = line
+            else:
+                current = candidate
+        if current:
+            pieces.append(current)
+        if all(count(p) <= budget for p in pieces):
+            return pieces
+
+    # 按token数与字符数的比例估算切分长度
+    size = max(1, len(text) * budget // max(count(text), 1))
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def group_segments(token_counts: List[int], budget: int, max_segment_tokens: int,
+                   max_count: int = 0) -> List[List[int]]:
+    """
+    将连续的短片段（不超过max_segment_tokens）合并为不超过budget的组，返回片段序号分组
+    长片段单独成组；max_count大于0时每组最多包含max_count个片段
+    """
+    groups = []
+    current = []
+    current_tokens = 0
+
+    for index, tokens in enumerate(token_counts):
+        if tokens > max_segment_tokens:
+            if current:
+                groups.append(current)
+                current, current_tokens = [], 0
+            groups.append([index])
+            continue
+
+        if current and (current_tokens + tokens > budget or (max_count and len(current) >= max_count)):
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(index)
+        current_tokens += tokens
+
+    if current:
+        groups.append(current)
+    return groups
@@ -0,0 +1,144 @@
+import socket
+import threading
+from typing import Optional
+from urllib.parse import urlparse
+
+import httpx
+from openai import OpenAI
+
+from config import Config
+
+
+class ProxyMonitor:
+    """
+    后台线程定期检查代理端口是否可连接，请求路径上只读取检查结果
+    """
+
+    def __init__(self, proxy_url: str, interval: float = 30.0):
+        self.proxy_url = proxy_url
+        self.interval = interval
+        # 首次检查完成前默认代理可用
+        self.available = True
+        self._stop = threading.Event()
+
+        parsed = urlparse(proxy_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if parsed.scheme == 'https' else 1080 if parsed.scheme.startswith('socks') else 80)
+
+        self._thread = threading.Thread(target=self._loop, name='proxy-monitor', daemon=True)
+        self._thread.start()
+
+    def check(self) -> bool:
+        """检查代理端口是否可连接（2秒超时）"""
+        try:
+            with socket.create_connection((self.host, self.port), timeout=2):
+                return True
+        except OSError:
+            return False
+
+    def _loop(self):
+        while not self._stop.is_set():
+            available = self.check()
+            if available != self.available:
+                if available:
+                    print(f"✅ 代理 {self.proxy_url} 已恢复，使用代理连接")
+                else:
+                    print(f"⚠️  警告: 代理 {self.proxy_url} 端口不可用，将尝试直接连接")
+            self.available = available
+            self._stop.wait(self.interval)
+
+    def stop(self):
+        self._stop.set()
+
+
+class ClientPool:
+    """
+    进程内共享的OpenAI客户端，底层httpx连接池复用TLS会话和keep-alive连接
+    配置了代理时同时持有代理和直连两个客户端，按代理健康状态选择
+    """
+
+    def __init__(self):
+        if not Config.API_KEY:
+            raise ValueError(f"请设置API_KEY环境变量（当前使用: {Config.API_PROVIDER}）")
+
+        self.base_url = Config.BASE_URL
+        if not self.base_url and Config.API_PROVIDER == 'deepseek':
+            # DeepSeek默认base_url
+            self.base_url = 'https://api.deepseek.com'
+
+        self.direct = self._create_client()
+        self.proxied = None
+        self.proxy_monitor = None
+
+        if Config.PROXY:
+            try:
+                self.proxied = self._create_client(Config.PROXY)
+                self.proxy_monitor = ProxyMonitor(Config.PROXY, Config.PROXY_CHECK_INTERVAL)
+            except Exception as e:
+                # 代理配置解析失败，跳过代理
+                print(f"⚠️  警告: 代理配置错误 ({str(e)})，将尝试直接连接")
+
+        print(f"✅ 已初始化 {Config.API_PROVIDER.upper()} 客户端，模型: {Config.MODEL}")
+
+    def _create_client(self, proxy: Optional[str] = None) -> OpenAI:
+        # httpx的timeout需要是Timeout对象，设置连接超时和读取超时
+        http_client = httpx.Client(
+            proxy=proxy,
+            timeout=httpx.Timeout(Config.TIMEOUT, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=Config.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=Config.HTTP_MAX_KEEPALIVE
+            )
+        )
+
+        client_kwargs = {
+            'api_key': Config.API_KEY,
+            'timeout': float(Config.TIMEOUT),
+            'max_retries': 0,  # 重试由PDFTranslator._create_completion统一调度
+            'http_client': http_client
+        }
+        if self.base_url:
+            client_kwargs['base_url'] = self.base_url
+
+        return OpenAI(**client_kwargs)
+
+    def get(self) -> OpenAI:
+        """返回当前应使用的客户端：代理可用时走代理，否则直连"""
+        if self.proxied is not None and self.proxy_monitor.available:
+            return self.proxied
+        return self.direct
+
+    def close(self):
+        if self.proxy_monitor:
+            self.proxy_monitor.stop()
+        for client in (self.direct, self.proxied):
+            if client is not None:
+                client.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_client_pool() -> ClientPool:
+    """
+    获取进程内共享的客户端池，首次调用时创建
+    """
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = ClientPool()
+        return _pool
+
+
+def close_client_pool():
+    """
+    关闭共享客户端池（进程退出时调用，未创建时不做任何事）
+    """
+    global _pool
+
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
@@ -0,0 +1,195 @@
+import mimetypes
+import os
+import zlib
+from typing import Iterable, Iterator, Optional, Sequence
+
+from flask import Flask, abort, request, send_file
+from werkzeug.security import safe_join
+
+from config import Config
+
+try:
+    import brotli
+except ImportError:  # brotli为可选依赖，未安装时只使用gzip
+    brotli = None
+
+# 只压缩文本类响应；text/event-stream需要逐条推送，不压缩
+COMPRESSIBLE_TYPES = {
+    'application/json', 'application/javascript', 'text/javascript', 'text/plain', 'text/html', 'text/css',
+    'image/svg+xml'
+}
+# 预压缩文件的扩展名
+PRECOMPRESSED_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+# 预压缩只在启动时执行一次，使用最高压缩级别
+PRECOMPRESS_LEVELS = {'br': 11, 'gzip': 9}
+
+
+def choose_encoding(accept_encoding: str, available: Sequence[str] = None) -> Optional[str]:
+    """
+    根据Accept-Encoding选择压缩算法：优先br（已安装brotli时），其次gzip，q=0表示拒绝
+    available为可选的算法（按优先顺序），默认为本进程能压缩的算法
+    """
+    accepted = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+
+    if available is None:
+        available = ('br', 'gzip') if brotli else ('gzip',)
+    for encoding in available:
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+class _Compressor:
+    """gzip/brotli增量压缩器的统一接口，level为brotli的quality或gzip的压缩级别，默认取配置"""
+
+    def __init__(self, encoding: str, level: int = None):
+        if encoding == 'br':
+            quality = Config.COMPRESSION_BROTLI_QUALITY if level is None else level
+            self._compressor = brotli.Compressor(quality=quality)
+            self._compress = self._compressor.process
+            self._flush = self._compressor.finish
+        else:
+            # wbits=31 输出带gzip头的数据
+            self._compressor = zlib.compressobj(Config.COMPRESSION_LEVEL if level is None else level,
+                                                zlib.DEFLATED, 31)
+            self._compress = self._compressor.compress
+            self._flush = self._compressor.flush
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compress(data)
+
+    def flush(self) -> bytes:
+        return self._flush()
+
+
+def compress_bytes(data: bytes, encoding: str, level: int = None) -> bytes:
+    compressor = _Compressor(encoding, level)
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_stream(chunks: Iterable, encoding: str) -> Iterator[bytes]:
+    """边生成边压缩，压缩器攒够数据才输出，不会为每个小块单独刷新"""
+    compressor = _Compressor(encoding)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def init_compression(app: Flask):
+    """
+    注册after_request钩子，按Accept-Encoding压缩JSON和文本响应
+    普通响应整体压缩（小于COMPRESSION_MIN_SIZE的不压缩），流式响应逐块压缩
+    """
+    if not Config.COMPRESSION_ENABLED:
+        return
+
+    @app.after_request
+    def compress_response(response):
+        if (response.status_code < 200 or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_TYPES
+                or request.method == 'HEAD'):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = compress_stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            # send_file等直接透传文件的响应不在这里处理
+            if response.direct_passthrough:
+                return response
+            data = response.get_data()
+            if len(data) < Config.COMPRESSION_MIN_SIZE:
+                return response
+            response.set_data(compress_bytes(data, encoding))
+
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+
+def _static_mimetype(path: str) -> str:
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+def precompress_static(folder: str) -> int:
+    """
+    为前端构建产物中的文本文件生成 .gz（和安装brotli时的 .br）预压缩文件，返回新生成的文件数
+    已有且不旧于原文件的预压缩文件不重新生成；只需在启动时执行一次
+    """
+    if not folder or not os.path.isdir(folder):
+        return 0
+
+    encodings = ('br', 'gzip') if brotli else ('gzip',)
+    created = 0
+    for root, _, files in os.walk(folder):
+        for name in files:
+            path = os.path.join(root, name)
+            if (name.endswith(tuple(PRECOMPRESSED_SUFFIXES.values()))
+                    or _static_mimetype(path) not in COMPRESSIBLE_TYPES
+                    or os.path.getsize(path) < Config.COMPRESSION_MIN_SIZE):
+                continue
+
+            data = None
+            for encoding in encodings:
+                target = path + PRECOMPRESSED_SUFFIXES[encoding]
+                if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+                    continue
+                if data is None:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                compressed = compress_bytes(data, encoding, PRECOMPRESS_LEVELS[encoding])
+                temp = f"{target}.{os.getpid()}.tmp"
+                with open(temp, 'wb') as f:
+                    f.write(compressed)
+                os.replace(temp, target)
+                created += 1
+    return created
+
+
+def send_static(folder: str, filename: str, max_age: int = 0):
+    """
+    发送前端静态文件：客户端支持时直接发送预压缩的 .br/.gz 文件，支持ETag和Range
+    max_age大于0时允许浏览器长期缓存（用于文件名带哈希的资源），否则每次都需要重新验证
+    """
+    path = safe_join(folder, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    mimetype = _static_mimetype(path)
+    encoding = None
+    if mimetype in COMPRESSIBLE_TYPES:
+        available = [enc for enc, suffix in PRECOMPRESSED_SUFFIXES.items() if os.path.isfile(path + suffix)]
+        encoding = choose_encoding(request.headers.get('Accept-Encoding', ''), available)
+
+    response = send_file(path + PRECOMPRESSED_SUFFIXES[encoding] if encoding else path,
+                         mimetype=mimetype, conditional=True, max_age=max_age or None)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if mimetype in COMPRESSIBLE_TYPES:
+        response.vary.add('Accept-Encoding')
+    if max_age:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
@@ -29,12 +29,97 @@ class Config:
     OPENAI_PROXY = PROXY  # 保持兼容性
     TIMEOUT = int(os.getenv('TIMEOUT', os.getenv('OPENAI_TIMEOUT', '60')))
     OPENAI_TIMEOUT = TIMEOUT  # 保持兼容性
+    PROXY_CHECK_INTERVAL = float(os.getenv('PROXY_CHECK_INTERVAL', '30'))  # 后台检查代理可用性的间隔（秒）
 
     # 翻译配置
     TARGET_LANGUAGE = os.getenv('TARGET_LANGUAGE', '中文')
     SOURCE_LANGUAGE = os.getenv('SOURCE_LANGUAGE', '英文')
 
+    # 并发配置
+    MAX_CONCURRENCY = int(os.getenv('MAX_CONCURRENCY', '4'))  # 同时进行中的翻译请求上限，1表示串行
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))  # 同时执行的后台翻译任务数
+    JOB_AUTO_RESUME = os.getenv('JOB_AUTO_RESUME', 'true').lower() in ('1', 'true', 'yes')  # 启动时从检查点继续上次中断的任务
+    # 执行任务的进程定期写入心跳，超过JOB_OWNER_TIMEOUT秒没有心跳的未完成任务才由其他进程接手
+    JOB_HEARTBEAT_INTERVAL = float(os.getenv('JOB_HEARTBEAT_INTERVAL', '10'))
+    JOB_OWNER_TIMEOUT = float(os.getenv('JOB_OWNER_TIMEOUT', '60'))
+    BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', '8'))  # 批量任务中同时执行的文档数
+    BATCH_MAX_FILES = int(os.getenv('BATCH_MAX_FILES', '200'))  # 单个批量任务的文档数上限
+
+    # 分块配置
+    CHUNK_TOKENS = int(os.getenv('CHUNK_TOKENS', '0'))  # 单次请求的原文token预算，0表示按模型自动选择
+    MERGE_SHORT_PAGES = os.getenv('MERGE_SHORT_PAGES', 'true').lower() in ('1', 'true', 'yes')  # 合并连续的短页面和短文本块为一次批量请求
+    BATCH_MAX_SEGMENTS = int(os.getenv('BATCH_MAX_SEGMENTS', '30'))  # 每个批量请求最多包含的片段数
+    # 重复出现的页眉、页脚、版权和免责声明只翻译一次，译文替换回各页
+    BOILERPLATE_DEDUP = os.getenv('BOILERPLATE_DEDUP', 'true').lower() in ('1', 'true', 'yes')
+    BOILERPLATE_MIN_PAGES = int(os.getenv('BOILERPLATE_MIN_PAGES', '3'))  # 至少在多少页中出现才视为重复内容
+
+    # 流式翻译配置
+    STREAM_TOKENS = os.getenv('STREAM_TOKENS', 'true').lower() in ('1', 'true', 'yes')  # 流式接口是否逐token推送
+
+    # 限流和重试配置（按服务商+模型共享）
+    RATE_LIMIT_RPM = int(os.getenv('RATE_LIMIT_RPM', '0'))  # 每分钟请求数上限，0表示不限制
+    RATE_LIMIT_TPM = int(os.getenv('RATE_LIMIT_TPM', '0'))  # 每分钟token数上限，0表示不限制
+    RATE_LIMIT_CONCURRENCY = int(os.getenv('RATE_LIMIT_CONCURRENCY', '8'))  # 所有任务合计的并发请求上限，被限流时自动减小
+    MAX_RETRIES = int(os.getenv('MAX_RETRIES', '5'))  # 429/5xx/连接错误的最大尝试次数
+    RETRY_BASE_DELAY = float(os.getenv('RETRY_BASE_DELAY', '1'))  # 指数退避的初始延迟（秒）
+    RETRY_MAX_DELAY = float(os.getenv('RETRY_MAX_DELAY', '60'))  # 单次退避的最大延迟（秒）
+
+    # HTTP连接池配置（进程内所有请求共享）
+    HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', str(max(10, RATE_LIMIT_CONCURRENCY * 2))))
+    HTTP_MAX_KEEPALIVE = int(os.getenv('HTTP_MAX_KEEPALIVE', str(max(5, RATE_LIMIT_CONCURRENCY))))
+
+    # 本地数据目录（缓存等SQLite文件）
+    DATA_FOLDER = os.getenv('DATA_FOLDER', 'data')
+
+    # 翻译缓存配置
+    CACHE_ENABLED = os.getenv('CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '100000'))
+    CACHE_MAX_MB = int(os.getenv('CACHE_MAX_MB', '512'))
+
+    # 翻译记忆配置
+    MEMORY_ENABLED = os.getenv('MEMORY_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    MEMORY_FUZZY_THRESHOLD = float(os.getenv('MEMORY_FUZZY_THRESHOLD', '0.75'))  # 相似句子的最低相似度
+    MEMORY_MAX_REFERENCES = int(os.getenv('MEMORY_MAX_REFERENCES', '5'))  # 每个请求最多附带的参考译文数
+
+    # PDF解析配置
+    PARSER_WORKERS = int(os.getenv('PARSER_WORKERS', '0'))  # 解析进程数，0表示使用CPU核数，1表示串行
+    PARSER_PARALLEL_MIN_PAGES = int(os.getenv('PARSER_PARALLEL_MIN_PAGES', '50'))  # 页数达到该值才启用多进程
+    # 按文本块提取（保留阅读顺序、坐标、字号和块类型），纯数字和代码块不发送给模型；默认关闭，按整页提取文本
+    PARSER_LAYOUT = os.getenv('PARSER_LAYOUT', 'false').lower() in ('1', 'true', 'yes')
+    # OCR配置：没有文本层的页面（扫描件）渲染为图片后用Tesseract识别，需要安装pytesseract和tesseract程序
+    OCR_ENABLED = os.getenv('OCR_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    OCR_LANGUAGE = os.getenv('OCR_LANGUAGE', 'eng')  # Tesseract语言，多种语言用+连接，如 eng+chi_sim
+    OCR_DPI = int(os.getenv('OCR_DPI', '300'))  # 渲染分辨率
+    OCR_WORKERS = int(os.getenv('OCR_WORKERS', '0'))  # OCR进程数，0表示CPU核数（最多4个），1表示串行
+
+    # PDF导出配置
+    EXPORT_PDF = os.getenv('EXPORT_PDF', 'true').lower() in ('1', 'true', 'yes')  # 后台任务翻译时逐页写出PDF
+    EXPORT_LAYOUT = os.getenv('EXPORT_LAYOUT', 'bilingual')  # bilingual（左原文右译文）或 translated（仅译文）
+
+    # 响应压缩配置（gzip，安装brotli后优先使用br）
+    COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    COMPRESSION_LEVEL = int(os.getenv('COMPRESSION_LEVEL', '6'))  # gzip压缩级别 1-9
+    COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', '5'))  # brotli压缩质量 0-11
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))  # 小于该字节数的响应不压缩
+
+    # 结果分页配置
+    RESULT_PAGE_LIMIT = int(os.getenv('RESULT_PAGE_LIMIT', '50'))  # 分页接口默认每次返回的页数
+    RESULT_PAGE_MAX_LIMIT = int(os.getenv('RESULT_PAGE_MAX_LIMIT', '500'))  # 分页接口每次最多返回的页数
+
+    # 监控配置
+    TRACE_LOG = os.getenv('TRACE_LOG', 'false').lower() in ('1', 'true', 'yes')  # 将各阶段耗时写入 DATA_FOLDER/traces/*.jsonl
+
+    # 生产服务配置（gunicorn.conf.py）
+    SERVER_HOST = os.getenv('SERVER_HOST', '0.0.0.0')
+    SERVER_PORT = int(os.getenv('SERVER_PORT', '5000'))
+    SERVER_THREADS = int(os.getenv('SERVER_THREADS', '32'))  # 每个进程处理请求的线程数（长时间的翻译和SSE请求各占一个）
+    SERVER_GRACEFUL_TIMEOUT = int(os.getenv('SERVER_GRACEFUL_TIMEOUT', '30'))  # 停止时等待进行中的请求和任务的秒数
+    STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', str(365 * 24 * 3600)))  # 带哈希文件名的前端资源的缓存时间（秒）
+
     # 文件上传配置
     UPLOAD_FOLDER = 'uploads'
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
+    MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH_MB', '16')) * 1024 * 1024  # 单个请求体上限（一次性上传或一个分块）
+    MAX_UPLOAD_SIZE = int(os.getenv('MAX_UPLOAD_SIZE_MB', '1024')) * 1024 * 1024  # 分块上传的文件大小上限
+    UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE_MB', '8')) * 1024 * 1024  # 建议客户端使用的分块大小
+    UPLOAD_SESSION_TTL = float(os.getenv('UPLOAD_SESSION_TTL', str(24 * 3600)))  # 未完成的上传会话保留时间（秒）
     ALLOWED_EXTENSIONS = {'pdf'}
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional
+
+from config import Config
+from layout import BlockTable
+
+_FILE_ID = re.compile(r'[0-9a-f]{64}')
+
+
+def file_hash(path: str, block_size: int = 1024 * 1024) -> str:
+    """
+    计算文件内容的SHA-256，按块读取避免一次性载入整个文件
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def is_file_id(value) -> bool:
+    """是否为file_hash生成的文件标识（64位小写十六进制SHA-256）；客户端传入的file_id会用于拼接文件路径，使用前必须校验"""
+    return isinstance(value, str) and _FILE_ID.fullmatch(value) is not None
+
+
+class DocumentStore:
+    """
+    已解析PDF的本地存储，按文件内容哈希寻址
+    每页文本zlib压缩后单独存一行，读取时只加载需要的页面；文本块（BlockTable）以列式二进制保存在blocks列
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS documents ('
+            ' file_id TEXT PRIMARY KEY,'
+            ' total_pages INTEGER NOT NULL,'
+            ' created_at REAL NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS pages ('
+            ' file_id TEXT NOT NULL,'
+            ' page INTEGER NOT NULL,'
+            ' text BLOB NOT NULL,'
+            ' bbox TEXT,'
+            ' blocks BLOB,'
+            ' PRIMARY KEY (file_id, page))'
+        )
+        # 旧版本创建的表没有blocks列
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(pages)')}
+        if 'blocks' not in columns:
+            self._conn.execute('ALTER TABLE pages ADD COLUMN blocks BLOB')
+        self._conn.commit()
+
+    def has(self, file_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute('SELECT 1 FROM documents WHERE file_id = ?', (file_id,)).fetchone()
+            return row is not None
+
+    def save(self, file_id: str, pdf_data: Dict):
+        """
+        保存PDFParser.extract_text()的解析结果
+        """
+        rows = [
+            (file_id, p['page'], zlib.compress(p['text'].encode('utf-8')), json.dumps(p.get('bbox')),
+             p['blocks'].to_bytes() if p.get('blocks') is not None else None)
+            for p in pdf_data['pages']
+        ]
+        with self._lock:
+            self._conn.execute('DELETE FROM pages WHERE file_id = ?', (file_id,))
+            self._conn.executemany(
+                'INSERT INTO pages (file_id, page, text, bbox, blocks) VALUES (?, ?, ?, ?, ?)', rows
+            )
+            self._conn.execute(
+                'INSERT OR REPLACE INTO documents (file_id, total_pages, created_at) VALUES (?, ?, ?)',
+                (file_id, pdf_data['total_pages'], time.time())
+            )
+            self._conn.commit()
+
+    def get_total_pages(self, file_id: str) -> Optional[int]:
+        with self._lock:
+            row = self._conn.execute('SELECT total_pages FROM documents WHERE file_id = ?', (file_id,)).fetchone()
+            return row[0] if row else None
+
+    def get_page_sizes(self, file_id: str) -> Dict[int, Optional[tuple]]:
+        """返回 页码 -> 页面bbox，不读取文本"""
+        with self._lock:
+            rows = self._conn.execute('SELECT page, bbox FROM pages WHERE file_id = ?', (file_id,)).fetchall()
+        return {page: tuple(json.loads(bbox)) if bbox and bbox != 'null' else None for page, bbox in rows}
+
+    def load_pages(self, file_id: str, page_numbers: List[int] = None, include_blocks: bool = False) -> List[Dict]:
+        """
+        读取页面，page_numbers为空时返回全部有文本的页面（按页码排序）
+        include_blocks为True时附带文本块（按块提取的文档才有blocks）
+        """
+        sql = 'SELECT page, text, bbox, %s FROM pages WHERE file_id = ?' % ('blocks' if include_blocks else 'NULL')
+        with self._lock:
+            if not page_numbers:
+                rows = self._conn.execute(sql + ' ORDER BY page', (file_id,)).fetchall()
+            else:
+                # 分批查询，避免超出SQLite的参数个数限制
+                wanted = sorted(set(int(p) for p in page_numbers))
+                rows = []
+                for i in range(0, len(wanted), 500):
+                    batch = wanted[i:i + 500]
+                    rows.extend(self._conn.execute(
+                        sql + ' AND page IN (%s) ORDER BY page' % ','.join('?' * len(batch)),
+                        [file_id] + batch
+                    ).fetchall())
+
+        return [self._row_to_page(row) for row in rows]
+
+    def load_page_range(self, file_id: str, start: int = 1, end: int = None, limit: int = None,
+                        include_bbox: bool = True, include_blocks: bool = False) -> List[Dict]:
+        """
+        按页码区间读取页面（包含start和end，end为空表示到最后一页），最多返回limit页
+        """
+        sql = 'SELECT page, text, bbox, %s FROM pages WHERE file_id = ? AND page >= ?' % (
+            'blocks' if include_blocks else 'NULL'
+        )
+        params = [file_id, start]
+        if end is not None:
+            sql += ' AND page <= ?'
+            params.append(end)
+        sql += ' ORDER BY page'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        pages = [self._row_to_page(row) for row in rows]
+        if not include_bbox:
+            for page in pages:
+                page.pop('bbox')
+        return pages
+
+    @staticmethod
+    def _row_to_page(row) -> Dict:
+        page, text, bbox, blocks = row
+        page_data = {
+            'page': page,
+            'text': zlib.decompress(text).decode('utf-8'),
+            'bbox': tuple(json.loads(bbox)) if bbox and bbox != 'null' else None
+        }
+        if blocks is not None:
+            page_data['blocks'] = BlockTable.from_bytes(blocks)
+        return page_data
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_document_store() -> DocumentStore:
+    """
+    获取进程内共享的文档存储
+    """
+    global _store
+
+    with _store_lock:
+        if _store is None:
+            _store = DocumentStore(os.path.join(Config.DATA_FOLDER, 'documents.db'))
+        return _store
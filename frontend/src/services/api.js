@@ -29,24 +29,159 @@ api.interceptors.response.use(
   }
 )
 
-// 上传PDF文件
-export const uploadPDF = async (file) => {
-  const formData = new FormData()
-  formData.append('file', file)
-  const response = await api.post('/upload', formData, {
-    headers: { 'Content-Type': 'multipart/form-data' },
-    timeout: 60000 // 上传超时1分钟
-  })
-  return response
+const UPLOAD_RETRIES = 3
+
+// 同一文件的上传会话保存在localStorage中，刷新页面后可从断点继续
+const uploadSessionKey = (file) => `pdf-upload:${file.name}:${file.size}:${file.lastModified}`
+
+const resumeUploadSession = async (file) => {
+  const uploadId = localStorage.getItem(uploadSessionKey(file))
+  if (uploadId) {
+    try {
+      return await api.get(`/uploads/${uploadId}`)
+    } catch (error) {
+      localStorage.removeItem(uploadSessionKey(file))
+    }
+  }
+  const session = await api.post('/uploads', { filename: file.name, size: file.size })
+  if (!session.completed) {
+    localStorage.setItem(uploadSessionKey(file), session.upload_id)
+  }
+  return session
+}
+
+// 分块上传PDF文件，onProgress(0-100)报告进度；网络中断时查询服务端偏移后重试
+export const uploadPDF = async (file, onProgress = null) => {
+  let session = await resumeUploadSession(file)
+  let offset = session.offset || 0
+  let retries = 0
+
+  while (!session.completed) {
+    const chunk = file.slice(offset, offset + session.chunk_size)
+    try {
+      const result = await api.put(`/uploads/${session.upload_id}`, chunk, {
+        headers: { 'Content-Type': 'application/octet-stream', 'Upload-Offset': offset },
+        timeout: 120000,
+        onUploadProgress: (event) => {
+          onProgress?.(Math.floor((offset + event.loaded) / file.size * 100))
+        }
+      })
+      session = result.completed ? result : { ...session, ...result }
+      offset = result.offset ?? offset
+      retries = 0
+    } catch (error) {
+      if (++retries > UPLOAD_RETRIES) {
+        throw error
+      }
+      // 以服务端记录的偏移为准继续上传
+      const current = await api.get(`/uploads/${session.upload_id}`)
+      offset = current.offset
+    }
+  }
+
+  localStorage.removeItem(uploadSessionKey(file))
+  onProgress?.(100)
+  return session
 }
 
 // 翻译PDF
-export const translatePDF = async (filepath, pageNumbers = null) => {
+export const translatePDF = async (fileId, pageNumbers = null) => {
   const response = await api.post('/translate', {
-    filepath,
+    file_id: fileId,
     page_numbers: pageNumbers
   })
   return response
 }
 
+// 提交后台翻译任务，立即返回job_id
+// parent: { parent_job_id } 或 { parent_file_id }，按修订版翻译，与上一版相同的段落直接复用译文
+export const createTranslateJob = async (fileId, pageNumbers = null, parent = {}) => {
+  const response = await api.post('/jobs', {
+    file_id: fileId,
+    page_numbers: pageNumbers,
+    ...parent
+  }, { timeout: 60000 })
+  return response
+}
+
+// 查询任务进度
+export const getTranslateJob = async (jobId) => {
+  const response = await api.get(`/jobs/${jobId}`, { timeout: 30000 })
+  return response
+}
+
+// 获取任务结果（任务未完成时为已翻译的部分页面）
+// params: { start, end, limit, include_original }，不传limit时返回区间内的全部页面
+export const getTranslateJobResult = async (jobId, params = {}) => {
+  const response = await api.get(`/jobs/${jobId}/result`, { params, timeout: 60000 })
+  return response
+}
+
+// 分页读取已解析的原文 params: { start, end, limit, include_bbox }
+export const getDocumentPages = async (fileId, params = {}) => {
+  const response = await api.get(`/documents/${fileId}/pages`, { params, timeout: 60000 })
+  return response
+}
+
+// 任务结果PDF的下载地址，layout: 'bilingual'（左原文右译文）或 'translated'（仅译文）
+export const getJobExportUrl = (jobId, layout = 'bilingual') => {
+  return `${api.defaults.baseURL}/jobs/${jobId}/export?layout=${layout}`
+}
+
+// 批量翻译：files为File数组（multipart上传），或documents为 [{ file_id, page_numbers }]
+export const createTranslateBatch = async ({ files = null, documents = null, user = null } = {}) => {
+  if (files) {
+    const form = new FormData()
+    for (const file of files) form.append('files', file)
+    if (user) form.append('user', user)
+    return api.post('/batches', form, { headers: { 'Content-Type': 'multipart/form-data' }, timeout: 300000 })
+  }
+  return api.post('/batches', { documents, user }, { timeout: 60000 })
+}
+
+// 查询批量任务进度（每个文档的状态和合计页数）
+export const getTranslateBatch = async (batchId) => {
+  const response = await api.get(`/batches/${batchId}`, { timeout: 30000 })
+  return response
+}
+
+// 取消批量任务中所有未结束的文档
+export const cancelTranslateBatch = async (batchId) => {
+  const response = await api.post(`/batches/${batchId}/cancel`, null, { timeout: 30000 })
+  return response
+}
+
+// 取消任务
+export const cancelTranslateJob = async (jobId) => {
+  const response = await api.post(`/jobs/${jobId}/cancel`, null, { timeout: 30000 })
+  return response
+}
+
+// 恢复失败或已取消的任务，只翻译未完成的部分
+export const resumeTranslateJob = async (jobId) => {
+  const response = await api.post(`/jobs/${jobId}/resume`, null, { timeout: 30000 })
+  return response
+}
+
+// 流式翻译（Server-Sent Events），返回EventSource，调用close()可中止
+export const streamTranslation = ({ fileId, pageNumbers }, handlers = {}) => {
+  const params = new URLSearchParams()
+  params.set('file_id', fileId)
+  if (pageNumbers && pageNumbers.length) params.set('pages', pageNumbers.join(','))
+
+  const source = new EventSource(`${api.defaults.baseURL}/translate/stream?${params}`)
+  const events = ['start', 'page_start', 'delta', 'page', 'done', 'error']
+
+  for (const name of events) {
+    source.addEventListener(name, (event) => {
+      // 连接断开时浏览器也会触发无数据的error事件
+      const data = event.data ? JSON.parse(event.data) : { error: '连接已断开' }
+      if (name === 'done' || name === 'error') source.close()
+      handlers[name]?.(data)
+    })
+  }
+
+  return source
+}
+
 export default api
@@ -1,36 +1,229 @@
 import { defineStore } from 'pinia'
-import { ref, computed } from 'vue'
+import { ref, computed, shallowReactive } from 'vue'
+import { getTranslateJobResult, getDocumentPages } from '../services/api'
+
+// 内存中最多保留的页面结果数，超出后淘汰最久未访问的页面，需要时再从后端读取
+const PAGE_CACHE_SIZE = 200
+// 流式翻译的译文只在前端，无法重新读取；超过该页数后丢弃最久未访问的已完成页面
+const STREAM_PAGE_LIMIT = 1000
+// 单次区间请求的最大页数（不超过后端的 RESULT_PAGE_MAX_LIMIT）
+const FETCH_LIMIT = 100
 
 export const useTranslationStore = defineStore('translation', () => {
   // 状态
   const currentFile = ref(null)
   const totalPages = ref(0)
-  const translatedPages = ref([])
+  // 已有翻译结果的页码（有序），结果列表按它布局，页面内容按需加载到pageCache
+  const resultPages = ref([])
+  // 页码 -> 页面结果，只保留最近访问的PAGE_CACHE_SIZE页的完整内容
+  const pageCache = shallowReactive(new Map())
+  // 结果来源：后台任务的结果从 /jobs/<id>/result 读取；流式翻译的译文只在前端，原文从 /documents 读取
+  const resultJobId = ref(null)
   const isUploading = ref(false)
   const isTranslating = ref(false)
   const uploadProgress = ref(0)
   const translateProgress = ref(0)
+  const translateTotal = ref(0)
+  const currentJobId = ref(null)
   const error = ref(null)
+  // 流式翻译中因超过STREAM_PAGE_LIMIT被丢弃的页数
+  const droppedPages = ref(0)
+
+  let loadedOrder = new Map() // 内容完整的页码，按最近访问排序（非响应式，渲染时读取不会触发更新）
+  let pendingFetches = new Map() // 请求中的区间 "start-end" -> Promise，避免滚动时重复请求
+  let finishedOrder = new Map() // 流式翻译已完成的页码，按最近访问排序
 
   // 计算属性
   const hasFile = computed(() => currentFile.value !== null)
-  const hasResults = computed(() => translatedPages.value.length > 0)
+  const hasResults = computed(() => resultPages.value.length > 0)
   const translateProgressPercent = computed(() => {
-    if (totalPages.value === 0) return 0
-    return Math.round((translateProgress.value / totalPages.value) * 100)
+    const total = translateTotal.value || totalPages.value
+    if (total === 0) return 0
+    return Math.round((translateProgress.value / total) * 100)
   })
 
   // 方法
   function setFile(fileInfo) {
     currentFile.value = fileInfo
     totalPages.value = fileInfo.total_pages || 0
-    translatedPages.value = []
+    clearResults()
     error.value = null
   }
 
-  function setTranslatedPages(pages) {
-    translatedPages.value = pages
-    translateProgress.value = pages.length
+  // 清空结果，resultJobId为空表示结果来自流式翻译
+  function clearResults(jobId = null) {
+    resultPages.value = []
+    pageCache.clear()
+    loadedOrder = new Map()
+    pendingFetches = new Map()
+    finishedOrder = new Map()
+    droppedPages.value = 0
+    resultJobId.value = jobId
+  }
+
+  // 后台任务：更新已有结果的页码，页面内容在显示时再按区间读取
+  function setResultPages(pages) {
+    resultPages.value = pages
+  }
+
+  function getPage(page) {
+    return pageCache.get(page)
+  }
+
+  function touchPage(page) {
+    loadedOrder.delete(page)
+    loadedOrder.set(page, true)
+    if (finishedOrder.delete(page)) finishedOrder.set(page, true)
+  }
+
+  function cachePage(pageResult) {
+    pageCache.set(pageResult.page, pageResult)
+    touchPage(pageResult.page)
+    evictPages()
+  }
+
+  function evictPages() {
+    let skipped = 0
+    for (const page of loadedOrder.keys()) {
+      if (loadedOrder.size - skipped <= PAGE_CACHE_SIZE) break
+      const pageResult = pageCache.get(page)
+      if (resultJobId.value) {
+        pageCache.delete(page)
+      } else if (pageResult?.chunks) {
+        // 正在接收增量译文的页面不淘汰
+        skipped += 1
+        continue
+      } else if (pageResult) {
+        // 流式翻译的译文只保存在前端，淘汰时只丢弃可以重新读取的原文
+        const { original, ...rest } = pageResult
+        pageCache.set(page, rest)
+      }
+      loadedOrder.delete(page)
+    }
+  }
+
+  // 流式翻译：已完成的页面超过STREAM_PAGE_LIMIT时整页丢弃最久未访问的页面，并从结果列表中移除
+  function dropFinishedPages() {
+    if (finishedOrder.size <= STREAM_PAGE_LIMIT) return
+    const dropped = new Set()
+    for (const page of finishedOrder.keys()) {
+      if (finishedOrder.size - dropped.size <= STREAM_PAGE_LIMIT) break
+      dropped.add(page)
+    }
+    for (const page of dropped) {
+      finishedOrder.delete(page)
+      loadedOrder.delete(page)
+      pageCache.delete(page)
+    }
+    resultPages.value = resultPages.value.filter(page => !dropped.has(page))
+    droppedPages.value += dropped.size
+  }
+
+  // 确保区间 [start, end] 内已有结果的页面都在内存中，缺少的页面按区间从后端读取
+  async function ensurePages(start, end) {
+    const missing = []
+    for (const page of resultPages.value) {
+      if (page < start || page > end) continue
+      if (isLoaded(pageCache.get(page))) {
+        touchPage(page)
+      } else {
+        missing.push(page)
+      }
+    }
+    if (missing.length === 0) return
+
+    // 按页码跨度不超过FETCH_LIMIT分组，每组一次区间请求
+    const requests = []
+    let groupStart = missing[0]
+    let groupEnd = missing[0]
+    for (const page of missing.slice(1)) {
+      if (page - groupStart >= FETCH_LIMIT) {
+        requests.push(fetchRange(groupStart, groupEnd))
+        groupStart = page
+      }
+      groupEnd = page
+    }
+    requests.push(fetchRange(groupStart, groupEnd))
+    await Promise.all(requests)
+  }
+
+  function isLoaded(pageResult) {
+    return pageResult !== undefined && pageResult.original !== undefined
+  }
+
+  function fetchRange(start, end) {
+    const key = `${start}-${end}`
+    if (pendingFetches.has(key)) return pendingFetches.get(key)
+
+    const jobId = resultJobId.value
+    const fileId = currentFile.value?.file_id
+    const fetches = pendingFetches
+    const params = { start, end, limit: end - start + 1 }
+    const request = (jobId
+      ? getTranslateJobResult(jobId, params).then(result => {
+          if (resultJobId.value !== jobId) return
+          result.translated_pages.forEach(cachePage)
+        })
+      : getDocumentPages(fileId, params).then(result => {
+          if (resultJobId.value !== null || currentFile.value?.file_id !== fileId) return
+          for (const { page, text } of result.pages) {
+            const pageResult = pageCache.get(page)
+            if (pageResult) cachePage({ ...pageResult, original: text })
+          }
+        })
+    ).finally(() => fetches.delete(key))
+
+    fetches.set(key, request)
+    return request
+  }
+
+  // 流式翻译：插入或更新单个页面，保持页码有序
+  function upsertTranslatedPage(pageResult) {
+    const existing = pageCache.get(pageResult.page)
+    cachePage(existing ? { ...existing, ...pageResult } : pageResult)
+
+    const pages = resultPages.value
+    if (pages.includes(pageResult.page)) return
+
+    const insertAt = pages.findIndex(p => p > pageResult.page)
+    if (insertAt < 0) {
+      pages.push(pageResult.page)
+    } else {
+      pages.splice(insertAt, 0, pageResult.page)
+    }
+  }
+
+  // 流式翻译：页面翻译完成，写入最终译文
+  function finishTranslatedPage(pageResult) {
+    upsertTranslatedPage({ ...pageResult, chunks: undefined })
+    finishedOrder.delete(pageResult.page)
+    finishedOrder.set(pageResult.page, true)
+    dropFinishedPages()
+  }
+
+  // 流式翻译：追加某页某分块的增量译文
+  function appendPageDelta(page, chunk, text) {
+    const pageResult = pageCache.get(page)
+    if (!pageResult) return
+
+    const chunks = pageResult.chunks || []
+    chunks[chunk] = (chunks[chunk] || '') + text
+    pageCache.set(page, {
+      ...pageResult,
+      chunks,
+      translated: chunks.filter(Boolean).join('\n\n')
+    })
+  }
+
+  function setJob(jobId) {
+    currentJobId.value = jobId
+    translateProgress.value = 0
+    translateTotal.value = 0
+  }
+
+  function setJobProgress(completed, total) {
+    translateProgress.value = completed
+    translateTotal.value = total
   }
 
   function setUploading(value) {
@@ -48,11 +241,13 @@ export const useTranslationStore = defineStore('translation', () => {
   function reset() {
     currentFile.value = null
     totalPages.value = 0
-    translatedPages.value = []
+    clearResults()
     isUploading.value = false
     isTranslating.value = false
     uploadProgress.value = 0
     translateProgress.value = 0
+    translateTotal.value = 0
+    currentJobId.value = null
     error.value = null
   }
 
@@ -60,19 +255,31 @@ export const useTranslationStore = defineStore('translation', () => {
     // 状态
     currentFile,
     totalPages,
-    translatedPages,
+    resultPages,
+    resultJobId,
     isUploading,
     isTranslating,
     uploadProgress,
     translateProgress,
+    translateTotal,
+    currentJobId,
     error,
+    droppedPages,
     // 计算属性
     hasFile,
     hasResults,
     translateProgressPercent,
     // 方法
     setFile,
-    setTranslatedPages,
+    clearResults,
+    setResultPages,
+    getPage,
+    ensurePages,
+    upsertTranslatedPage,
+    finishTranslatedPage,
+    appendPageDelta,
+    setJob,
+    setJobProgress,
     setUploading,
     setTranslating,
     setError,
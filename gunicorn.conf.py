@@ -0,0 +1,60 @@
+"""
+gunicorn配置：gunicorn -c gunicorn.conf.py wsgi:app
+监听地址、线程数等从环境变量（.env）读取，见config.py中的生产服务配置
+"""
+import os
+import signal
+
+from config import Config
+
+chdir = os.path.dirname(os.path.abspath(__file__))
+bind = f"{Config.SERVER_HOST}:{Config.SERVER_PORT}"
+
+# 翻译请求主要在等待模型接口，用多线程worker处理并发的长请求和SSE连接
+worker_class = 'gthread'
+# 后台任务在进程内执行（取消任务、SSE推送、限流器和/metrics指标都是进程内状态），固定为单进程，用线程数调整并发
+workers = 1
+threads = Config.SERVER_THREADS
+# gthread的心跳不受请求时长影响，timeout只用于发现卡死的进程
+timeout = 120
+keepalive = 5
+# 收到SIGTERM时SSE连接立即结束，等待进行中的请求和停止后台任务同时进行，共用SERVER_GRACEFUL_TIMEOUT秒，
+# 另加10秒用于保存检查点和关闭连接，超时后主进程强制结束工作进程
+graceful_timeout = Config.SERVER_GRACEFUL_TIMEOUT + 10
+# 每个进程独立导入应用，各自创建客户端池和任务管理器
+preload_app = False
+
+accesslog = '-'
+errorlog = '-'
+
+
+def on_starting(server):
+    """主进程启动时执行一次：为前端构建产物生成预压缩文件"""
+    from compression import precompress_static
+
+    created = precompress_static(os.path.join(chdir, 'frontend', 'dist'))
+    if created:
+        server.log.info(f"已生成 {created} 个预压缩文件")
+
+
+def post_worker_init(worker):
+    from wsgi import begin_shutdown, warm_up
+
+    warm_up()
+
+    # worker在退出请求循环、等待进行中的请求之后才调用worker_exit，
+    # 所以收到SIGTERM时先开始停止后台任务，再交给gunicorn原有的处理
+    handle_exit = worker.handle_exit
+
+    def handle_term(sig, frame):
+        begin_shutdown()
+        handle_exit(sig, frame)
+
+    signal.signal(signal.SIGTERM, handle_term)
+    signal.siginterrupt(signal.SIGTERM, False)
+
+
+def worker_exit(server, worker):
+    from wsgi import shutdown
+
+    shutdown()
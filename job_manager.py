@@ -0,0 +1,829 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from boilerplate import find_boilerplate
+from config import Config
+from document_store import get_document_store
+from metrics import JOBS, JOBS_RUNNING, JOB_QUEUE_SECONDS, span, trace_context
+from pdf_parser import PDFParser
+from pdf_writer import EXPORT_LAYOUTS, TranslationPDFWriter
+from rate_limiter import fair_share
+from revision import align_revision, paragraph_hash, paragraph_pairs, split_paragraphs
+from translator import get_translator, TranslationCancelled
+from upload_store import get_upload_store
+
+# 任务状态
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED_STATUSES = (COMPLETED, FAILED, CANCELLED)
+
+
+def export_path(job_id: str, layout: str) -> str:
+    """任务导出的PDF文件路径"""
+    return os.path.join(Config.DATA_FOLDER, 'exports', f"{job_id}.{layout}.pdf")
+
+
+class JobStore:
+    """翻译任务状态的本地存储（SQLite），记录任务进度和每页的翻译结果"""
+
+    def __init__(self, db_path: str):
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            ' job_id TEXT PRIMARY KEY,'
+            ' file_id TEXT NOT NULL,'
+            ' page_numbers TEXT,'
+            ' status TEXT NOT NULL,'
+            ' total_pages INTEGER NOT NULL DEFAULT 0,'
+            ' completed_pages INTEGER NOT NULL DEFAULT 0,'
+            ' error TEXT,'
+            ' created_at REAL NOT NULL,'
+            ' updated_at REAL NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS job_pages ('
+            ' job_id TEXT NOT NULL,'
+            ' page INTEGER NOT NULL,'
+            ' status TEXT NOT NULL,'
+            ' original TEXT,'
+            ' translated TEXT,'
+            ' error TEXT,'
+            ' PRIMARY KEY (job_id, page))'
+        )
+        # 分块级检查点：页面未全部完成前，已翻译的分块先保存在这里，恢复任务时不再重复请求
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS job_chunks ('
+            ' job_id TEXT NOT NULL,'
+            ' page INTEGER NOT NULL,'
+            ' chunk INTEGER NOT NULL,'
+            ' source_hash TEXT NOT NULL,'
+            ' translated TEXT NOT NULL,'
+            ' PRIMARY KEY (job_id, page, chunk))'
+        )
+        # 段落级译文：供之后提交的修订版（parent_id指向本任务）复用
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS job_segments ('
+            ' job_id TEXT NOT NULL,'
+            ' source_hash TEXT NOT NULL,'
+            ' page INTEGER NOT NULL,'
+            ' translated TEXT NOT NULL,'
+            ' PRIMARY KEY (job_id, source_hash))'
+        )
+        # 批量任务：每个文档是一个普通任务（jobs.batch_id指向批次），boilerplate为跨文档重复出现的行
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS batches ('
+            ' batch_id TEXT PRIMARY KEY,'
+            ' user_id TEXT,'
+            ' boilerplate TEXT,'
+            ' created_at REAL NOT NULL)'
+        )
+        # 旧版本创建的表没有修订版、批量任务、执行进程和失败页数相关的列
+        # owner为正在执行任务的进程，heartbeat_at为该进程最近一次心跳，用于判断未完成的任务是否已无人执行
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(jobs)')}
+        for column, column_type in (('parent_id', 'TEXT'), ('revision', 'TEXT'), ('batch_id', 'TEXT'),
+                                    ('user_id', 'TEXT'), ('owner', 'TEXT'), ('heartbeat_at', 'REAL'),
+                                    ('failed_pages', 'INTEGER NOT NULL DEFAULT 0')):
+            if column not in columns:
+                self._conn.execute(f'ALTER TABLE jobs ADD COLUMN {column} {column_type}')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch_id)')
+        self._conn.commit()
+
+    def create(self, job_id: str, file_id: str, page_numbers: Optional[List[int]], parent_id: str = None,
+               user_id: str = None, owner: str = None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO jobs (job_id, file_id, page_numbers, status, parent_id, user_id, owner, heartbeat_at, '
+                'created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (job_id, file_id, json.dumps(page_numbers), QUEUED, parent_id, user_id, owner, now, now, now)
+            )
+            self._conn.commit()
+
+    def create_batch(self, batch_id: str, user_id: Optional[str], jobs: List[Tuple[str, str, Optional[List[int]]]],
+                     owner: str = None):
+        """创建批次和其中每个文档的任务，jobs为 [(job_id, file_id, page_numbers), ...]"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO batches (batch_id, user_id, created_at) VALUES (?, ?, ?)', (batch_id, user_id, now)
+            )
+            self._conn.executemany(
+                'INSERT INTO jobs (job_id, file_id, page_numbers, status, batch_id, user_id, owner, heartbeat_at, '
+                'created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(job_id, file_id, json.dumps(page_numbers), QUEUED, batch_id, user_id, owner, now, now, now)
+                 for job_id, file_id, page_numbers in jobs]
+            )
+            self._conn.commit()
+
+    def set_batch_boilerplate(self, batch_id: str, lines: List[str]):
+        with self._lock:
+            self._conn.execute(
+                'UPDATE batches SET boilerplate = ? WHERE batch_id = ?',
+                (json.dumps(lines, ensure_ascii=False), batch_id)
+            )
+            self._conn.commit()
+
+    def get_batch_boilerplate(self, batch_id: str) -> List[str]:
+        with self._lock:
+            row = self._conn.execute('SELECT boilerplate FROM batches WHERE batch_id = ?', (batch_id,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else []
+
+    def get_batch(self, batch_id: str) -> Optional[Dict]:
+        """批次进度：每个文档的任务状态和页数，以及合计"""
+        with self._lock:
+            batch = self._conn.execute(
+                'SELECT batch_id, user_id, created_at FROM batches WHERE batch_id = ?', (batch_id,)
+            ).fetchone()
+            if batch is None:
+                return None
+            rows = self._conn.execute(
+                'SELECT job_id, file_id, status, total_pages, completed_pages, failed_pages, error, updated_at '
+                'FROM jobs WHERE batch_id = ? ORDER BY created_at, rowid',
+                (batch_id,)
+            ).fetchall()
+
+        documents = [
+            {'job_id': job_id, 'file_id': file_id, 'status': status, 'total_pages': total_pages,
+             'completed_pages': completed_pages, 'failed_pages': failed_pages, 'error': error,
+             'updated_at': updated_at}
+            for job_id, file_id, status, total_pages, completed_pages, failed_pages, error, updated_at in rows
+        ]
+        counts = {}
+        for document in documents:
+            counts[document['status']] = counts.get(document['status'], 0) + 1
+
+        return {
+            'batch_id': batch[0],
+            'user_id': batch[1],
+            'created_at': batch[2],
+            'status': _batch_status(counts),
+            'total_documents': len(documents),
+            'finished_documents': sum(counts.get(status, 0) for status in FINISHED_STATUSES),
+            'status_counts': counts,
+            # 尚未解析的文档total_pages为0，解析后计入
+            'total_pages': sum(d['total_pages'] for d in documents),
+            'completed_pages': sum(d['completed_pages'] for d in documents),
+            'failed_pages': sum(d['failed_pages'] for d in documents),
+            'documents': documents
+        }
+
+    def get_batch_jobs(self, batch_id: str) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute('SELECT job_id FROM jobs WHERE batch_id = ?', (batch_id,)).fetchall()
+        return [row[0] for row in rows]
+
+    def find_latest(self, file_id: str) -> Optional[str]:
+        """返回该文件最近一个有已完成页面的任务，用于按文件哈希指定修订版的上一版"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT job_id FROM jobs WHERE file_id = ? AND completed_pages > 0 '
+                'ORDER BY (status = ?) DESC, updated_at DESC LIMIT 1',
+                (file_id, COMPLETED)
+            ).fetchone()
+        return row[0] if row else None
+
+    def save_segments(self, job_id: str, page: int, segments: List[tuple]):
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO job_segments (job_id, source_hash, page, translated) VALUES (?, ?, ?, ?)',
+                [(job_id, paragraph_hash(source), page, translated) for source, translated in segments]
+            )
+            self._conn.commit()
+
+    def get_revision_source(self, job_id: str):
+        """
+        返回修订版对齐所需的上一版数据：(按页码排列的段落哈希, {段落哈希: 译文})
+        段落译文优先取job_segments；没有记录的（如早期版本的任务）从整页原文和译文逐段对应
+        """
+        hashes = []
+        translations = {}
+        for page_result in self.iter_results(job_id):
+            hashes.extend(paragraph_hash(paragraph) for paragraph in split_paragraphs(page_result['original']))
+            if not page_result.get('error'):
+                for source, translated in paragraph_pairs(page_result['original'], page_result['translated']):
+                    translations[paragraph_hash(source)] = translated
+
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT source_hash, translated FROM job_segments WHERE job_id = ?', (job_id,)
+            ).fetchall()
+        translations.update(rows)
+        return hashes, translations
+
+    def set_revision(self, job_id: str, stats: Dict):
+        with self._lock:
+            self._conn.execute('UPDATE jobs SET revision = ? WHERE job_id = ?', (json.dumps(stats), job_id))
+            self._conn.commit()
+
+    def set_pages(self, job_id: str, pages: List[Dict]) -> List[int]:
+        """
+        登记任务要翻译的页面，返回尚未成功翻译的页码
+        首次执行时所有页面均为pending；恢复执行时保留已完成的页面，失败的页面重置为pending
+        """
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO job_pages (job_id, page, status, original) VALUES (?, ?, ?, ?)',
+                [(job_id, p['page'], 'pending', p['text']) for p in pages]
+            )
+            self._conn.execute(
+                "UPDATE job_pages SET status = 'pending', error = NULL WHERE job_id = ? AND status = 'error'",
+                (job_id,)
+            )
+            done = self._conn.execute(
+                "SELECT COUNT(*) FROM job_pages WHERE job_id = ? AND status = 'done'", (job_id,)
+            ).fetchone()[0]
+            self._conn.execute(
+                'UPDATE jobs SET total_pages = ?, completed_pages = ?, failed_pages = 0, updated_at = ? '
+                'WHERE job_id = ?',
+                (len(pages), done, time.time(), job_id)
+            )
+            rows = self._conn.execute(
+                "SELECT page FROM job_pages WHERE job_id = ? AND status != 'done' ORDER BY page", (job_id,)
+            ).fetchall()
+            self._conn.commit()
+        return [row[0] for row in rows]
+
+    def save_chunk(self, job_id: str, page: int, chunk: int, source_hash: str, translated: str):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO job_chunks (job_id, page, chunk, source_hash, translated) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (job_id, page, chunk, source_hash, translated)
+            )
+            self._conn.commit()
+
+    def get_checkpoint(self, job_id: str) -> Dict:
+        """返回已保存的分块译文 {(页码, 分块哈希): 译文}"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT page, source_hash, translated FROM job_chunks WHERE job_id = ?', (job_id,)
+            ).fetchall()
+        return {(page, source_hash): translated for page, source_hash, translated in rows}
+
+    def save_page(self, job_id: str, page_result: Dict):
+        status = 'error' if page_result.get('error') else 'done'
+        with self._lock:
+            self._conn.execute(
+                'UPDATE job_pages SET status = ?, translated = ?, error = ? WHERE job_id = ? AND page = ?',
+                (status, page_result['translated'], page_result.get('error'), job_id, page_result['page'])
+            )
+            if status == 'done':
+                # 整页译文已保存，不再需要该页的分块检查点
+                self._conn.execute(
+                    'DELETE FROM job_chunks WHERE job_id = ? AND page = ?', (job_id, page_result['page'])
+                )
+            # completed_pages只统计翻译成功的页面，失败的页面计入failed_pages
+            counter = 'completed_pages' if status == 'done' else 'failed_pages'
+            self._conn.execute(
+                f'UPDATE jobs SET {counter} = {counter} + 1, updated_at = ? WHERE job_id = ?',
+                (time.time(), job_id)
+            )
+            self._conn.commit()
+
+    def set_status(self, job_id: str, status: str, error: str = None):
+        with self._lock:
+            self._conn.execute(
+                'UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ?',
+                (status, error, time.time(), job_id)
+            )
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT job_id, file_id, page_numbers, status, total_pages, completed_pages, error, '
+                'created_at, updated_at, parent_id, revision, batch_id, user_id, failed_pages FROM jobs WHERE job_id = ?',
+                (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            pages = self._conn.execute(
+                'SELECT page, status FROM job_pages WHERE job_id = ? ORDER BY page', (job_id,)
+            ).fetchall()
+
+        return {
+            'job_id': row[0],
+            'file_id': row[1],
+            'page_numbers': json.loads(row[2]) if row[2] else None,
+            'status': row[3],
+            'total_pages': row[4],
+            'completed_pages': row[5],
+            'error': row[6],
+            'created_at': row[7],
+            'updated_at': row[8],
+            'parent_id': row[9],
+            'revision': json.loads(row[10]) if row[10] else None,
+            'batch_id': row[11],
+            'user_id': row[12],
+            'failed_pages': row[13],
+            'pages': [{'page': page, 'status': status} for page, status in pages]
+        }
+
+    def get_results(self, job_id: str, start: int = 1, end: int = None, limit: int = None,
+                    include_original: bool = True) -> List[Dict]:
+        """
+        返回已完成页面的翻译结果（按页码排序），可按页码区间 [start, end] 和条数limit分页
+        include_original为False时不返回原文（客户端已有原文时减少传输量）
+        """
+        columns = 'page, original, translated, error' if include_original else 'page, NULL, translated, error'
+        sql = f'SELECT {columns} FROM job_pages WHERE job_id = ? AND status != ? AND page >= ?'
+        params = [job_id, 'pending', start]
+        if end is not None:
+            sql += ' AND page <= ?'
+            params.append(end)
+        sql += ' ORDER BY page'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        results = []
+        for page, original, translated, error in rows:
+            page_result = {'page': page}
+            if include_original:
+                page_result['original'] = original
+            page_result['translated'] = translated
+            if error:
+                page_result['error'] = error
+            results.append(page_result)
+        return results
+
+    def iter_results(self, job_id: str, start: int = 1, end: int = None, include_original: bool = True,
+                     batch_size: int = 200) -> Iterator[Dict]:
+        """分批读取翻译结果，内存中最多只保留batch_size页"""
+        while True:
+            batch = self.get_results(job_id, start, end, batch_size, include_original)
+            yield from batch
+            if len(batch) < batch_size:
+                return
+            start = batch[-1]['page'] + 1
+
+    def has_failed_pages(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM job_pages WHERE job_id = ? AND status = 'error' LIMIT 1", (job_id,)
+            ).fetchone()
+        return row is not None
+
+    def claim(self, job_id: str, owner: str) -> bool:
+        """
+        将已结束的任务重新放入队列并由owner执行；多个进程同时恢复同一任务时只有一个成功
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                f'UPDATE jobs SET status = ?, error = NULL, owner = ?, heartbeat_at = ?, updated_at = ? '
+                f'WHERE job_id = ? AND status IN ({",".join("?" * len(FINISHED_STATUSES))})',
+                (QUEUED, owner, now, now, job_id) + FINISHED_STATUSES
+            )
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    def heartbeat(self, owner: str):
+        """刷新owner执行中任务的心跳"""
+        with self._lock:
+            self._conn.execute(
+                'UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND status IN (?, ?)',
+                (time.time(), owner, QUEUED, RUNNING)
+            )
+            self._conn.commit()
+
+    def release(self, owner: str):
+        """进程停止时放弃其排队中的任务，其他进程或下次启动时无需等待心跳超时即可接手"""
+        with self._lock:
+            self._conn.execute(
+                'UPDATE jobs SET owner = NULL WHERE owner = ? AND status IN (?, ?)', (owner, QUEUED, RUNNING)
+            )
+            self._conn.commit()
+
+    def mark_interrupted(self, owner: str, stale_after: float) -> List[Dict]:
+        """
+        接手执行进程已退出的未完成任务：没有执行进程（已停止的进程放弃的任务、旧版本创建的任务），
+        或执行进程超过stale_after秒没有心跳（进程异常退出）的任务，标记为失败并归owner所有
+        （已完成的页面和分块检查点保留，可恢复执行）；其他进程仍在执行的任务不受影响
+        返回这些任务的 {job_id, file_id, page_numbers}
+        """
+        now = time.time()
+        with self._lock:
+            # 多个进程同时启动时，IMMEDIATE事务保证每个任务只被一个进程接手
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self._conn.execute(
+                    'SELECT job_id, file_id, page_numbers FROM jobs WHERE status IN (?, ?) '
+                    'AND (owner IS NULL OR (owner != ? AND COALESCE(heartbeat_at, 0) < ?)) ORDER BY created_at',
+                    (QUEUED, RUNNING, owner, now - stale_after)
+                ).fetchall()
+                self._conn.executemany(
+                    'UPDATE jobs SET status = ?, error = ?, owner = ?, heartbeat_at = ?, updated_at = ? '
+                    'WHERE job_id = ?',
+                    [(FAILED, '服务重启，任务已中断', owner, now, now, row[0]) for row in rows]
+                )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+        return [
+            {'job_id': job_id, 'file_id': file_id, 'page_numbers': json.loads(page_numbers) if page_numbers else None}
+            for job_id, file_id, page_numbers in rows
+        ]
+
+
+def _batch_status(counts: Dict[str, int]) -> str:
+    """批次整体状态：有文档未结束时为running（全部排队中为queued），全部结束后按最差的结果"""
+    unfinished = counts.get(QUEUED, 0) + counts.get(RUNNING, 0)
+    if unfinished:
+        return QUEUED if unfinished == counts.get(QUEUED) == sum(counts.values()) else RUNNING
+    if counts.get(FAILED):
+        return FAILED
+    if counts.get(CANCELLED):
+        return CANCELLED
+    return COMPLETED
+
+
+class JobManager:
+    """
+    后台翻译任务管理器
+    提交任务后立即返回job_id，翻译在后台线程池中执行，进度和结果写入JobStore
+    """
+
+    def __init__(self, store: JobStore, max_workers: int = 2, auto_resume: bool = True, batch_workers: int = 8,
+                 heartbeat_interval: float = 10.0, owner_timeout: float = 60.0):
+        self.store = store
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='translate-job')
+        # 批量任务的文档使用单独的线程池，不占用单个任务的名额
+        self.batch_executor = ThreadPoolExecutor(max_workers=batch_workers, thread_name_prefix='translate-batch')
+        self._cancel_events = {}
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+        # 同一时间只解析一个文档：大文档的解析本身使用多进程，多个任务和批次同时解析会使进程数成倍增加
+        self._parse_lock = threading.Lock()
+        self._draining = False
+        self.auto_resume = auto_resume
+        # 本进程的标识（pid可能被复用，加随机后缀），写入所执行任务的owner列
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.heartbeat_interval = heartbeat_interval
+        self.owner_timeout = owner_timeout
+        self._stopped = threading.Event()
+
+        # 只接手执行进程已退出的任务，同一数据目录下其他进程仍在执行的任务不会被重复执行
+        self._recover()
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name='job-heartbeat', daemon=True)
+        self._heartbeat_thread.start()
+
+    def _recover(self):
+        interrupted = self.store.mark_interrupted(self.owner, self.owner_timeout)
+        if self.auto_resume:
+            # 中断的任务从检查点继续执行
+            for job in interrupted:
+                self.resume(job['job_id'])
+
+    def _heartbeat_loop(self):
+        """定期刷新本进程任务的心跳，并接手其他进程异常退出后遗留的任务"""
+        while not self._stopped.wait(self.heartbeat_interval):
+            try:
+                self.store.heartbeat(self.owner)
+                if not self._draining:
+                    self._recover()
+            except Exception as e:
+                print(f"⚠️  警告: 任务心跳失败 ({str(e)})")
+
+    def submit(self, file_id: str, page_numbers: List[int] = None, parent_id: str = None,
+               user_id: str = None) -> str:
+        """
+        提交翻译任务；parent_id为上一版文档的任务时按修订版翻译，与上一版相同的段落直接复用译文
+        user_id用于在所有任务之间公平分配模型请求名额
+        """
+        self._check_accepting()
+        job_id = uuid.uuid4().hex
+        self.store.create(job_id, file_id, page_numbers or None, parent_id, user_id, self.owner)
+        self._start(job_id, file_id, page_numbers)
+        return job_id
+
+    def submit_batch(self, documents: List[Dict], user_id: str = None) -> Tuple[str, List[str]]:
+        """
+        提交批量任务，documents为 [{file_id, page_numbers}, ...]，返回 (batch_id, 各文档的job_id)
+        文档在后台解析（已上传但未解析的文件），统计跨文档重复的行后，按页数从少到多开始翻译；
+        各文档的模型请求与其他任务共用限流器的并发名额，按用户、文档轮流分配
+        """
+        self._check_accepting()
+        batch_id = uuid.uuid4().hex
+        jobs = [(uuid.uuid4().hex, d['file_id'], d.get('page_numbers') or None) for d in documents]
+        self.store.create_batch(batch_id, user_id, jobs, self.owner)
+        with self._lock:
+            for job_id, _, _ in jobs:
+                self._cancel_events[job_id] = threading.Event()
+        self.batch_executor.submit(self._start_batch, batch_id, jobs, time.monotonic())
+        return batch_id, [job_id for job_id, _, _ in jobs]
+
+    def _check_accepting(self):
+        if self._draining:
+            raise RuntimeError('服务正在停止，请稍后重试')
+
+    def cancel_batch(self, batch_id: str) -> int:
+        """取消批次中所有未结束的文档，返回实际取消的数量"""
+        return sum(1 for job_id in self.store.get_batch_jobs(batch_id) if self.cancel(job_id))
+
+    def _start_batch(self, batch_id: str, jobs: List[Tuple[str, str, Optional[List[int]]]], submitted_at: float):
+        """
+        批次准备：逐个解析文档（见_ensure_document），统计跨文档重复的行，然后把各文档按页数从少到多放入线程池
+        解析失败的文档单独标记为失败，不影响其他文档
+        """
+        store = get_document_store()
+        ready = []
+        with trace_context(batch_id=batch_id):
+            with span('batch_prepare', documents=len(jobs)) as attrs:
+                for job in jobs:
+                    try:
+                        self._ensure_document(job[1])
+                        ready.append(job)
+                    except Exception as e:
+                        self.store.set_status(job[0], FAILED, str(e))
+                        JOBS.inc(status=FAILED)
+                        with self._lock:
+                            self._cancel_events.pop(job[0], None)
+                attrs['failed'] = len(jobs) - len(ready)
+
+                if Config.BOILERPLATE_DEDUP and len(ready) > 1:
+                    try:
+                        lines = find_boilerplate(
+                            (store.load_pages(file_id, page_numbers, include_blocks=True)
+                             for _, file_id, page_numbers in ready),
+                            Config.BOILERPLATE_MIN_PAGES
+                        )
+                        self.store.set_batch_boilerplate(batch_id, sorted(lines))
+                        attrs['boilerplate_lines'] = len(lines)
+                    except Exception as e:
+                        # 跨文档统计失败时各文档仍按单文档去重
+                        print(f"⚠️  警告: 批次 {batch_id} 统计重复内容失败 ({str(e)})")
+
+        # 小文档先开始，避免排在大文档之后长时间等待
+        ready.sort(key=lambda job: len(job[2]) if job[2] else store.get_total_pages(job[1]) or 0)
+        for job_id, file_id, page_numbers in ready:
+            self.batch_executor.submit(self._run, job_id, file_id, page_numbers, submitted_at)
+
+    def _ensure_document(self, file_id: str):
+        """文档尚未解析时从上传存储中读取文件解析，所有任务和批次的解析依次进行"""
+        store = get_document_store()
+        if store.has(file_id):
+            return
+        path = get_upload_store().content_path(file_id)
+        if not os.path.exists(path):
+            raise Exception('文件不存在，请重新上传')
+        with self._parse_lock:
+            # 等待期间可能已由其他任务解析
+            if not store.has(file_id):
+                store.save(file_id, PDFParser(path).extract_text())
+
+    def resume(self, job_id: str) -> bool:
+        """
+        恢复失败、已取消或有失败页面的任务：已完成的页面和分块直接复用，只翻译其余部分
+        任务不存在、正在执行或已全部成功时返回False
+        """
+        job = self.store.get(job_id)
+        if job is None or job['status'] not in FINISHED_STATUSES:
+            return False
+        if job['status'] == COMPLETED and not self.store.has_failed_pages(job_id):
+            return False
+
+        with self._lock:
+            if job_id in self._cancel_events or not self.store.claim(job_id, self.owner):
+                return False
+            self._cancel_events[job_id] = threading.Event()
+        executor = self.batch_executor if job['batch_id'] else self.executor
+        executor.submit(self._run, job_id, job['file_id'], job['page_numbers'], time.monotonic())
+        return True
+
+    def _start(self, job_id: str, file_id: str, page_numbers: Optional[List[int]]):
+        with self._lock:
+            self._cancel_events[job_id] = threading.Event()
+        self.executor.submit(self._run, job_id, file_id, page_numbers, time.monotonic())
+
+    def cancel(self, job_id: str) -> bool:
+        """请求取消任务，任务已结束或不存在时返回False"""
+        with self._lock:
+            event = self._cancel_events.get(job_id)
+        if event is None:
+            return False
+
+        event.set()
+        return True
+
+    def export(self, job_id: str, layout: str) -> str:
+        """
+        返回任务结果的PDF路径，文件不存在时（未开启同步导出或需要其他版式）按已保存的结果分批生成
+        """
+        path = export_path(job_id, layout)
+        with self._export_lock:
+            if os.path.exists(path):
+                return path
+
+            job = self.store.get(job_id)
+            bboxes = get_document_store().get_page_sizes(job['file_id'])
+            writer = TranslationPDFWriter(path, layout)
+            try:
+                for page_result in self.store.iter_results(job_id):
+                    writer.add_page(page_result, bboxes.get(page_result['page']))
+            except Exception:
+                writer.abort()
+                raise
+            writer.close()
+        return path
+
+    def _open_export(self, job_id: str, bboxes: Dict[int, Optional[tuple]]) -> Optional[TranslationPDFWriter]:
+        """
+        开始同步导出：删除旧的导出文件，先写入之前已完成的页面（恢复执行的任务），之后的页面随翻译完成逐页写入
+        """
+        for layout in EXPORT_LAYOUTS:
+            if os.path.exists(export_path(job_id, layout)):
+                os.remove(export_path(job_id, layout))
+        if not Config.EXPORT_PDF:
+            return None
+
+        writer = None
+        try:
+            writer = TranslationPDFWriter(export_path(job_id, Config.EXPORT_LAYOUT), Config.EXPORT_LAYOUT)
+            for page_result in self.store.iter_results(job_id):
+                writer.add_page(page_result, bboxes.get(page_result['page']))
+            return writer
+        except Exception as e:
+            # 导出失败不影响翻译，下载时再按已保存的结果生成
+            print(f"⚠️  警告: 任务 {job_id} 导出PDF失败 ({str(e)})")
+            if writer is not None:
+                writer.abort()
+            return None
+
+    def _run(self, job_id: str, file_id: str, page_numbers: Optional[List[int]], submitted_at: float):
+        with self._lock:
+            cancel_event = self._cancel_events[job_id]
+
+        JOB_QUEUE_SECONDS.observe(time.monotonic() - submitted_at)
+        JOBS_RUNNING.inc()
+        status = FAILED
+        writer = None
+
+        def on_page_done(page_result):
+            nonlocal writer
+            self.store.save_page(job_id, page_result)
+            if writer is None:
+                return
+            try:
+                writer.add_page(page_result, bboxes.get(page_result['page']))
+            except Exception as e:
+                print(f"⚠️  警告: 任务 {job_id} 导出PDF失败 ({str(e)})")
+                writer.abort()
+                writer = None
+
+        job = self.store.get(job_id)
+        # 本任务产生的所有跟踪记录都带上job_id，模型请求按 (用户, 任务) 公平排队
+        with trace_context(job_id=job_id, file_id=file_id), fair_share(job['user_id'], job_id):
+            try:
+                with span('job') as attrs:
+                    if self._draining:
+                        # 服务停止前尚未开始的任务保持排队状态，下次启动时执行
+                        status = QUEUED
+                        return
+                    if cancel_event.is_set():
+                        status = CANCELLED
+                        self.store.set_status(job_id, CANCELLED)
+                        return
+
+                    with span('load_pages'):
+                        self._ensure_document(file_id)
+                        pages = get_document_store().load_pages(file_id, page_numbers, include_blocks=True)
+                    # 恢复执行时只翻译尚未成功的页面，已完成的分块从检查点读取
+                    pending = set(self.store.set_pages(job_id, pages))
+                    bboxes = {p['page']: p['bbox'] for p in pages}
+                    pages = [p for p in pages if p['page'] in pending]
+                    checkpoint = self.store.get_checkpoint(job_id)
+                    attrs['pages'] = len(pages)
+                    attrs['checkpointed_chunks'] = len(checkpoint)
+                    # 修订版：与上一版对齐，未改动的段落复用译文，只翻译新增和修改的段落
+                    if job['parent_id'] and pages:
+                        with span('align_revision', parent_job_id=job['parent_id']) as align_attrs:
+                            parent_hashes, translations = self.store.get_revision_source(job['parent_id'])
+                            stats = align_revision(parent_hashes, translations, pages)
+                            align_attrs.update(stats)
+                        attrs['reused_paragraphs'] = stats['reused'] + stats['moved']
+                        # 恢复执行时只对齐了剩余页面，保留首次执行的统计
+                        if job['revision'] is None:
+                            self.store.set_revision(job_id, stats)
+                    writer = self._open_export(job_id, bboxes)
+                    self.store.set_status(job_id, RUNNING)
+
+                    translator = get_translator()
+                    translator.translate_pages(
+                        pages,
+                        on_page_done=on_page_done,
+                        cancel_event=cancel_event,
+                        checkpoint=checkpoint,
+                        on_chunk_done=lambda page, chunk, source_hash, translated: self.store.save_chunk(
+                            job_id, page, chunk, source_hash, translated
+                        ),
+                        on_segments=lambda page, segments: self.store.save_segments(job_id, page, segments),
+                        boilerplate=self.store.get_batch_boilerplate(job['batch_id']) if job['batch_id'] else None
+                    )
+                    status = COMPLETED
+                    self.store.set_status(job_id, COMPLETED)
+            except TranslationCancelled:
+                # 服务停止导致的中断恢复为排队状态，下次启动时从检查点继续
+                status = QUEUED if self._draining else CANCELLED
+                self.store.set_status(job_id, status)
+            except Exception as e:
+                self.store.set_status(job_id, FAILED, str(e))
+            finally:
+                # 取消或失败时也保留已翻译页面的PDF
+                if writer is not None:
+                    try:
+                        if writer.page_count:
+                            writer.close()
+                        else:
+                            writer.abort()
+                    except Exception as e:
+                        print(f"⚠️  警告: 任务 {job_id} 导出PDF失败 ({str(e)})")
+                JOBS_RUNNING.dec()
+                # 服务停止时未开始或被中断的任务恢复为排队状态，没有结束，不计入
+                if status != QUEUED:
+                    JOBS.inc(status=status)
+                with self._lock:
+                    self._cancel_events.pop(job_id, None)
+
+    def drain(self, timeout: float):
+        """
+        平滑停止：不再接收新任务，等待进行中的任务最多timeout秒；
+        仍未完成的任务被中断并恢复为排队状态（已完成的页面和分块检查点保留），下次启动时自动继续
+        """
+        self._draining = True
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if not self._cancel_events:
+                    break
+            time.sleep(0.2)
+        self.shutdown(wait=True)
+
+    def shutdown(self, wait: bool = True):
+        """取消所有进行中的任务并关闭线程池，放弃本进程仍在排队的任务"""
+        self._stopped.set()
+        with self._lock:
+            events = list(self._cancel_events.values())
+        for event in events:
+            event.set()
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+        self.batch_executor.shutdown(wait=wait, cancel_futures=True)
+        if wait:
+            self.store.release(self.owner)
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """
+    获取进程内共享的任务管理器
+    """
+    global _manager
+
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager(
+                JobStore(os.path.join(Config.DATA_FOLDER, 'jobs.db')),
+                max_workers=Config.JOB_WORKERS,
+                auto_resume=Config.JOB_AUTO_RESUME,
+                batch_workers=Config.BATCH_WORKERS,
+                heartbeat_interval=Config.JOB_HEARTBEAT_INTERVAL,
+                owner_timeout=Config.JOB_OWNER_TIMEOUT
+            )
+        return _manager
+
+
+def shutdown_job_manager(timeout: float):
+    """
+    进程退出前平滑停止任务管理器（未创建时不做任何事），见JobManager.drain
+    """
+    with _manager_lock:
+        manager = _manager
+    if manager is not None:
+        manager.drain(timeout)
@@ -0,0 +1,306 @@
+import json
+import re
+import zlib
+from array import array
+from collections import Counter
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+# 块类型
+BLOCK_TEXT = 0  # 正文
+BLOCK_HEADING = 1  # 标题（字号明显大于正文）
+BLOCK_NUMERIC = 2  # 不含文字的块（页码、表格中的数值、公式编号），不翻译
+BLOCK_CODE = 3  # 等宽字体（代码、命令行），不翻译
+BLOCK_KINDS = ('text', 'heading', 'numeric', 'code')
+TRANSLATABLE_KINDS = (BLOCK_TEXT, BLOCK_HEADING)
+
+# 同一行中单词间距超过 字号*COLUMN_GAP 时视为分栏或表格单元格的分隔
+COLUMN_GAP = 1.5
+# 相邻两行的行距不超过 字号*LINE_GAP 时属于同一个块
+LINE_GAP = 0.8
+# 字号达到正文的该倍数时视为标题
+HEADING_RATIO = 1.2
+# 已是目标语言的判定阈值：文字中目标语言文字所占比例
+TARGET_SCRIPT_RATIO = 0.9
+
+_LETTER = re.compile(r'[^\W\d_]')
+_CJK = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]')
+_MONOSPACE = re.compile(r'mono|courier|consol|code', re.IGNORECASE)
+
+_SCRIPTS = {
+    'han': re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]'),
+    'kana': re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff]'),
+    'hangul': re.compile(r'[\uac00-\ud7af\u1100-\u11ff\u3130-\u318f]'),
+    'cyrillic': re.compile(r'[\u0400-\u04ff]'),
+    'latin': re.compile(r'[A-Za-z\u00c0-\u024f]'),
+}
+_KANA = re.compile(r'[\u3040-\u30ff]')
+
+# 语言名称（配置中的TARGET_LANGUAGE/SOURCE_LANGUAGE）到文字系统的映射
+LANGUAGE_SCRIPTS = {
+    '中文': 'han', '简体中文': 'han', '繁体中文': 'han', 'chinese': 'han', 'zh': 'han',
+    '日文': 'kana', '日语': 'kana', 'japanese': 'kana', 'ja': 'kana',
+    '韩文': 'hangul', '韩语': 'hangul', 'korean': 'hangul', 'ko': 'hangul',
+    '俄文': 'cyrillic', '俄语': 'cyrillic', 'russian': 'cyrillic', 'ru': 'cyrillic',
+    '英文': 'latin', '英语': 'latin', 'english': 'latin', 'en': 'latin',
+    '法文': 'latin', '法语': 'latin', 'french': 'latin', 'fr': 'latin',
+    '德文': 'latin', '德语': 'latin', 'german': 'latin', 'de': 'latin',
+    '西班牙语': 'latin', 'spanish': 'latin', 'es': 'latin',
+}
+
+
+class Block(NamedTuple):
+    text: str
+    x0: float
+    top: float
+    x1: float
+    bottom: float
+    size: float
+    kind: int
+
+
+class BlockTable:
+    """
+    页面文本块的列式存储：坐标和字号各占一个array('f')，块类型为array('B')，文本单独成列
+    按阅读顺序排列，相比每个单词一个字典内存占用小一个数量级，并可直接序列化为紧凑的二进制
+    """
+    COLUMNS = ('x0', 'top', 'x1', 'bottom', 'size')
+
+    def __init__(self):
+        self.texts = []
+        self.x0 = array('f')
+        self.top = array('f')
+        self.x1 = array('f')
+        self.bottom = array('f')
+        self.size = array('f')
+        self.kind = array('B')
+
+    def append(self, text: str, x0: float, top: float, x1: float, bottom: float, size: float,
+               kind: int = BLOCK_TEXT):
+        self.texts.append(text)
+        self.x0.append(x0)
+        self.top.append(top)
+        self.x1.append(x1)
+        self.bottom.append(bottom)
+        self.size.append(size)
+        self.kind.append(kind)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __getitem__(self, index: int) -> Block:
+        return Block(self.texts[index], self.x0[index], self.top[index], self.x1[index],
+                     self.bottom[index], self.size[index], self.kind[index])
+
+    def __iter__(self) -> Iterator[Block]:
+        for i in range(len(self.texts)):
+            yield self[i]
+
+    def text(self) -> str:
+        """按阅读顺序拼接的页面文本，块之间空一行"""
+        return '\n\n'.join(self.texts)
+
+    def to_bytes(self) -> bytes:
+        """
+        序列化为 zlib(文本JSON长度 + 文本JSON + 各数值列)，数值列按本机字节序保存
+        """
+        header = json.dumps(self.texts, ensure_ascii=False).encode('utf-8')
+        columns = b''.join(getattr(self, name).tobytes() for name in self.COLUMNS)
+        return zlib.compress(len(header).to_bytes(4, 'little') + header + columns + self.kind.tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'BlockTable':
+        data = zlib.decompress(data)
+        header_size = int.from_bytes(data[:4], 'little')
+        table = cls()
+        table.texts = json.loads(data[4:4 + header_size].decode('utf-8'))
+
+        offset = 4 + header_size
+        width = len(table.texts) * table.x0.itemsize
+        for name in cls.COLUMNS:
+            getattr(table, name).frombytes(data[offset:offset + width])
+            offset += width
+        table.kind.frombytes(data[offset:])
+        return table
+
+    def to_dict(self) -> Dict[str, List]:
+        """按列输出（用于JSON接口），坐标保留一位小数"""
+        result = {'text': list(self.texts)}
+        for name in self.COLUMNS:
+            result[name] = [round(value, 1) for value in getattr(self, name)]
+        result['kind'] = [BLOCK_KINDS[kind] for kind in self.kind]
+        return result
+
+
+def extract_blocks(page) -> BlockTable:
+    """
+    从pdfplumber页面提取文本块：单词按行聚合，行内按大间距切分为分栏/单元格片段，
+    上下相邻且水平重叠、字号相同的片段合并为块，最后按阅读顺序（双栏时先左栏后右栏）排列
+    """
+    words = page.extract_words(extra_attrs=['size', 'fontname'], keep_blank_chars=False)
+    table = BlockTable()
+    if not words:
+        return table
+
+    blocks = _group_blocks(_split_segments(_group_lines(words)))
+    body_size = _body_size(blocks)
+    page_x0, _, page_x1, _ = page.bbox
+
+    for block in _reading_order(blocks, (page_x0 + page_x1) / 2):
+        text = join_lines(block['lines'])
+        table.append(text, block['x0'], block['top'], block['x1'], block['bottom'], block['size'],
+                     _classify(text, block['size'], body_size, block['monospace']))
+    return table
+
+
+def _group_lines(words: List[Dict]) -> List[List[Dict]]:
+    """按top聚合为行（容差为半个字号），行内按x0排序"""
+    lines = []
+    for word in sorted(words, key=lambda w: (w['top'], w['x0'])):
+        if lines and abs(word['top'] - lines[-1][0]['top']) <= word['size'] * 0.5:
+            lines[-1].append(word)
+        else:
+            lines.append([word])
+    for line in lines:
+        line.sort(key=lambda w: w['x0'])
+    return lines
+
+
+def _split_segments(lines: List[List[Dict]]) -> List[Dict]:
+    """把每行在大间距处切开，返回片段（带外框、字号和单词文本）"""
+    segments = []
+    for line in lines:
+        current = [line[0]]
+        for word in line[1:]:
+            if word['x0'] - current[-1]['x1'] > max(word['size'], current[-1]['size']) * COLUMN_GAP:
+                segments.append(_make_segment(current))
+                current = []
+            current.append(word)
+        segments.append(_make_segment(current))
+    return segments
+
+
+def _make_segment(words: List[Dict]) -> Dict:
+    return {
+        'x0': min(w['x0'] for w in words),
+        'top': min(w['top'] for w in words),
+        'x1': max(w['x1'] for w in words),
+        'bottom': max(w['bottom'] for w in words),
+        'size': max(w['size'] for w in words),
+        'monospace': all(_MONOSPACE.search(w.get('fontname') or '') for w in words),
+        'text': join_words([w['text'] for w in words], ' ')
+    }
+
+
+def _group_blocks(segments: List[Dict]) -> List[Dict]:
+    """上下相邻、水平重叠、字号和字体类型一致的片段合并为一个块"""
+    blocks = []
+    for segment in segments:
+        target = None
+        for block in reversed(blocks):
+            gap = segment['top'] - block['bottom']
+            if (gap <= segment['size'] * LINE_GAP
+                    and segment['x0'] < block['x1'] and segment['x1'] > block['x0']
+                    and abs(segment['size'] - block['size']) <= 1
+                    and segment['monospace'] == block['monospace']):
+                target = block
+                break
+
+        if target is None:
+            blocks.append({**segment, 'lines': [segment['text']]})
+        else:
+            target['lines'].append(segment['text'])
+            target['x0'] = min(target['x0'], segment['x0'])
+            target['x1'] = max(target['x1'], segment['x1'])
+            target['bottom'] = max(target['bottom'], segment['bottom'])
+    return blocks
+
+
+def _reading_order(blocks: List[Dict], middle: float) -> List[Dict]:
+    """
+    双栏页面按"通栏块分隔的区段内先左栏、后右栏"排序，单栏页面从上到下
+    """
+    blocks = sorted(blocks, key=lambda b: (b['top'], b['x0']))
+    left = [b for b in blocks if b['x1'] <= middle]
+    right = [b for b in blocks if b['x0'] >= middle]
+    if not left or not right:
+        return blocks
+
+    ordered, left_column, right_column = [], [], []
+    for block in blocks:
+        if block['x1'] <= middle:
+            left_column.append(block)
+        elif block['x0'] >= middle:
+            right_column.append(block)
+        else:
+            ordered.extend(left_column + right_column)
+            left_column, right_column = [], []
+            ordered.append(block)
+    ordered.extend(left_column + right_column)
+    return ordered
+
+
+def _body_size(blocks: List[Dict]) -> float:
+    """正文字号：按字符数加权出现最多的字号"""
+    sizes = Counter()
+    for block in blocks:
+        sizes[round(block['size'], 1)] += sum(len(line) for line in block['lines'])
+    return sizes.most_common(1)[0][0] if sizes else 0
+
+
+def _classify(text: str, size: float, body_size: float, monospace: bool) -> int:
+    if not _LETTER.search(text):
+        return BLOCK_NUMERIC
+    if monospace:
+        return BLOCK_CODE
+    if body_size and size >= body_size * HEADING_RATIO and len(text) < 200:
+        return BLOCK_HEADING
+    return BLOCK_TEXT
+
+
+def join_words(parts: List[str], separator: str) -> str:
+    """拼接单词或行：中日韩文字之间不加分隔符"""
+    text = ''
+    for part in parts:
+        if text and not (_CJK.match(text[-1]) and _CJK.match(part[0])):
+            text += separator
+        text += part
+    return text
+
+
+def join_lines(lines: List[str]) -> str:
+    """合并块内各行，行末连字符断开的单词重新拼接"""
+    text = ''
+    for line in lines:
+        if text.endswith('-') and len(text) > 1 and text[-2].isalpha() and line[:1].islower():
+            text = text[:-1] + line
+        else:
+            text = join_words([text, line], ' ') if text else line
+    return text
+
+
+def is_translatable(text: str, source_lang: str = None, target_lang: str = None) -> bool:
+    """
+    判断文本是否需要翻译：不含文字（纯数字、符号）的不翻译；
+    源语言和目标语言文字系统不同（如英译中）且文本已主要由目标语言文字组成时也不翻译
+    """
+    letters = _LETTER.findall(text)
+    if not letters:
+        return False
+
+    target_script = _language_script(target_lang)
+    if target_script is None or target_script == _language_script(source_lang):
+        return True
+
+    if target_script == 'kana' and not _KANA.search(text):
+        # 没有假名的汉字文本无法确定是日文
+        return True
+
+    pattern = _SCRIPTS[target_script]
+    matched = sum(1 for letter in letters if pattern.match(letter))
+    return matched < len(letters) * TARGET_SCRIPT_RATIO
+
+
+def _language_script(language: Optional[str]) -> Optional[str]:
+    if not language:
+        return None
+    return LANGUAGE_SCRIPTS.get(language.strip().lower())
@@ -0,0 +1,243 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+from config import Config
+
+# 耗时直方图的分桶上限（秒），覆盖单页解析（毫秒级）到模型调用（数十秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _Metric:
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels: Dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value) -> List[str]:
+        return [f"{self.name}{_format_labels(self.label_names, key)} {value}"]
+
+
+class Counter(_Metric):
+    """只增计数器"""
+    type_name = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """可增可减的当前值"""
+    type_name = 'gauge'
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """耗时分布，按Prometheus约定输出累计分桶、总和和次数"""
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, label_names)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0}
+            state['counts'][bisect_left(self.buckets, value)] += 1
+            state['sum'] += value
+
+    def _render_value(self, key, state) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), state['counts']):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            bucket_labels = _format_labels(self.label_names, key, 'le="' + le + '"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+        labels = _format_labels(self.label_names, key)
+        lines.append(f"{self.name}_sum{labels} {state['sum']}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """进程内的指标集合，render()输出Prometheus文本格式"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self, extra_gauges: Dict[str, Dict[str, float]] = None) -> str:
+        """
+        extra_gauges为 {指标名: {说明, 值}} 形式的一次性数值（如缓存条目数），渲染时直接输出
+        """
+        with self._lock:
+            metrics = list(self._metrics)
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for name, gauge in (extra_gauges or {}).items():
+            lines.append(f"# HELP {name} {gauge['help']}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {gauge['value']}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# 热点路径指标
+SPAN_SECONDS = Histogram('pdftranslator_span_seconds', '各处理阶段耗时（秒）', ('span',))
+LLM_REQUESTS = Counter('pdftranslator_llm_requests_total', '模型接口调用次数（每次尝试计一次）', ('model', 'outcome'))
+LLM_TOKENS = Counter('pdftranslator_llm_tokens_total', '模型接口消耗的token数', ('model', 'direction'))
+RATE_LIMIT_WAIT_SECONDS = Histogram('pdftranslator_rate_limit_wait_seconds', '等待限流器放行的时间（秒）', ('model',))
+CACHE_LOOKUPS = Counter('pdftranslator_cache_lookups_total', '翻译缓存查询次数', ('result',))
+PAGES = Counter('pdftranslator_pages_total', '已翻译的页面数', ('status',))
+JOBS = Counter('pdftranslator_jobs_total', '结束的后台任务数', ('status',))
+JOBS_RUNNING = Gauge('pdftranslator_jobs_running', '正在执行的后台任务数')
+JOB_QUEUE_SECONDS = Histogram('pdftranslator_job_queue_seconds', '后台任务从提交到开始执行的等待时间（秒）')
+
+
+# 跟踪上下文：job_id、page、chunk等关联字段，随调用链传递，写入每条跟踪日志
+_trace_fields = contextvars.ContextVar('trace_fields', default={})
+_current_span = contextvars.ContextVar('current_span', default=None)
+_trace_lock = threading.Lock()
+
+
+@contextmanager
+def trace_context(**fields) -> Iterator[None]:
+    """
+    在当前上下文中附加关联字段，嵌套时合并，退出时恢复
+    线程池中执行的任务需要通过contextvars.copy_context().run提交才能继承
+    """
+    token = _trace_fields.set({**_trace_fields.get(), **fields})
+    try:
+        yield
+    finally:
+        _trace_fields.reset(token)
+
+
+def current_trace() -> Dict:
+    return dict(_trace_fields.get())
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Dict]:
+    """
+    计时一个处理阶段：耗时计入pdftranslator_span_seconds，开启TRACE_LOG时写入一条跟踪日志
+    返回的字典可在代码块内补充属性（如token数、是否命中缓存）
+    """
+    span_id = uuid.uuid4().hex[:16]
+    parent_id = _current_span.get()
+    token = _current_span.set(span_id)
+    start = time.perf_counter()
+    status = 'ok'
+    try:
+        yield attrs
+    except BaseException as e:
+        status = 'error'
+        attrs.setdefault('error', str(e)[:200])
+        raise
+    finally:
+        _current_span.reset(token)
+        observe_span(name, time.perf_counter() - start, status=status, span_id=span_id,
+                     parent_id=parent_id, **attrs)
+
+
+def observe_span(name: str, duration: float, status: str = 'ok', span_id: str = None,
+                 parent_id: str = None, **attrs):
+    """
+    记录一个已完成阶段的耗时（用于在其他进程中计时、在当前进程汇总的场景）
+    """
+    SPAN_SECONDS.observe(duration, span=name)
+    if not Config.TRACE_LOG:
+        return
+
+    record = {
+        'ts': round(time.time(), 3),
+        'span': name,
+        'span_id': span_id or uuid.uuid4().hex[:16],
+        'parent_id': parent_id if span_id else _current_span.get(),
+        'duration_ms': round(duration * 1000, 2),
+        'status': status,
+        **current_trace(),
+        **attrs
+    }
+    _write_trace(record)
+
+
+def _trace_path(job_id: str = None) -> str:
+    return os.path.join(Config.DATA_FOLDER, 'traces', f"{job_id or 'requests'}.jsonl")
+
+
+def _write_trace(record: Dict):
+    """后台任务的跟踪日志按job_id分文件保存，其他请求写入requests.jsonl"""
+    path = _trace_path(record.get('job_id'))
+    line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+    with _trace_lock:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+
+def read_job_trace(job_id: str) -> List[Dict]:
+    """读取任务的跟踪日志，未开启TRACE_LOG或没有记录时返回空列表"""
+    path = _trace_path(job_id)
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
@@ -0,0 +1,211 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from statistics import median
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pdfplumber
+
+from config import Config
+from layout import BLOCK_NUMERIC, BLOCK_TEXT, BlockTable, join_lines, join_words
+
+try:
+    import pytesseract
+except ImportError:  # pytesseract为可选依赖，未安装时不进行OCR
+    pytesseract = None
+
+_LETTER = re.compile(r'[^\W\d_]')
+# 并行OCR时每个进程最多使用的CPU核数上限（Tesseract本身也会多线程，进程内限制为单线程）
+MAX_DEFAULT_WORKERS = 4
+
+
+class OCRCache:
+    """OCR结果的本地缓存（SQLite），按页面图像哈希寻址，相同的扫描页面不会重复识别"""
+
+    def __init__(self, db_path: str):
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        # 多个OCR进程会同时读写，等待锁的时间放宽
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS ocr_pages ('
+            ' page_hash TEXT PRIMARY KEY,'
+            ' blocks BLOB NOT NULL,'
+            ' created_at REAL NOT NULL)'
+        )
+        self._conn.commit()
+
+    def get(self, page_hash: str) -> Optional[BlockTable]:
+        with self._lock:
+            row = self._conn.execute('SELECT blocks FROM ocr_pages WHERE page_hash = ?', (page_hash,)).fetchone()
+        return BlockTable.from_bytes(row[0]) if row else None
+
+    def set(self, page_hash: str, blocks: BlockTable):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO ocr_pages (page_hash, blocks, created_at) VALUES (?, ?, ?)',
+                (page_hash, blocks.to_bytes(), time.time())
+            )
+            self._conn.commit()
+
+
+_cache = None
+_cache_pid = None
+_cache_lock = threading.Lock()
+
+
+def get_ocr_cache() -> OCRCache:
+    """
+    获取进程内共享的OCR缓存（子进程中重新打开连接，不使用从父进程继承的连接）
+    """
+    global _cache, _cache_pid
+
+    with _cache_lock:
+        if _cache is None or _cache_pid != os.getpid():
+            _cache = OCRCache(os.path.join(Config.DATA_FOLDER, 'ocr.db'))
+            _cache_pid = os.getpid()
+        return _cache
+
+
+_tesseract_found = None
+
+
+def ocr_available() -> bool:
+    """已开启OCR且安装了pytesseract和tesseract程序（是否安装tesseract只检查一次）"""
+    global _tesseract_found
+
+    if not Config.OCR_ENABLED or pytesseract is None:
+        return False
+    if _tesseract_found is None:
+        try:
+            pytesseract.get_tesseract_version()
+            _tesseract_found = True
+        except Exception:
+            _tesseract_found = False
+    return _tesseract_found
+
+
+def page_hash(image, dpi: int, language: str) -> str:
+    """页面图像的哈希（包含分辨率和识别语言，参数变化后重新识别）"""
+    digest = hashlib.sha256(f"{language}:{dpi}:{image.mode}:{image.size}".encode('utf-8'))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def recognize(image, dpi: int, language: str, origin: Tuple[float, float] = (0, 0)) -> BlockTable:
+    """
+    识别页面图像，按Tesseract的段落划分文本块，坐标从像素换算为页面坐标（pt）
+    """
+    data = pytesseract.image_to_data(image, lang=language, output_type=pytesseract.Output.DICT)
+    scale = 72.0 / dpi
+    paragraphs = {}
+    for i, word in enumerate(data['text']):
+        word = (word or '').strip()
+        if not word or float(data['conf'][i]) < 0:
+            continue
+
+        key = (data['block_num'][i], data['par_num'][i])
+        left, top = data['left'][i], data['top'][i]
+        right, bottom = left + data['width'][i], top + data['height'][i]
+        paragraph = paragraphs.get(key)
+        if paragraph is None:
+            paragraph = paragraphs[key] = {'lines': {}, 'x0': left, 'top': top, 'x1': right, 'bottom': bottom,
+                                           'heights': []}
+        paragraph['lines'].setdefault(data['line_num'][i], []).append(word)
+        paragraph['x0'] = min(paragraph['x0'], left)
+        paragraph['top'] = min(paragraph['top'], top)
+        paragraph['x1'] = max(paragraph['x1'], right)
+        paragraph['bottom'] = max(paragraph['bottom'], bottom)
+        paragraph['heights'].append(data['height'][i])
+
+    table = BlockTable()
+    x_offset, y_offset = origin
+    for paragraph in paragraphs.values():
+        text = join_lines([join_words(words, ' ') for words in paragraph['lines'].values()])
+        table.append(text,
+                     x_offset + paragraph['x0'] * scale, y_offset + paragraph['top'] * scale,
+                     x_offset + paragraph['x1'] * scale, y_offset + paragraph['bottom'] * scale,
+                     median(paragraph['heights']) * scale,
+                     BLOCK_TEXT if _LETTER.search(text) else BLOCK_NUMERIC)
+    return table
+
+
+def _ocr_page(pdf, page_num: int, dpi: int, language: str, layout: bool) -> Tuple[Optional[Dict], bool]:
+    """渲染并识别一页，返回 (页面或None, 是否命中缓存)"""
+    page = pdf.pages[page_num - 1]
+    try:
+        bbox = page.bbox
+        image = page.to_image(resolution=dpi).original.convert('L')
+    finally:
+        page.close()
+
+    cache = get_ocr_cache()
+    key = page_hash(image, dpi, language)
+    blocks = cache.get(key)
+    cached = blocks is not None
+    if not cached:
+        blocks = recognize(image, dpi, language, (bbox[0], bbox[1]))
+        cache.set(key, blocks)
+
+    text = blocks.text().strip()
+    if not text:
+        return None, cached
+    page_data = {'page': page_num, 'text': text, 'bbox': bbox, 'ocr': True}
+    if layout:
+        page_data['blocks'] = blocks
+    return page_data, cached
+
+
+def _ocr_page_range(pdf_path: str, page_numbers: List[int], dpi: int, language: str,
+                    layout: bool) -> List[Tuple[int, Optional[Dict], float, bool]]:
+    """
+    OCR工作函数：打开文件识别指定页面，返回 [(页码, 页面或None, 耗时秒数, 是否命中缓存), ...]
+    """
+    results = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page_num in page_numbers:
+            start = time.perf_counter()
+            page_data, cached = _ocr_page(pdf, page_num, dpi, language, layout)
+            results.append((page_num, page_data, time.perf_counter() - start, cached))
+    return results
+
+
+def _init_worker():
+    # 多个进程并行时每个tesseract只用一个线程，避免CPU超额分配
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+
+
+def ocr_pages(pdf_path: str, page_numbers: List[int], workers: int = None, dpi: int = None,
+              layout: bool = None) -> Iterator[Tuple[int, Optional[Dict], float, bool]]:
+    """
+    对没有文本层的页面进行OCR，按页码顺序逐页返回 (页码, 页面或None, 耗时秒数, 是否命中缓存)
+    页面结构与PDFParser.iter_pages相同（额外带有ocr=True）；workers大于1时在进程池中并行识别，
+    进程数不超过workers和页数
+    """
+    if workers is None:
+        workers = Config.OCR_WORKERS or min(os.cpu_count() or 1, MAX_DEFAULT_WORKERS)
+    dpi = dpi or Config.OCR_DPI
+    layout = Config.PARSER_LAYOUT if layout is None else layout
+    language = Config.OCR_LANGUAGE
+
+    if workers <= 1 or len(page_numbers) <= 1:
+        yield from _ocr_page_range(pdf_path, page_numbers, dpi, language, layout)
+        return
+
+    # 切分为连续区间，每个区间只打开一次文件；区间数多于进程数，使各进程负载更均衡，map按提交顺序返回结果
+    batch_count = min(len(page_numbers), workers * 4)
+    batch_size = -(-len(page_numbers) // batch_count)
+    batches = [page_numbers[i:i + batch_size] for i in range(0, len(page_numbers), batch_size)]
+    with ProcessPoolExecutor(max_workers=min(workers, len(batches)), initializer=_init_worker) as executor:
+        for results in executor.map(_ocr_page_range, [pdf_path] * len(batches), batches,
+                                    [dpi] * len(batches), [language] * len(batches), [layout] * len(batches)):
+            yield from results
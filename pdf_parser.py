@@ -1,5 +1,32 @@
+import os
+import time
 import pdfplumber
-from typing import List, Dict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Iterator, Tuple
+from config import Config
+from layout import extract_blocks
+from metrics import observe_span, span
+from ocr import ocr_available, ocr_pages
+
+
+def _timed_pages(pages: Iterator[Dict]) -> Iterator[Tuple[Dict, float]]:
+    """
+    逐页返回 (页面, 提取耗时秒数)
+    """
+    start = time.perf_counter()
+    for page in pages:
+        now = time.perf_counter()
+        yield page, now - start
+        start = time.perf_counter()
+
+
+def _extract_page_range(pdf_path: str, page_numbers: List[int]) -> List[Tuple[Dict, float]]:
+    """
+    进程池工作函数：在子进程中独立打开文件并提取指定页面
+    每页耗时随结果返回，由主进程记录指标（子进程中的指标不会被汇总）
+    """
+    return list(_timed_pages(PDFParser(pdf_path).iter_pages(page_numbers)))
+
 
 class PDFParser:
     """PDF文件解析器"""
@@ -7,43 +34,162 @@ class PDFParser:
     def __init__(self, pdf_path: str):
         self.pdf_path = pdf_path
         self.pages = []
+        self.total_pages = None
 
-    def extract_text(self) -> Dict[str, any]:
+    def iter_pages(self, page_numbers: List[int] = None, layout: bool = None) -> Iterator[Dict]:
         """
-        提取PDF文本内容
-        返回包含页面文本和元数据的字典
+        逐页惰性提取文本，只打开page_numbers指定的页面（页码从1开始，为空时遍历全部）
+        每页处理完立即释放布局对象，内存占用与文档长度无关
+        layout为True（默认取Config.PARSER_LAYOUT）时按文本块提取，页面额外带有blocks（BlockTable），
+        text为按阅读顺序拼接的块文本
         """
-        text_content = []
-
         try:
             with pdfplumber.open(self.pdf_path) as pdf:
-                total_pages = len(pdf.pages)
+                self.total_pages = len(pdf.pages)
+                yield from self._iter_open_pages(pdf, self._page_indices(page_numbers), layout)
+        except Exception as e:
+            raise Exception(f"PDF解析失败: {str(e)}")
 
-                for page_num, page in enumerate(pdf.pages, 1):
+    def _page_indices(self, page_numbers: List[int] = None) -> List[int]:
+        """有效的页码（去重排序），为空时为全部页面；需要先读取total_pages"""
+        if page_numbers:
+            return sorted(set(p for p in page_numbers if 1 <= p <= self.total_pages))
+        return list(range(1, self.total_pages + 1))
+
+    @staticmethod
+    def _iter_open_pages(pdf, indices: List[int], layout: bool = None) -> Iterator[Dict]:
+        """从已打开的文件中逐页提取indices指定的页面，见iter_pages"""
+        if layout is None:
+            layout = Config.PARSER_LAYOUT
+
+        for page_num in indices:
+            page = pdf.pages[page_num - 1]
+            blocks = None
+            try:
+                if layout:
+                    blocks = extract_blocks(page)
+                    text = blocks.text()
+                else:
                     text = page.extract_text()
-                    if text:
-                        text_content.append({
-                            'page': page_num,
-                            'text': text.strip(),
-                            'bbox': page.bbox
-                        })
-
-                return {
-                    'total_pages': total_pages,
-                    'pages': text_content,
-                    'full_text': '\n\n'.join([p['text'] for p in text_content])
+                bbox = page.bbox
+            finally:
+                # 释放该页缓存的字符和布局对象
+                page.close()
+
+            if text:
+                page_data = {
+                    'page': page_num,
+                    'text': text.strip(),
+                    'bbox': bbox
                 }
-        except Exception as e:
-            raise Exception(f"PDF解析失败: {str(e)}")
+                if blocks is not None:
+                    page_data['blocks'] = blocks
+                yield page_data
 
-    def extract_by_pages(self, page_numbers: List[int] = None) -> str:
+    def get_total_pages(self) -> int:
         """
-        提取指定页面的文本
+        读取总页数（不解析页面内容）
         """
-        result = self.extract_text()
+        if self.total_pages is None:
+            try:
+                with pdfplumber.open(self.pdf_path) as pdf:
+                    self.total_pages = len(pdf.pages)
+            except Exception as e:
+                raise Exception(f"PDF解析失败: {str(e)}")
+        return self.total_pages
 
-        if page_numbers:
-            pages = [p for p in result['pages'] if p['page'] in page_numbers]
-            return '\n\n'.join([p['text'] for p in pages])
+    def extract_text(self, page_numbers: List[int] = None, include_full_text: bool = False,
+                     workers: int = None) -> Dict[str, any]:
+        """
+        提取PDF文本内容
+        返回包含页面文本和元数据的字典，include_full_text为True时额外返回全文拼接
+        workers大于1且页数达到Config.PARSER_PARALLEL_MIN_PAGES时使用多进程并行提取
+        没有文本层的页面（扫描件）在开启OCR时识别后按页码插入（页面带有ocr=True），见ocr.ocr_pages
+        """
+        if workers is None:
+            workers = Config.PARSER_WORKERS or os.cpu_count() or 1
+
+        with span('parse_document') as attrs:
+            text_content = []
+            # 读取页数和串行提取使用同一个文件句柄，文件只打开和解析一次
+            try:
+                with pdfplumber.open(self.pdf_path) as pdf:
+                    self.total_pages = len(pdf.pages)
+                    indices = self._page_indices(page_numbers)
+                    parallel = workers > 1 and len(indices) >= Config.PARSER_PARALLEL_MIN_PAGES
+                    if not parallel:
+                        # 页数较少时串行提取，避免进程池启动开销
+                        for page, seconds in _timed_pages(self._iter_open_pages(pdf, indices)):
+                            observe_span('parse_page', seconds, page=page['page'], chars=len(page['text']))
+                            text_content.append(page)
+            except Exception as e:
+                raise Exception(f"PDF解析失败: {str(e)}")
+
+            attrs['pages'] = len(indices)
+            if parallel:
+                # 各子进程独立打开文件
+                attrs['workers'] = workers
+                text_content = self._extract_parallel(indices, workers)
+
+            # 只对没有提取到文本的页面进行OCR
+            extracted = {page['page'] for page in text_content}
+            missing = [p for p in indices if p not in extracted]
+            if missing:
+                attrs['empty_pages'] = len(missing)
+                text_content = self._ocr_missing(text_content, missing)
+
+        result = {
+            'total_pages': self.total_pages,
+            'pages': text_content
+        }
+        if include_full_text:
+            result['full_text'] = '\n\n'.join([p['text'] for p in text_content])
+
+        return result
+
+    def _ocr_missing(self, text_content: List[Dict], missing: List[int]) -> List[Dict]:
+        """
+        识别没有文本层的页面并按页码合并；未开启OCR或未安装Tesseract时跳过这些页面
+        """
+        if not ocr_available():
+            if Config.OCR_ENABLED:
+                print(f"⚠️  警告: {len(missing)}页没有文本层，未安装pytesseract或tesseract，已跳过")
+            return text_content
+
+        recognized = []
+        with span('ocr_document', pages=len(missing)) as attrs:
+            cached_pages = 0
+            for page_num, page, seconds, cached in ocr_pages(self.pdf_path, missing):
+                observe_span('ocr_page', seconds, page=page_num, cached=cached,
+                             chars=len(page['text']) if page else 0)
+                cached_pages += cached
+                if page:
+                    recognized.append(page)
+            attrs['cached'] = cached_pages
+            attrs['recognized'] = len(recognized)
+
+        return sorted(text_content + recognized, key=lambda p: p['page'])
 
-        return result['full_text']
+    def _extract_parallel(self, indices: List[int], workers: int) -> List[Dict]:
+        """
+        将页面切分为连续区间分发到进程池，按页码顺序合并结果
+        """
+        # 区间数多于进程数，使各进程负载更均衡
+        batch_count = min(len(indices), workers * 4)
+        batch_size = -(-len(indices) // batch_count)
+        batches = [indices[i:i + batch_size] for i in range(0, len(indices), batch_size)]
+
+        text_content = []
+        with ProcessPoolExecutor(max_workers=min(workers, len(batches))) as executor:
+            for pages in executor.map(_extract_page_range, [self.pdf_path] * len(batches), batches):
+                for page, seconds in pages:
+                    observe_span('parse_page', seconds, page=page['page'], chars=len(page['text']))
+                    text_content.append(page)
+
+        return text_content
+
+    def extract_by_pages(self, page_numbers: List[int] = None) -> str:
+        """
+        提取指定页面的文本
+        """
+        return '\n\n'.join(p['text'] for p in self.iter_pages(page_numbers))
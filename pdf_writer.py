@@ -0,0 +1,259 @@
+import os
+import uuid
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# 默认页面尺寸（A4，单位pt），原页面没有尺寸信息时使用
+DEFAULT_PAGE_SIZE = (595.0, 842.0)
+EXPORT_LAYOUTS = ('bilingual', 'translated')
+
+FONT_SIZE = 10
+LEADING = 14
+MARGIN = 36
+
+# Helvetica字宽（1/1000 em），对应ASCII 32-126，用于估算换行位置
+_HELVETICA_WIDTHS = (
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584
+)
+
+
+def _is_latin(char: str) -> bool:
+    """能用Helvetica（WinAnsiEncoding）输出的字符，其余字符使用中文字体"""
+    try:
+        char.encode('cp1252')
+        return True
+    except UnicodeEncodeError:
+        return False
+
+
+def char_width(char: str, size: float) -> float:
+    code = ord(char)
+    if 32 <= code <= 126:
+        return _HELVETICA_WIDTHS[code - 32] * size / 1000
+    return (556 if _is_latin(char) else 1000) * size / 1000
+
+
+def text_width(text: str, size: float) -> float:
+    return sum(char_width(char, size) for char in text)
+
+
+def wrap_text(text: str, width: float, size: float = FONT_SIZE) -> List[str]:
+    """
+    按宽度折行：拉丁文在空格处断开，中日韩文字可在任意字符间断开，原文中的换行保留
+    """
+    lines = []
+    for paragraph in text.split('\n'):
+        line = ''
+        line_width = 0.0
+        break_at = -1
+        for char in paragraph:
+            if line and (char == ' ' or line[-1] == ' ' or not _is_latin(char) or not _is_latin(line[-1])):
+                break_at = len(line)
+
+            w = char_width(char, size)
+            if line and line_width + w > width:
+                if break_at > 0:
+                    head, line = line[:break_at], line[break_at:].lstrip(' ')
+                else:
+                    head, line = line, ''
+                lines.append(head.rstrip(' '))
+                line_width = text_width(line, size)
+                break_at = -1
+                if char == ' ' and not line:
+                    continue
+
+            line += char
+            line_width += w
+        lines.append(line.rstrip(' '))
+    return lines
+
+
+def _font_runs(text: str) -> List[Tuple[bytes, bytes]]:
+    """把一行文本按字体切分为 (字体名, 编码后的字符串操作数)"""
+    runs = []
+    current = None
+    chars = []
+    for char in text:
+        latin = _is_latin(char)
+        if latin != current and chars:
+            runs.append(_encode_run(''.join(chars), current))
+            chars = []
+        current = latin
+        chars.append(char)
+    if chars:
+        runs.append(_encode_run(''.join(chars), current))
+    return runs
+
+
+def _encode_run(text: str, latin: bool) -> Tuple[bytes, bytes]:
+    if latin:
+        escaped = text.encode('cp1252').replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+        return b'/F1', b'(' + escaped + b')'
+    # UniGB-UCS2-H只能编码基本多文种平面的字符
+    encoded = ''.join(char if ord(char) <= 0xFFFF else '?' for char in text).encode('utf-16-be')
+    return b'/F2', b'<' + encoded.hex().upper().encode('ascii') + b'>'
+
+
+def text_ops(lines: Sequence[str], x: float, y: float, size: float = FONT_SIZE,
+             leading: float = LEADING) -> bytes:
+    """
+    生成从(x, y)开始逐行输出文本的内容流操作，同一行内拉丁文和中文自动切换字体
+    """
+    ops = [b'BT', f'{x:.2f} {y:.2f} Td'.encode('ascii')]
+    font = None
+    for index, line in enumerate(lines):
+        if index:
+            ops.append(f'0 {-leading:.2f} Td'.encode('ascii'))
+        for run_font, operand in _font_runs(line):
+            if run_font != font:
+                ops.append(run_font + f' {size} Tf'.encode('ascii'))
+                font = run_font
+            ops.append(operand + b' Tj')
+    ops.append(b'ET')
+    return b'\n'.join(ops)
+
+
+class PDFWriter:
+    """
+    流式PDF写入器：每个页面的对象写完即落盘，内存中只保留对象偏移和页面编号，占用与页数无关
+    页面可以按任意顺序写入，关闭时按sort_key排列页面树；先写入临时文件，关闭时原子替换为目标文件
+    字体：/F1为Helvetica，/F2为Acrobat预置的STSong-Light（中文，无需嵌入）
+    对象编号：1目录，2页面树（最后写出），3-6字体，之后每页两个对象（内容流+页面）
+    """
+
+    def __init__(self, path: str, compress: bool = True):
+        self.path = path
+        self.compress = compress
+        # 临时文件名唯一，同一目标文件被并发生成时互不干扰（最后完成的替换目标文件）
+        self._temp_path = f"{path}.{uuid.uuid4().hex[:8]}.part"
+        self._offsets = {}
+        self._pages = []
+        self._next_id = 7
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self._temp_path, 'wb')
+        self._file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._write_obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        self._write_obj(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+        self._write_obj(4, b"<< /Type /Font /Subtype /Type0 /BaseFont /STSong-Light /Encoding /UniGB-UCS2-H "
+                           b"/DescendantFonts [5 0 R] >>")
+        self._write_obj(5, b"<< /Type /Font /Subtype /CIDFontType0 /BaseFont /STSong-Light "
+                           b"/CIDSystemInfo << /Registry (Adobe) /Ordering (GB1) /Supplement 4 >> "
+                           b"/FontDescriptor 6 0 R /DW 1000 >>")
+        self._write_obj(6, b"<< /Type /FontDescriptor /FontName /STSong-Light /Flags 6 "
+                           b"/FontBBox [-25 -254 1000 880] /ItalicAngle 0 /Ascent 880 /Descent -120 "
+                           b"/CapHeight 880 /StemV 93 >>")
+
+    @property
+    def page_count(self) -> int:
+        return len(self._pages)
+
+    def add_page(self, width: float, height: float, content: bytes, sort_key=None):
+        """写入一个页面，sort_key为空时按写入顺序排列"""
+        content_id, page_id = self._next_id, self._next_id + 1
+        self._next_id += 2
+
+        if self.compress:
+            content = zlib.compress(content)
+            header = f"<< /Length {len(content)} /Filter /FlateDecode >>\nstream\n"
+        else:
+            header = f"<< /Length {len(content)} >>\nstream\n"
+        self._write_obj(content_id, header.encode('ascii') + content + b"\nendstream")
+        self._write_obj(page_id, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width:.2f} {height:.2f}] "
+            f"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode('ascii'))
+        self._pages.append((len(self._pages) if sort_key is None else sort_key, page_id))
+
+    def close(self):
+        """写出页面树和交叉引用表，完成文件"""
+        kids = ' '.join(f"{page_id} 0 R" for _, page_id in sorted(self._pages))
+        self._write_obj(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._pages)} >>".encode('ascii'))
+
+        xref_offset = self._file.tell()
+        self._file.write(f"xref\n0 {self._next_id}\n".encode('ascii'))
+        self._file.write(b"0000000000 65535 f \n")
+        for obj_id in range(1, self._next_id):
+            self._file.write(f"{self._offsets[obj_id]:010d} 00000 n \n".encode('ascii'))
+        self._file.write(
+            f"trailer\n<< /Size {self._next_id} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode('ascii')
+        )
+        self._file.close()
+        os.replace(self._temp_path, self.path)
+
+    def abort(self):
+        """放弃写入，删除临时文件"""
+        self._file.close()
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _write_obj(self, obj_id: int, body: bytes):
+        self._offsets[obj_id] = self._file.tell()
+        self._file.write(f"{obj_id} 0 obj\n".encode('ascii') + body + b"\nendobj\n")
+
+
+class TranslationPDFWriter:
+    """
+    把翻译结果逐页写成PDF，页面尺寸与原文档一致
+    layout为bilingual时每页左半为原文、右半为译文（页面宽度加倍），translated时只输出译文
+    文本超出一页时追加续页；不复制原页面的图形，只重新排版文本
+    """
+
+    def __init__(self, path: str, layout: str = 'bilingual'):
+        if layout not in EXPORT_LAYOUTS:
+            raise ValueError(f"不支持的导出版式: {layout}")
+        self.layout = layout
+        self.writer = PDFWriter(path)
+
+    @property
+    def page_count(self) -> int:
+        return self.writer.page_count
+
+    def add_page(self, page_result: Dict, bbox: Optional[Sequence[float]] = None):
+        """写入一页翻译结果，bbox为原页面的 (x0, top, x1, bottom)"""
+        width, height = DEFAULT_PAGE_SIZE
+        if bbox:
+            width, height = bbox[2] - bbox[0], bbox[3] - bbox[1]
+
+        column_width = width - 2 * MARGIN
+        lines_per_page = max(1, int((height - 2 * MARGIN) // LEADING))
+        top = height - MARGIN - FONT_SIZE
+        translated = wrap_text(page_result.get('translated') or '', column_width)
+
+        if self.layout == 'translated':
+            for index in range(0, len(translated), lines_per_page):
+                content = text_ops(translated[index:index + lines_per_page], MARGIN, top)
+                self.writer.add_page(width, height, content, sort_key=(page_result['page'], index))
+            return
+
+        original = wrap_text(page_result.get('original') or '', column_width)
+        for index in range(0, max(len(original), len(translated)), lines_per_page):
+            content = b'\n'.join((
+                # 两栏之间的分隔线
+                f'0.8 G {width:.2f} {MARGIN / 2:.2f} m {width:.2f} {height - MARGIN / 2:.2f} l S'.encode('ascii'),
+                text_ops(original[index:index + lines_per_page], MARGIN, top),
+                text_ops(translated[index:index + lines_per_page], width + MARGIN, top)
+            ))
+            self.writer.add_page(width * 2, height, content, sort_key=(page_result['page'], index))
+
+    def close(self):
+        self.writer.close()
+
+    def abort(self):
+        self.writer.abort()
@@ -0,0 +1,249 @@
+import contextvars
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+from config import Config
+
+# 当前请求所属的调度流 (用户, 任务)，等待并发名额时按用户、再按任务轮流分配
+_flow = contextvars.ContextVar('scheduling_flow', default=('', ''))
+
+
+@contextmanager
+def fair_share(user: str, flow: str):
+    """在此上下文中发出的请求（包括复制了上下文的工作线程）按 (user, flow) 公平排队"""
+    token = _flow.set((user or '', flow or ''))
+    try:
+        yield
+    finally:
+        _flow.reset(token)
+
+
+class TokenBucket:
+    """令牌桶：按每分钟速率匀速补充，容量为一分钟的额度"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount: float = 1.0):
+        """取出amount个令牌，不足时阻塞等待（超过容量的请求按容量计）"""
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(min(wait, 1.0))
+
+    def refund(self, amount: float):
+        """
+        实际消耗少于预估时归还多扣的令牌；amount为负表示实际消耗超过预估，补扣差额
+        （令牌数可暂时为负，之后的请求相应多等待）
+        """
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class AdaptiveConcurrency:
+    """
+    自适应并发上限（AIMD）：被限流时减半，连续成功后逐步加一，
+    使并发稳定在服务商允许的水平而不是来回震荡
+    名额不足时按调度流公平分配：先在用户之间轮转，同一用户再在各任务之间轮转，
+    大文档排队的请求再多也只占一份，不会让其他文档和用户饿死
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1, increase_after: int = 10):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = self.max_limit
+        self.in_flight = 0
+        self.increase_after = increase_after
+        self._successes = 0
+        self._cond = threading.Condition()
+        # 用户 -> 任务 -> 等待者队列，OrderedDict的顺序即轮转顺序
+        self._waiting = OrderedDict()
+        self._granted = set()
+
+    def acquire(self, user: str = '', flow: str = ''):
+        with self._cond:
+            if self.in_flight < self.limit and not self._waiting:
+                self.in_flight += 1
+                return
+
+            ticket = object()
+            self._waiting.setdefault(user, OrderedDict()).setdefault(flow, deque()).append(ticket)
+            self._grant()
+            while ticket not in self._granted:
+                self._cond.wait()
+            self._granted.discard(ticket)
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._grant()
+
+    def waiting(self) -> int:
+        with self._cond:
+            return sum(len(queue) for flows in self._waiting.values() for queue in flows.values())
+
+    def _grant(self):
+        """有空闲名额时依次分给下一个用户的下一个任务的最早等待者（调用方持有锁）"""
+        granted = False
+        while self.in_flight < self.limit and self._waiting:
+            user, flows = next(iter(self._waiting.items()))
+            flow, queue = next(iter(flows.items()))
+            self._granted.add(queue.popleft())
+            self.in_flight += 1
+            granted = True
+
+            if queue:
+                flows.move_to_end(flow)
+            else:
+                del flows[flow]
+            if flows:
+                self._waiting.move_to_end(user)
+            else:
+                del self._waiting[user]
+        if granted:
+            self._cond.notify_all()
+
+    def on_success(self):
+        with self._cond:
+            self._successes += 1
+            if self._successes >= self.increase_after and self.limit < self.max_limit:
+                self.limit += 1
+                self._successes = 0
+                self._grant()
+
+    def on_throttle(self):
+        with self._cond:
+            self.limit = max(self.min_limit, self.limit // 2)
+            self._successes = 0
+
+
+class RateLimiter:
+    """
+    单个服务商+模型的限流器：请求数/分钟、token数/分钟两个令牌桶，加自适应并发上限
+    收到429时所有请求暂停到Retry-After指定的时间
+    """
+
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0, max_concurrency: int = 8):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.concurrency = AdaptiveConcurrency(max_concurrency)
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, estimated_tokens: int = 0):
+        """
+        占用一个请求名额：等待暂停结束、并发名额（按fair_share设置的调度流排队）和两个令牌桶
+        """
+        self._wait_pause()
+        self.concurrency.acquire(*_flow.get())
+        try:
+            if self.requests:
+                self.requests.acquire(1)
+            if self.tokens and estimated_tokens:
+                self.tokens.acquire(estimated_tokens)
+            yield
+        finally:
+            self.concurrency.release()
+
+    def _wait_pause(self):
+        while True:
+            with self._lock:
+                remaining = self._paused_until - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(remaining)
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: int):
+        """
+        请求完成后按实际token用量修正token桶：slot按预估值扣除，这里归还多扣的部分（或补扣不足的部分）
+        """
+        if not self.tokens or not estimated_tokens or not actual_tokens:
+            return
+        # 超过容量的预估值在acquire时按容量扣除
+        self.tokens.refund(min(estimated_tokens, self.tokens.capacity) - actual_tokens)
+
+    def on_success(self):
+        self.concurrency.on_success()
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        """被限流：缩小并发上限，并按Retry-After暂停所有请求"""
+        self.concurrency.on_throttle()
+        with self._lock:
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def stats(self) -> Dict[str, float]:
+        """当前并发上限、进行中和排队等待的请求数（被限流的次数见llm_requests_total指标）"""
+        return {
+            'concurrency_limit': self.concurrency.limit,
+            'in_flight': self.concurrency.in_flight,
+            'waiting': self.concurrency.waiting()
+        }
+
+
+def backoff_delay(attempt: int, base: float = None, cap: float = None) -> float:
+    """
+    指数退避加随机抖动（full jitter）：在 [0, min(cap, base * 2^attempt)] 中随机取值
+    """
+    base = Config.RETRY_BASE_DELAY if base is None else base
+    cap = Config.RETRY_MAX_DELAY if cap is None else cap
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """
+    从接口异常的响应头中读取Retry-After（秒或毫秒），没有时返回None
+    """
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000.0
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except (TypeError, ValueError):
+        # HTTP日期格式的Retry-After不处理，交给指数退避
+        return None
+    return None
+
+
+_limiters: Dict[Tuple[str, str], RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str, model: str) -> RateLimiter:
+    """
+    获取进程内按 (服务商, 模型) 共享的限流器
+    """
+    key = (provider, model)
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = RateLimiter(
+                requests_per_minute=Config.RATE_LIMIT_RPM,
+                tokens_per_minute=Config.RATE_LIMIT_TPM,
+                max_concurrency=Config.RATE_LIMIT_CONCURRENCY
+            )
+        return _limiters[key]
@@ -0,0 +1,72 @@
+import difflib
+import hashlib
+from typing import Dict, Iterable, List, Tuple
+
+
+def split_paragraphs(text: str) -> List[str]:
+    """按空行切分段落（按块提取的页面中每个文本块就是一个段落），去掉首尾空白和空段落"""
+    return [paragraph.strip() for paragraph in (text or '').split('\n\n') if paragraph.strip()]
+
+
+def paragraph_hash(text: str) -> str:
+    """段落哈希：空白字符规整后计算，重新解析造成的换行和空格差异不影响匹配"""
+    return hashlib.sha256(' '.join(text.split()).encode('utf-8')).hexdigest()[:32]
+
+
+def page_paragraphs(page_data: Dict) -> List[str]:
+    """页面的段落列表，与PDFTranslator._plan_page切分页面的方式一致"""
+    blocks = page_data.get('blocks')
+    if blocks:
+        return [block.text for block in blocks]
+    return split_paragraphs(page_data['text'])
+
+
+def paragraph_pairs(source: str, translated: str) -> List[Tuple[str, str]]:
+    """
+    把一个分块的原文和译文拆成逐段对应的 (原文段落, 译文段落)
+    译文段落数与原文不一致时无法确定对应关系，返回空列表（这些段落在修订版中会重新翻译）
+    """
+    sources = split_paragraphs(source)
+    translations = split_paragraphs(translated)
+    if len(sources) != len(translations):
+        return []
+    return list(zip(sources, translations))
+
+
+def align_revision(parent_hashes: Iterable[str], translations: Dict[str, str],
+                   pages: List[Dict]) -> Dict[str, int]:
+    """
+    将修订版页面的段落与上一版逐段对齐（difflib按段落哈希序列比较），
+    为每个页面设置 page['reuse']：与page_paragraphs一一对应，可复用的段落为上一版译文，需要翻译的为None
+    未改动的段落直接复用；位置移动但内容相同的段落同样复用；新增和修改的段落需要翻译
+    translations为上一版 {段落哈希: 译文}，没有记录译文的段落（如当时原样保留或翻译失败）按需要翻译处理
+    返回统计：paragraphs、reused、moved、changed（新增和修改）、deleted
+    """
+    parent_hashes = list(parent_hashes)
+    positions = []
+    hashes = []
+    for page_data in pages:
+        paragraphs = page_paragraphs(page_data)
+        page_data['reuse'] = [None] * len(paragraphs)
+        for index, paragraph in enumerate(paragraphs):
+            positions.append((page_data, index))
+            hashes.append(paragraph_hash(paragraph))
+
+    stats = {'paragraphs': len(hashes), 'reused': 0, 'moved': 0, 'changed': 0, 'deleted': 0}
+    # autojunk会把频繁出现的段落（如重复的页眉）当作噪声忽略，这里需要关闭
+    matcher = difflib.SequenceMatcher(None, parent_hashes, hashes, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag in ('delete', 'replace'):
+            stats['deleted'] += i2 - i1
+        for j in range(j1, j2):
+            translated = translations.get(hashes[j])
+            if translated is None:
+                if tag != 'equal':
+                    stats['changed'] += 1
+                continue
+
+            page_data, index = positions[j]
+            page_data['reuse'][index] = translated
+            stats['reused' if tag == 'equal' else 'moved'] += 1
+    return stats
+
@@ -30,10 +30,18 @@ if lsof -ti:5000 >/dev/null 2>&1; then
 fi
 
 # 启动后端服务器
+# 默认使用gunicorn（多线程、启动预热、停止时等待进行中的任务）；--dev 使用Flask开发服务器（自动重载）
 echo ""
 echo "✅ 启动后端服务器..."
 echo "API地址: http://localhost:5000"
 echo "按 Ctrl+C 停止"
 echo ""
 
-python3 app.py
+if [ "$1" = "--dev" ]; then
+    python3 app.py
+elif python3 -c "import gunicorn" 2>/dev/null; then
+    exec gunicorn -c gunicorn.conf.py wsgi:app
+else
+    echo "⚠️  未安装gunicorn，使用开发服务器（pip install gunicorn 后使用生产模式）"
+    python3 app.py
+fi
@@ -0,0 +1,189 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, Optional
+
+from config import Config
+from metrics import CACHE_LOOKUPS
+
+# 淘汰时每次查询的条目数
+EVICT_BATCH = 256
+# 命中时的访问时间先记在内存中，攒够条数或超过间隔（秒）再批量写入
+ACCESS_FLUSH_SIZE = 256
+ACCESS_FLUSH_INTERVAL = 5.0
+
+
+class TranslationCache:
+    """基于SQLite的持久化翻译缓存，按内容哈希寻址，超出容量时按LRU淘汰"""
+
+    def __init__(self, db_path: str, max_entries: int = 100000, max_bytes: int = 512 * 1024 * 1024):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pending_access = {}  # key -> 尚未写入的最近访问时间
+        self._last_flush = time.monotonic()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS translations ('
+            ' key TEXT PRIMARY KEY,'
+            ' translated TEXT NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' created_at REAL NOT NULL,'
+            ' last_access REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_translations_access ON translations (last_access)')
+        self._conn.commit()
+        # 条目数和总大小只在启动时统计一次，之后随写入和淘汰增减
+        self._count, self._bytes = self._conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM translations'
+        ).fetchone()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """
+        规范化文本：统一Unicode形式，合并行内空白、去掉行尾空白和多余空行
+        行首缩进保持不变，缩进不同的代码或文本块不会共用缓存键
+        """
+        text = unicodedata.normalize('NFC', text)
+        text = re.sub(r'(?<=\S)[ \t　]+', ' ', text)
+        text = re.sub(r'[ \t　]+(?=\n|$)', '', text)
+        text = re.sub(r'\n{3,}', '\n\n', text)
+        return text.lstrip('\n').rstrip()
+
+    @classmethod
+    def make_key(cls, text: str, source_lang: str, target_lang: str, model: str, prompt_version: str) -> str:
+        """
+        生成缓存键：规范化文本 + 源/目标语言 + 模型 + 提示词版本的SHA-256
+        """
+        payload = '\x1f'.join([prompt_version, model, source_lang, target_lang, cls.normalize(text)])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute('SELECT translated FROM translations WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                CACHE_LOOKUPS.inc(result='miss')
+                return None
+
+            self.hits += 1
+            CACHE_LOOKUPS.inc(result='hit')
+            self._pending_access[key] = time.time()
+            if (len(self._pending_access) >= ACCESS_FLUSH_SIZE
+                    or time.monotonic() - self._last_flush >= ACCESS_FLUSH_INTERVAL):
+                self._flush_access()
+                self._conn.commit()
+            return row[0]
+
+    def set(self, key: str, translated: str):
+        now = time.time()
+        size = len(translated.encode('utf-8'))
+        with self._lock:
+            row = self._conn.execute('SELECT size FROM translations WHERE key = ?', (key,)).fetchone()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO translations (key, translated, size, created_at, last_access) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, translated, size, now, now)
+            )
+            self._pending_access.pop(key, None)
+            if row is None:
+                self._count += 1
+                self._bytes += size
+            else:
+                self._bytes += size - row[0]
+            self._evict()
+            self._conn.commit()
+
+    def _flush_access(self):
+        """把内存中记录的访问时间写入数据库（调用方需持有锁并负责提交）"""
+        if self._pending_access:
+            self._conn.executemany(
+                'UPDATE translations SET last_access = ? WHERE key = ?',
+                [(accessed, key) for key, accessed in self._pending_access.items()]
+            )
+            self._pending_access.clear()
+        self._last_flush = time.monotonic()
+
+    def _over_limit(self) -> bool:
+        return self._count > self.max_entries or self._bytes > self.max_bytes
+
+    def _evict(self):
+        """淘汰最久未访问的条目，直到条目数和总大小都回到上限以内（调用方需持有锁）"""
+        if not self._over_limit():
+            return
+
+        # 先写入访问时间，避免淘汰最近命中过的条目
+        self._flush_access()
+        while self._over_limit():
+            rows = self._conn.execute(
+                'SELECT key, size FROM translations ORDER BY last_access LIMIT ?', (EVICT_BATCH,)
+            ).fetchall()
+            if not rows:
+                self._count = self._bytes = 0
+                return
+
+            expired = []
+            for key, size in rows:
+                if not self._over_limit():
+                    break
+                expired.append((key,))
+                self._count -= 1
+                self._bytes -= size
+            self._conn.executemany('DELETE FROM translations WHERE key = ?', expired)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            count, total = self._count, self._bytes
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'entries': count,
+                'bytes': total,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes
+            }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM translations')
+            self._conn.commit()
+            self._pending_access.clear()
+            self._count = self._bytes = 0
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_translation_cache() -> Optional[TranslationCache]:
+    """
+    获取进程内共享的翻译缓存，未启用缓存时返回None
+    """
+    global _cache
+
+    if not Config.CACHE_ENABLED:
+        return None
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = TranslationCache(
+                os.path.join(Config.DATA_FOLDER, 'translations.db'),
+                max_entries=Config.CACHE_MAX_ENTRIES,
+                max_bytes=Config.CACHE_MAX_MB * 1024 * 1024
+            )
+        return _cache
@@ -0,0 +1,239 @@
+import hashlib
+import os
+import random
+import sqlite3
+import threading
+import time
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+
+from chunker import split_sentences
+from config import Config
+from translation_cache import TranslationCache
+
+# MinHash参数：64个哈希函数分为16个band，每个band 4行
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+MIN_FUZZY_LENGTH = 12  # 短于该长度的句子不做模糊匹配
+# 按句数拆出的句对，每对的译文/原文长度比与整段相差超过该倍数时视为对不齐，不保存
+MAX_LENGTH_RATIO_DEVIATION = 2.0
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(20240101)  # 固定种子，保证持久化的签名在不同进程间一致
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+
+
+def segment_sentences(text: str) -> List[Tuple[str, str]]:
+    """
+    将文本切分为句子，返回 (句子, 句后空白) 列表，按顺序拼接可还原原文
+    """
+    segments = []
+    for piece in split_sentences(text):
+        sentence = piece.rstrip()
+        segments.append((sentence, piece[len(sentence):]))
+    return segments
+
+
+def _stable_hash(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
+
+def minhash_bands(text: str) -> List[int]:
+    """
+    计算文本字符n-gram的MinHash签名，按band返回每个band的桶号
+    """
+    text = text.lower()
+    if len(text) <= SHINGLE_SIZE:
+        shingles = {text}
+    else:
+        shingles = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    hashes = [_stable_hash(s.encode('utf-8')) for s in shingles]
+
+    signature = [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+    buckets = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS:(band + 1) * ROWS]
+        # 转为有符号64位整数，便于存入SQLite INTEGER
+        buckets.append(int.from_bytes(
+            hashlib.blake2b(repr(rows).encode('ascii'), digest_size=8).digest(), 'little', signed=True
+        ))
+    return buckets
+
+
+class TranslationMemory:
+    """
+    翻译记忆库：保存历史原文/译文对（SQLite），包括整段和单句
+    完全相同的原文直接复用译文；相似句子通过MinHash LSH索引召回，作为参考译文提供给模型
+    从整段译文按句数拆出的句对（derived）对应关系不确定，只作为参考译文，不作为精确匹配复用
+    """
+
+    def __init__(self, db_path: str, threshold: float = 0.75):
+        self.threshold = threshold
+        self.exact_hits = 0
+        self.fuzzy_hits = 0
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS segments ('
+            ' id INTEGER PRIMARY KEY,'
+            ' key TEXT UNIQUE NOT NULL,'
+            ' source_lang TEXT NOT NULL,'
+            ' target_lang TEXT NOT NULL,'
+            ' source TEXT NOT NULL,'
+            ' target TEXT NOT NULL,'
+            ' created_at REAL NOT NULL)'
+        )
+        # 旧版本创建的表没有derived列
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(segments)')}
+        if 'derived' not in columns:
+            self._conn.execute('ALTER TABLE segments ADD COLUMN derived INTEGER NOT NULL DEFAULT 0')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS lsh ('
+            ' band INTEGER NOT NULL,'
+            ' bucket INTEGER NOT NULL,'
+            ' segment_id INTEGER NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_lsh_bucket ON lsh (band, bucket)')
+        self._conn.commit()
+
+    @staticmethod
+    def _key(source: str, source_lang: str, target_lang: str) -> str:
+        payload = '\x1f'.join([source_lang, target_lang, TranslationCache.normalize(source)])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def lookup(self, source: str, source_lang: str, target_lang: str) -> Optional[str]:
+        """精确匹配：返回完全相同原文（忽略空白差异）的历史译文，拆分得到的句对不参与精确匹配"""
+        key = self._key(source, source_lang, target_lang)
+        with self._lock:
+            row = self._conn.execute('SELECT target FROM segments WHERE key = ? AND derived = 0', (key,)).fetchone()
+            if row:
+                self.exact_hits += 1
+        return row[0] if row else None
+
+    def find_similar(self, source: str, source_lang: str, target_lang: str,
+                     limit: int = 3) -> List[Dict]:
+        """
+        模糊匹配：返回相似度不低于threshold的历史句对，按相似度从高到低排序
+        """
+        normalized = TranslationCache.normalize(source)
+        if len(normalized) < MIN_FUZZY_LENGTH:
+            return []
+
+        buckets = minhash_bands(normalized)
+        where = ' OR '.join(['(band = ? AND bucket = ?)'] * BANDS)
+        params = [v for band, bucket in enumerate(buckets) for v in (band, bucket)]
+
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT source, target FROM segments WHERE source_lang = ? AND target_lang = ? AND id IN '
+                f'(SELECT DISTINCT segment_id FROM lsh WHERE {where}) LIMIT 50',
+                [source_lang, target_lang] + params
+            ).fetchall()
+
+        matches = []
+        for candidate, target in rows:
+            score = SequenceMatcher(None, normalized, TranslationCache.normalize(candidate)).ratio()
+            if score >= self.threshold:
+                matches.append({'source': candidate, 'target': target, 'score': round(score, 3)})
+
+        matches.sort(key=lambda m: m['score'], reverse=True)
+        if matches:
+            with self._lock:
+                self.fuzzy_hits += 1
+        return matches[:limit]
+
+    def add(self, source: str, target: str, source_lang: str, target_lang: str, derived: bool = False):
+        """
+        保存一个原文/译文对；derived为True表示从整段译文拆出的句对，已有的条目不会被拆出的句对覆盖，
+        拆出的句对会被之后直接翻译得到的译文替换
+        """
+        source = source.strip()
+        target = target.strip()
+        if not source or not target:
+            return
+
+        key = self._key(source, source_lang, target_lang)
+        normalized = TranslationCache.normalize(source)
+        buckets = minhash_bands(normalized) if len(normalized) >= MIN_FUZZY_LENGTH else []
+
+        with self._lock:
+            row = self._conn.execute('SELECT derived FROM segments WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                cursor = self._conn.execute(
+                    'INSERT INTO segments (key, source_lang, target_lang, source, target, derived, created_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (key, source_lang, target_lang, source, target, int(derived), time.time())
+                )
+                if buckets:
+                    self._conn.executemany(
+                        'INSERT INTO lsh (band, bucket, segment_id) VALUES (?, ?, ?)',
+                        [(band, bucket, cursor.lastrowid) for band, bucket in enumerate(buckets)]
+                    )
+            elif row[0] and not derived:
+                self._conn.execute(
+                    'UPDATE segments SET target = ?, derived = 0, created_at = ? WHERE key = ?',
+                    (target, time.time(), key)
+                )
+            self._conn.commit()
+
+    def add_translation(self, source_text: str, target_text: str, source_lang: str, target_lang: str):
+        """
+        保存一段译文：整段作为一个条目保存（可精确匹配复用）
+        原文和译文句子数一致、且每对句子的长度比都与整段相近时，另外按句保存拆出的句对，只作为参考译文
+        """
+        self.add(source_text, target_text, source_lang, target_lang)
+
+        source_sentences = [s for s, _ in segment_sentences(source_text)]
+        target_sentences = [s for s, _ in segment_sentences(target_text)]
+        if len(source_sentences) < 2 or len(source_sentences) != len(target_sentences):
+            return
+
+        pairs = list(zip(source_sentences, target_sentences))
+        if all(_ratio_consistent(source, target, source_text, target_text) for source, target in pairs):
+            for source, target in pairs:
+                self.add(source, target, source_lang, target_lang, derived=True)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            count = self._conn.execute('SELECT COUNT(*) FROM segments').fetchone()[0]
+            return {'segments': count, 'exact_hits': self.exact_hits, 'fuzzy_hits': self.fuzzy_hits}
+
+
+def _ratio_consistent(source: str, target: str, source_text: str, target_text: str) -> bool:
+    """句对的译文/原文长度比与整段的长度比相差不超过MAX_LENGTH_RATIO_DEVIATION倍"""
+    if not source or not target or not source_text.strip() or not target_text.strip():
+        return False
+    ratio = len(target) / len(source)
+    overall = len(target_text.strip()) / len(source_text.strip())
+    return overall / MAX_LENGTH_RATIO_DEVIATION <= ratio <= overall * MAX_LENGTH_RATIO_DEVIATION
+
+
+_memory = None
+_memory_lock = threading.Lock()
+
+
+def get_translation_memory() -> Optional[TranslationMemory]:
+    """
+    获取进程内共享的翻译记忆库，未启用时返回None
+    """
+    global _memory
+
+    if not Config.MEMORY_ENABLED:
+        return None
+
+    with _memory_lock:
+        if _memory is None:
+            _memory = TranslationMemory(
+                os.path.join(Config.DATA_FOLDER, 'memory.db'),
+                threshold=Config.MEMORY_FUZZY_THRESHOLD
+            )
+        return _memory
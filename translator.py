@@ -1,178 +1,821 @@
-from openai import OpenAI
 from config import Config
-from typing import List, Dict
+from client_pool import ClientPool, get_client_pool
+from translation_cache import get_translation_cache
+from rate_limiter import backoff_delay, get_rate_limiter, retry_after_seconds
+from translation_memory import get_translation_memory, segment_sentences
+from chunker import chunk_text, estimate_tokens, group_segments, token_budget
+from layout import TRANSLATABLE_KINDS, is_translatable
+from revision import page_paragraphs, paragraph_pairs
+from boilerplate import candidate_lines, find_boilerplate, normalize_line, split_boilerplate
+from metrics import (LLM_REQUESTS, LLM_TOKENS, PAGES, RATE_LIMIT_WAIT_SECONDS,
+                     observe_span, span, trace_context)
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import ExitStack
+from typing import Callable, Iterable, Iterator, List, Dict, Optional, Tuple
+import contextvars
+import hashlib
 import json
+import threading
 import time
 
-class PDFTranslator:
-    """PDF翻译器，使用大语言模型进行翻译"""
+# 提示词版本：修改翻译提示词时需要递增，使旧的缓存结果失效
+PROMPT_VERSION = '1'
 
-    def __init__(self):
-        if not Config.API_KEY:
-            raise ValueError(f"请设置API_KEY环境变量（当前使用: {Config.API_PROVIDER}）")
 
-        # 构建客户端配置
-        # OpenAI客户端的timeout参数应该是数字（秒）或Timeout对象
-        client_kwargs = {
-            'api_key': Config.API_KEY,
-            'timeout': float(Config.TIMEOUT)  # 确保是浮点数
-        }
+class TranslationCancelled(Exception):
+    """翻译任务被取消"""
 
-        # 设置API地址
-        if Config.BASE_URL:
-            client_kwargs['base_url'] = Config.BASE_URL
-        elif Config.API_PROVIDER == 'deepseek':
-            # DeepSeek默认base_url
-            client_kwargs['base_url'] = 'https://api.deepseek.com'
-
-        # 如果设置了代理
-        if Config.OPENAI_PROXY:
-            import httpx
-            import socket
-            # 检查代理是否可用
-            try:
-                # 解析代理URL获取端口
-                proxy_url = Config.OPENAI_PROXY
-                if proxy_url.startswith('http://'):
-                    host_port = proxy_url.replace('http://', '').split(':')
-                    if len(host_port) == 2:
-                        host, port = host_port[0], int(host_port[1])
-                        # 检查端口是否可连接（快速检查，2秒超时）
-                        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                        sock.settimeout(2)
-                        result = sock.connect_ex((host, port))
-                        sock.close()
-                        if result == 0:
-                            # 代理端口可连接，使用代理
-                            # httpx的timeout需要是Timeout对象，设置连接超时和读取超时
-                            timeout_obj = httpx.Timeout(
-                                Config.TIMEOUT,  # 总超时时间
-                                connect=5.0  # 连接超时5秒
-                            )
-                            client_kwargs['http_client'] = httpx.Client(
-                                proxy=proxy_url,
-                                timeout=timeout_obj,
-                                limits=httpx.Limits(max_keepalive_connections=5, max_connections=10)
-                            )
-                        else:
-                            # 代理不可用，跳过代理配置
-                            print(f"⚠️  警告: 代理 {proxy_url} 端口不可用，将尝试直接连接")
-            except Exception as e:
-                # 代理配置解析失败，跳过代理
-                print(f"⚠️  警告: 代理配置错误 ({str(e)})，将尝试直接连接")
 
-        self.client = OpenAI(**client_kwargs)
+def chunk_hash(text: str) -> str:
+    """分块原文的哈希，用于检查点匹配（分块参数变化后旧检查点自然失效）"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+
+
+class PDFTranslator:
+    """PDF翻译器，使用大语言模型进行翻译"""
+
+    def __init__(self, client_pool: ClientPool = None):
+        self.client_pool = client_pool or get_client_pool()
         self.model = Config.MODEL
         self.provider = Config.API_PROVIDER
         self.target_language = Config.TARGET_LANGUAGE
         self.source_language = Config.SOURCE_LANGUAGE
+        self.cache = get_translation_cache()
+        self.memory = get_translation_memory()
 
-        print(f"✅ 已初始化 {Config.API_PROVIDER.upper()} 客户端，模型: {self.model}")
+    @property
+    def client(self):
+        """当前使用的共享客户端（代理不可用时自动切换为直连）"""
+        return self.client_pool.get()
 
-    def translate_text(self, text: str, source_lang: str = None, target_lang: str = None) -> str:
+    def translate_text(self, text: str, source_lang: str = None, target_lang: str = None,
+                       references: List[Dict] = None) -> str:
         """
         翻译文本
+        references为翻译记忆中相似句子的 {'source', 'target'} 列表，会作为参考译文附在提示词中
         """
         source_lang = source_lang or self.source_language
         target_lang = target_lang or self.target_language
 
-        prompt = f"""请将以下{source_lang}文本翻译成{target_lang}。要求：
+        with span('translate_text', chars=len(text), references=len(references or [])) as attrs:
+            cache_key = None
+            if self.cache:
+                cache_key = self.cache.make_key(
+                    text, source_lang, target_lang, self.model, self._prompt_version(references)
+                )
+                cached = self.cache.get(cache_key)
+                attrs['cache_hit'] = cached is not None
+                if cached is not None:
+                    return cached
+
+            response = self._create_completion(self._build_messages(text, source_lang, target_lang, references))
+
+            translated = response.choices[0].message.content.strip()
+            if cache_key:
+                self.cache.set(cache_key, translated)
+            return translated
+
+    def translate_text_stream(self, text: str, source_lang: str = None, target_lang: str = None,
+                              references: List[Dict] = None) -> Iterator[str]:
+        """
+        流式翻译文本，逐段返回模型生成的增量内容
+        命中缓存时一次性返回缓存结果；完整译文在流结束后写入缓存
+        """
+        source_lang = source_lang or self.source_language
+        target_lang = target_lang or self.target_language
+        # 生成器会跨越调用方的代码暂停，不使用span上下文，结束时再记录耗时
+        start = time.perf_counter()
+
+        cache_key = None
+        if self.cache:
+            cache_key = self.cache.make_key(
+                text, source_lang, target_lang, self.model, self._prompt_version(references)
+            )
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                observe_span('translate_text', time.perf_counter() - start, chars=len(text),
+                             stream=True, cache_hit=True)
+                yield cached
+                return
+
+        messages = self._build_messages(text, source_lang, target_lang, references)
+        stream = self._create_completion(messages, stream=True)
+
+        parts = []
+        try:
+            for event in stream:
+                if not event.choices:
+                    continue
+                delta = event.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        except Exception as e:
+            raise Exception(f"翻译失败: {str(e)}")
+        finally:
+            # 提前结束（如客户端断开）时关闭响应流，释放并发名额
+            stream.close()
+
+        translated = ''.join(parts).strip()
+        observe_span('translate_text', time.perf_counter() - start, chars=len(text), stream=True,
+                     cache_hit=False)
+
+        if cache_key:
+            self.cache.set(cache_key, translated)
+
+    def translate_batch(self, texts: List[str], source_lang: str = None,
+                        target_lang: str = None) -> Tuple[List[Optional[str]], List[Optional[Exception]]]:
+        """
+        批量翻译多个短片段：以JSON数组发送，一次请求返回等长的JSON数组
+        各片段分别读写缓存；返回的数组无法解析或元素个数不符时回退为逐段翻译
+        返回 (各片段译文, 各片段异常)：逐段翻译时单个片段失败只记录该片段的异常，其余片段照常返回译文
+        """
+        source_lang = source_lang or self.source_language
+        target_lang = target_lang or self.target_language
+
+        results = [None] * len(texts)
+        errors = [None] * len(texts)
+        cache_keys = [None] * len(texts)
+        with span('translate_batch', segments=len(texts)) as attrs:
+            if self.cache:
+                for i, text in enumerate(texts):
+                    cache_keys[i] = self.cache.make_key(text, source_lang, target_lang, self.model, PROMPT_VERSION)
+                    results[i] = self.cache.get(cache_keys[i])
+
+            missing = [i for i, result in enumerate(results) if result is None]
+            attrs['cache_hits'] = len(texts) - len(missing)
+            translated = None
+            if len(missing) > 1:
+                try:
+                    response = self._create_completion(
+                        self._build_batch_messages([texts[i] for i in missing], source_lang, target_lang)
+                    )
+                    translated = self._parse_batch(response.choices[0].message.content, len(missing))
+                except Exception:
+                    translated = None
+
+                if translated is None:
+                    attrs['fallback'] = True
+                elif self.cache:
+                    for i, result in zip(missing, translated):
+                        self.cache.set(cache_keys[i], result)
+
+            if translated is None:
+                for i in missing:
+                    try:
+                        results[i] = self.translate_text(texts[i], source_lang, target_lang)
+                    except Exception as e:
+                        errors[i] = e
+                attrs['errors'] = sum(1 for error in errors if error)
+            else:
+                for i, result in zip(missing, translated):
+                    results[i] = result
+
+        return results, errors
+
+    def _build_batch_messages(self, texts: List[str], source_lang: str, target_lang: str) -> List[Dict]:
+        prompt = f"""请将下面JSON数组中的每个{source_lang}文本分别翻译成{target_lang}。要求：
 1. 保持原文的格式和结构
 2. 翻译准确、流畅
 3. 如果是技术文档，保持专业术语的准确性
+4. 只输出一个JSON字符串数组，元素个数和顺序必须与输入完全一致，不要输出其他内容
 
+原文：
+{json.dumps(texts, ensure_ascii=False)}
+
+翻译结果："""
+
+        return [
+            {"role": "system", "content": f"你是一位专业的{source_lang}到{target_lang}翻译专家。"},
+            {"role": "user", "content": prompt}
+        ]
+
+    @staticmethod
+    def _parse_batch(content: str, expected: int) -> Optional[List[str]]:
+        """
+        解析模型返回的JSON数组（容忍代码块包裹等多余内容），校验失败返回None
+        """
+        start = content.find('[')
+        end = content.rfind(']')
+        if start < 0 or end <= start:
+            return None
+
+        try:
+            items = json.loads(content[start:end + 1])
+        except ValueError:
+            return None
+
+        if not isinstance(items, list) or len(items) != expected or not all(isinstance(i, str) for i in items):
+            return None
+        return [item.strip() for item in items]
+
+    @staticmethod
+    def _prompt_version(references: List[Dict] = None) -> str:
+        """带参考译文的提示词不同，缓存键中加入参考内容的摘要"""
+        if not references:
+            return PROMPT_VERSION
+        digest = hashlib.sha256(json.dumps(references, ensure_ascii=False, sort_keys=True).encode('utf-8'))
+        return f"{PROMPT_VERSION}+ref:{digest.hexdigest()[:16]}"
+
+    def _build_messages(self, text: str, source_lang: str, target_lang: str,
+                        references: List[Dict] = None) -> List[Dict]:
+        reference_text = ''
+        if references:
+            pairs = '\n'.join(f"- 原文：{r['source']}\n  译文：{r['target']}" for r in references)
+            reference_text = f"""
+参考译文（翻译记忆中的相似句子，请保持术语和风格一致，并根据原文的差异调整）：
+{pairs}
+"""
+
+        prompt = f"""请将以下{source_lang}文本翻译成{target_lang}。要求：
+1. 保持原文的格式和结构
+2. 翻译准确、流畅
+3. 如果是技术文档，保持专业术语的准确性
+{reference_text}
 原文：
 {text}
 
 翻译结果："""
 
-        max_retries = 3
-        retry_delay = 2  # 重试延迟（秒）
+        return [
+            {"role": "system", "content": f"你是一位专业的{source_lang}到{target_lang}翻译专家。"},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _create_completion(self, messages: List[Dict], **kwargs):
+        """
+        调用模型接口，经过共享限流器控制请求数/token数和并发
+        429、5xx、连接和超时错误按Retry-After或指数退避加抖动重试，其他错误直接抛出
+        """
+        with span('llm_request', model=self.model, stream=bool(kwargs.get('stream'))) as attrs:
+            return self._create_completion_with_retries(messages, attrs, **kwargs)
+
+    def _create_completion_with_retries(self, messages: List[Dict], attrs: Dict, **kwargs):
+        """_create_completion的重试循环，重试次数、排队时间和token数记录到attrs"""
+        limiter = get_rate_limiter(self.provider, self.model)
+        input_tokens = self._count_message_tokens(messages)
+        # 预估本次请求的token数：输入 + 与输入相当的输出，响应后按usage修正
+        estimated_tokens = 2 * input_tokens
+        max_retries = Config.MAX_RETRIES
+        attrs['queued_ms'] = 0.0
+
+        if kwargs.get('stream'):
+            # 在最后一个事件中返回usage，流结束时按实际用量修正token桶
+            kwargs.setdefault('stream_options', {'include_usage': True})
 
         for attempt in range(max_retries):
-            try:
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": f"你是一位专业的{source_lang}到{target_lang}翻译专家。"},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.3,
-                    timeout=Config.TIMEOUT
-                )
+            attrs['attempts'] = attempt + 1
+            wait_start = time.perf_counter()
+            with ExitStack() as slot:
+                slot.enter_context(limiter.slot(estimated_tokens))
+                waited = time.perf_counter() - wait_start
+                RATE_LIMIT_WAIT_SECONDS.observe(waited, model=self.model)
+                attrs['queued_ms'] = round(attrs['queued_ms'] + waited * 1000, 2)
+                try:
+                    response = self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        temperature=0.3,
+                        timeout=Config.TIMEOUT,
+                        **kwargs
+                    )
+                    limiter.on_success()
+                    LLM_REQUESTS.inc(model=self.model, outcome='success')
+                    if kwargs.get('stream'):
+                        # 流式请求收到响应头就返回，并发名额保留到流读完或关闭
+                        return self._stream_events(response, slot.pop_all(), estimated_tokens, input_tokens)
+                    usage = getattr(response, 'usage', None)
+                    limiter.reconcile(estimated_tokens, getattr(usage, 'total_tokens', None))
+                    self._record_usage(usage, input_tokens, attrs)
+                    return response
 
-                return response.choices[0].message.content.strip()
+                except Exception as e:
+                    error = e
 
-            except Exception as e:
-                error_msg = str(e)
-                error_type = type(e).__name__
+            error_msg = str(error)
+            error_type = type(error).__name__
+            status = getattr(error, 'status_code', None)
+            is_connection_error = (
+                'Connection' in error_type or 'Timeout' in error_type or 'connection' in error_msg.lower()
+            )
+            retryable = status == 429 or (status is not None and status >= 500) or is_connection_error
+            LLM_REQUESTS.inc(model=self.model, outcome=('throttled' if status == 429 else
+                                                         'retryable_error' if retryable else 'error'))
+
+            if not retryable:
+                # 其他错误直接抛出
+                raise Exception(f"翻译失败: {error_msg}")
+
+            retry_after = retry_after_seconds(error)
+            if status == 429:
+                limiter.on_throttle(retry_after)
+
+            if attempt < max_retries - 1:
+                time.sleep(retry_after if retry_after is not None else backoff_delay(attempt))
+                continue
 
+            if is_connection_error:
                 # 如果是连接错误，提供更详细的提示
-                if 'Connection' in error_type or 'connection' in error_msg.lower():
-                    if attempt < max_retries - 1:
-                        time.sleep(retry_delay * (attempt + 1))  # 指数退避
-                        continue
-                    else:
-                        raise Exception(
-                            f"连接失败（已重试{max_retries}次）: {error_msg}\n"
-                            f"提示：\n"
-                            f"1. 检查网络连接是否正常\n"
-                            f"2. 如果在中国大陆，可能需要配置代理（在.env中设置PROXY）\n"
-                            f"3. 检查API密钥是否正确\n"
-                            f"4. 尝试增加超时时间（在.env中设置TIMEOUT）"
-                        )
-                else:
-                    # 其他错误直接抛出
-                    raise Exception(f"翻译失败: {error_msg}")
+                raise Exception(
+                    f"连接失败（已重试{max_retries}次）: {error_msg}\n"
+                    f"提示：\n"
+                    f"1. 检查网络连接是否正常\n"
+                    f"2. 如果在中国大陆，可能需要配置代理（在.env中设置PROXY）\n"
+                    f"3. 检查API密钥是否正确\n"
+                    f"4. 尝试增加超时时间（在.env中设置TIMEOUT）"
+                )
+            raise Exception(f"翻译失败（已重试{max_retries}次）: {error_msg}")
 
         raise Exception("翻译失败：达到最大重试次数")
 
-    def translate_pages(self, pages: List[Dict], chunk_size: int = 2000) -> List[Dict]:
+    def _count_message_tokens(self, messages: List[Dict]) -> int:
+        return sum(estimate_tokens(m['content'], self.model) for m in messages)
+
+    def _stream_events(self, stream, slot: ExitStack, estimated_tokens: int, input_tokens: int) -> Iterator:
+        """
+        逐个返回流式响应的事件，流读完或关闭时释放slot中的并发名额
+        按最后一个事件中的usage修正token桶和记录用量，服务商不返回usage时按译文长度估算
+        """
+        usage = None
+        parts = []
+        try:
+            with slot:
+                for event in stream:
+                    usage = getattr(event, 'usage', None) or usage
+                    if event.choices and event.choices[0].delta.content:
+                        parts.append(event.choices[0].delta.content)
+                    yield event
+        finally:
+            close = getattr(stream, 'close', None)
+            if close:
+                close()
+            tokens_in = getattr(usage, 'prompt_tokens', None) or input_tokens
+            tokens_out = (getattr(usage, 'completion_tokens', None)
+                          or estimate_tokens(''.join(parts), self.model))
+            get_rate_limiter(self.provider, self.model).reconcile(
+                estimated_tokens, getattr(usage, 'total_tokens', None) or tokens_in + tokens_out
+            )
+            LLM_TOKENS.inc(tokens_in, model=self.model, direction='in')
+            LLM_TOKENS.inc(tokens_out, model=self.model, direction='out')
+
+    def _record_usage(self, usage, input_tokens: int, attrs: Dict):
+        """
+        记录token用量：优先使用响应中的usage，没有时按预估的输入token数记录
+        """
+        tokens_in = getattr(usage, 'prompt_tokens', None) or input_tokens
+        tokens_out = getattr(usage, 'completion_tokens', None)
+
+        attrs['tokens_in'] = tokens_in
+        LLM_TOKENS.inc(tokens_in, model=self.model, direction='in')
+        if tokens_out:
+            attrs['tokens_out'] = tokens_out
+            LLM_TOKENS.inc(tokens_out, model=self.model, direction='out')
+
+    def translate_pages(self, pages: List[Dict], chunk_tokens: int = None, max_workers: int = None,
+                        on_page_done: Callable[[Dict], None] = None,
+                        cancel_event: threading.Event = None,
+                        on_delta: Callable[[int, int, str], None] = None,
+                        checkpoint: Dict[Tuple[int, str], str] = None,
+                        on_chunk_done: Callable[[int, int, str, str], None] = None,
+                        on_segments: Callable[[int, List[Tuple[str, str]]], None] = None,
+                        boilerplate: Iterable[str] = None) -> List[Dict]:
         """
         翻译PDF页面，支持分块处理长文本
+        长页面按token预算（chunk_tokens，默认按模型取值）切分为多个分块，连续的短分块（短页面、同一页面中被表格隔开的文本）合并为一次批量请求。
+        所有请求统一放入线程池并发翻译，同时进行中的请求数不超过max_workers
+        （默认Config.MAX_CONCURRENCY），结果按原页面和分块顺序返回。
+        单个分块失败时保留该分块原文并在页面上记录error，不影响其他页面。
+        每个页面全部分块完成时调用on_page_done；cancel_event被设置后停止翻译并抛出TranslationCancelled。
+        传入on_delta时使用流式接口，每收到增量内容就在工作线程中调用 on_delta(页码, 分块序号, 增量文本)
+        checkpoint为之前已完成分块的 {(页码, 分块哈希): 译文}，命中的分块不再请求模型；
+        多分块页面的分块翻译成功时调用 on_chunk_done(页码, 分块序号, 分块哈希, 译文)，用于保存检查点；
+        页面的最后一个分块（包括单分块页面）完成时整页随即完成，不调用
+        页面带有blocks（按块提取）时只翻译正文和标题块，不需要翻译的内容原样保留，见_plan_page
+        页面带有reuse（修订版，见revision.align_revision）时复用上一版的段落译文，只翻译新增和修改的段落
+        每个页面完成时（on_page_done之前）调用 on_segments(页码, [(原文段落, 译文段落), ...])，
+        记录本页可供之后的修订版复用的段落译文
+        开启Config.BOILERPLATE_DEDUP时，先找出在多个页面中重复出现的行（页眉、页脚、版权声明等），
+        每行只翻译一次后替换回各页；boilerplate为调用方额外给出的重复行（如批量任务中跨文档统计的结果）
         """
-        translated_pages = []
+        budget = token_budget(self.model, chunk_tokens or Config.CHUNK_TOKENS)
+        boilerplate_translations = {}
+        if Config.BOILERPLATE_DEDUP:
+            lines = find_boilerplate([pages], Config.BOILERPLATE_MIN_PAGES)
+            if boilerplate:
+                # 外部给出的重复行只翻译本文档中出现的
+                present = {line for page_data in pages for line in candidate_lines(page_data)}
+                lines |= present.intersection(boilerplate)
+            if lines:
+                boilerplate_translations = self._translate_boilerplate(sorted(lines), budget, max_workers,
+                                                                       cancel_event)
 
+        page_layouts = []
+        page_chunks = []
+        page_reused = []
         for page_data in pages:
-            original_text = page_data['text']
+            with span('chunk', page=page_data['page'], chars=len(page_data['text'])) as attrs:
+                layout, chunks, reused = self._plan_page(page_data, budget, boilerplate_translations)
+                page_layouts.append(layout)
+                page_chunks.append(chunks)
+                page_reused.append(reused)
+                attrs['chunks'] = len(chunks)
+                attrs['passthrough_chars'] = sum(len(item) for item in layout if isinstance(item, str))
+                if reused:
+                    attrs['reused_paragraphs'] = len(reused)
 
-            # 如果文本太长，分块翻译
-            if len(original_text) > chunk_size:
-                translated_text = self._translate_long_text(original_text, chunk_size)
-            else:
-                translated_text = self.translate_text(original_text)
+        page_results = [[None] * len(chunks) for chunks in page_chunks]
+        remaining = [len(chunks) for chunks in page_chunks]
+        translated_pages = [None] * len(pages)
+        errors = []
+
+        def complete_page(page_index):
+            page_result = self._build_page_result(
+                pages[page_index], page_layouts[page_index], page_chunks[page_index], page_results[page_index]
+            )
+            translated_pages[page_index] = page_result
+            if on_segments:
+                segments = list(page_reused[page_index])
+                for chunk, (translated, error) in zip(page_chunks[page_index], page_results[page_index]):
+                    if not error:
+                        segments.extend(paragraph_pairs(chunk, translated))
+                on_segments(page_result['page'], segments)
+            PAGES.inc(status='error' if page_result.get('error') else 'done')
+            if on_page_done:
+                on_page_done(page_result)
+
+        def finish_chunk(page_index, chunk_index, translated, error):
+            page_results[page_index][chunk_index] = (translated, error)
+            remaining[page_index] -= 1
+            if remaining[page_index] == 0:
+                complete_page(page_index)
+
+        # 没有需要翻译内容的页面（如整页都是数字表格）直接完成
+        for page_index, chunks in enumerate(page_chunks):
+            if not chunks:
+                complete_page(page_index)
+
+        # 检查点中已有的分块直接使用保存的译文，只为其余分块规划请求
+        restored = set()
+        if checkpoint:
+            for page_index, chunks in enumerate(page_chunks):
+                for chunk_index, chunk in enumerate(chunks):
+                    translated = checkpoint.get((pages[page_index]['page'], chunk_hash(chunk)))
+                    if translated is not None:
+                        restored.add((page_index, chunk_index))
+                        finish_chunk(page_index, chunk_index, translated, None)
+
+        requests = [
+            [position for position in request if position not in restored]
+            for request in self._plan_requests(page_chunks, budget)
+        ]
+        requests = [request for request in requests if request]
+
+        def on_request_done(request_index, translations, request_errors):
+            for k, (page_index, chunk_index) in enumerate(requests[request_index]):
+                if request_errors[k]:
+                    errors.append(request_errors[k])
+                    finish_chunk(page_index, chunk_index, None, request_errors[k])
+                    continue
+
+                if on_chunk_done and remaining[page_index] > 1:
+                    chunk = page_chunks[page_index][chunk_index]
+                    on_chunk_done(pages[page_index]['page'], chunk_index, chunk_hash(chunk), translations[k])
+                finish_chunk(page_index, chunk_index, translations[k], None)
 
-            translated_pages.append({
-                'page': page_data['page'],
-                'original': original_text,
-                'translated': translated_text
-            })
+        request_delta = None
+        if on_delta:
+            def request_delta(request_index, delta):
+                page_index, chunk_index = requests[request_index][0]
+                on_delta(pages[page_index]['page'], chunk_index, delta)
+
+        texts = [[page_chunks[pi][ci] for pi, ci in request] for request in requests]
+        # 跟踪日志中的关联字段：单个分块记录页码和分块序号，批量请求记录所有页码
+        fields = [
+            {'page': pages[request[0][0]]['page'], 'chunk': request[0][1]} if len(request) == 1
+            else {'pages': list(dict.fromkeys(pages[pi]['page'] for pi, _ in request))}
+            for request in requests
+        ]
+        self._run_requests(texts, max_workers, on_request_done, cancel_event, request_delta, fields)
+
+        # 本次请求的分块全部失败时（例如网络或密钥问题），直接抛出第一个错误
+        if errors and len(errors) == sum(len(request) for request in requests):
+            raise errors[0]
 
         return translated_pages
 
-    def _translate_long_text(self, text: str, chunk_size: int) -> str:
+    def _plan_requests(self, page_chunks: List[List[str]], budget: int) -> List[List[Tuple[int, int]]]:
         """
-        处理长文本，分块翻译后合并
+        规划请求：每个请求是若干 (页面序号, 分块序号)
+        不超过预算1/4的连续短分块（同一页面内被数字、代码块隔开的文本，以及连续的短页面）
+        合并为一个批量请求（最多Config.BATCH_MAX_SEGMENTS个），长分块单独请求
         """
-        # 按段落分割
-        paragraphs = text.split('\n\n')
-        chunks = []
-        current_chunk = ""
+        positions = [(pi, ci) for pi, chunks in enumerate(page_chunks) for ci in range(len(chunks))]
+        if not Config.MERGE_SHORT_PAGES:
+            return [[position] for position in positions]
+
+        token_counts = [self._count_tokens(page_chunks[pi][ci]) for pi, ci in positions]
+        return [
+            [positions[i] for i in group]
+            for group in group_segments(token_counts, budget, budget // 4, Config.BATCH_MAX_SEGMENTS)
+        ]
+
+    def _plan_page(self, page_data: Dict, budget: int,
+                   boilerplate: Dict[str, str] = None) -> Tuple[List, List[str], List[Tuple[str, str]]]:
+        """
+        把页面分为需要翻译的分块和原样保留的文本，返回 (布局, 分块, 复用的段落)
+        布局按原顺序排列：字符串（包括各部分之间原有的分隔符）原样输出，整数n表示依次取n个分块的译文
+        按块提取的页面只翻译正文和标题块；纯数字、代码块和已是目标语言的块不发送给模型
+        修订版页面中page['reuse']给出译文的段落、以及boilerplate（{规整后的行: 译文}）中的重复行
+        直接使用已有译文，复用的段落以 (原文, 译文) 返回
+        """
+        # 各块、各段落之间原为空行分隔，按块或段落切分后重新组合时使用同样的分隔符
+        blocks = page_data.get('blocks')
+        reuse = page_data.get('reuse')
+        if blocks:
+            segments = [(block.text, block.kind in TRANSLATABLE_KINDS and self._is_translatable(block.text))
+                        for block in blocks]
+        elif reuse is not None:
+            # reuse按段落给出，整页文本需要同样按段落切分
+            segments = [(text, self._is_translatable(text)) for text in page_paragraphs(page_data)]
+        else:
+            segments = [(page_data['text'], self._is_translatable(page_data['text']))]
+
+        # 连续的同类块合并（原样保留、需要翻译、复用译文三类），需要翻译的部分按token预算切分
+        # merged中每组为 [组前的分隔符, 文本, 类型]，组内各部分之间保留原有的分隔符
+        merged = []
+        reused = []
+        for index, (text, translatable) in enumerate(segments):
+            separator = '\n\n' if index else ''
+            translated = reuse[index] if reuse is not None else None
+            if translated is None and boilerplate and translatable:
+                translated = boilerplate.get(normalize_line(text))
+            if translated is None and boilerplate and translatable and not blocks:
+                # 整页提取的文本中样板内容是单独的行，切出后其余各段重新判断是否需要翻译（如单独的页码），
+                # 各段之间保留原有的换行
+                parts = [(separator + part_separator if i == 0 else part_separator, part, part_translated,
+                          part_translated is None and self._is_translatable(part))
+                         for i, (part_separator, part, part_translated)
+                         in enumerate(split_boilerplate(text, boilerplate))]
+            else:
+                parts = [(separator, text, translated, translatable)]
 
-        for para in paragraphs:
-            if len(current_chunk) + len(para) < chunk_size:
-                current_chunk += para + '\n\n'
+            for part_separator, part, translated, part_translatable in parts:
+                if translated is not None:
+                    reused.append((part, translated))
+                    part, mode = translated, 'reuse'
+                else:
+                    mode = 'translate' if part_translatable else 'keep'
+                if merged and merged[-1][2] == mode:
+                    merged[-1][1] += part_separator + part
+                else:
+                    merged.append([part_separator, part, mode])
+
+        layout = []
+        chunks = []
+        for separator, text, mode in merged:
+            if separator:
+                layout.append(separator)
+            if mode == 'translate':
+                parts = self._split_text(text, budget)
+                chunks.extend(parts)
+                layout.append(len(parts))
             else:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                current_chunk = para + '\n\n'
+                layout.append(text)
+        return layout, chunks, reused
+
+    def _translate_boilerplate(self, lines: List[str], budget: int, max_workers: int = None,
+                               cancel_event: threading.Event = None) -> Dict[str, str]:
+        """
+        翻译重复出现的行，每行只请求一次（多行合并为批量请求），返回 {行: 译文}
+        翻译失败的行不返回，仍随所在页面一起翻译
+        """
+        lines = [line for line in lines if self._is_translatable(line)]
+        translations = {}
+        if not lines:
+            return translations
+
+        with span('boilerplate', lines=len(lines)) as attrs:
+            requests = [
+                [lines[i] for i in group]
+                for group in group_segments([self._count_tokens(line) for line in lines], budget, budget,
+                                            Config.BATCH_MAX_SEGMENTS)
+            ]
+
+            def on_request_done(request_index, results, errors):
+                for line, result, error in zip(requests[request_index], results, errors):
+                    if error is None:
+                        translations[line] = result
 
-        if current_chunk:
-            chunks.append(current_chunk.strip())
+            self._run_requests(requests, max_workers, on_request_done, cancel_event)
+            attrs['translated'] = len(translations)
+        return translations
 
-        # 翻译每个块
+    def _is_translatable(self, text: str) -> bool:
+        return is_translatable(text, self.source_language, self.target_language)
+
+    def _build_page_result(self, page_data: Dict, layout: List, chunks: List[str],
+                           results: List[Tuple[Optional[str], Optional[Exception]]]) -> Dict:
+        """
+        按布局合并页面各分块的译文和原样保留的文本，失败的分块保留原文
+        """
         translated_chunks = []
-        for chunk in chunks:
-            translated_chunks.append(self.translate_text(chunk))
+        page_errors = []
+        for chunk, (translated, error) in zip(chunks, results):
+            if error:
+                translated_chunks.append(chunk)
+                page_errors.append(str(error))
+            else:
+                translated_chunks.append(translated)
+
+        parts = []
+        position = 0
+        for item in layout:
+            if isinstance(item, str):
+                parts.append(item)
+            else:
+                # 同一段文本按段落切出的分块之间为空行
+                parts.append('\n\n'.join(translated_chunks[position:position + item]))
+                position += item
+
+        page_result = {
+            'page': page_data['page'],
+            'original': page_data['text'],
+            'translated': ''.join(parts)
+        }
+        if page_errors:
+            page_result['error'] = '; '.join(page_errors)
+        return page_result
+
+    def _count_tokens(self, text: str) -> int:
+        return estimate_tokens(text, self.model)
+
+    def _split_text(self, text: str, budget: int) -> List[str]:
+        """
+        按段落将文本切分为不超过budget个token的分块，短文本直接作为一个分块
+        """
+        return chunk_text(text, budget, self._count_tokens)
+
+    def _translate_texts(self, texts: List[str], on_delta: Callable[[str], None] = None
+                         ) -> Tuple[List[Optional[str]], List[Optional[Exception]]]:
+        """
+        翻译一个请求中的片段：先查翻译记忆，大部分句子已命中时只翻译缺失的句子，
+        其余单个片段带参考译文整段翻译，多个片段走批量请求；新译文写回翻译记忆
+        返回 (各片段译文, 各片段异常)，单个片段失败不影响同一请求中的其他片段
+        """
+        results = [None] * len(texts)
+        errors = [None] * len(texts)
+        references = [None] * len(texts)
+        if self.memory:
+            for i, text in enumerate(texts):
+                try:
+                    results[i], references[i] = self._memory_translate(text)
+                except Exception as e:
+                    errors[i] = e
+
+        missing = [i for i, result in enumerate(results) if result is None and errors[i] is None]
+        if len(missing) > 1:
+            translated, batch_errors = self.translate_batch([texts[i] for i in missing])
+            for i, result, error in zip(missing, translated, batch_errors):
+                results[i], errors[i] = result, error
+        elif missing:
+            i = missing[0]
+            try:
+                if on_delta is None:
+                    results[i] = self.translate_text(texts[i], references=references[i])
+                else:
+                    parts = []
+                    for delta in self.translate_text_stream(texts[i], references=references[i]):
+                        parts.append(delta)
+                        on_delta(delta)
+                    results[i] = ''.join(parts).strip()
+            except Exception as e:
+                errors[i] = e
+        elif on_delta is not None and results[0] is not None:
+            # 翻译记忆已给出结果，一次性推送
+            on_delta(results[0])
+
+        if self.memory:
+            for i in missing:
+                if errors[i] is None:
+                    self.memory.add_translation(texts[i], results[i], self.source_language, self.target_language)
+
+        return results, errors
+
+    def _memory_translate(self, text: str) -> Tuple[Optional[str], List[Dict]]:
+        """
+        查询翻译记忆，返回 (译文, 参考译文)
+        整段有精确匹配时直接使用；每个句子都有精确匹配时直接拼接译文；至少一半句子命中时只翻译缺失的句子再拼接；
+        否则返回 (None, 参考译文)，由调用方整段翻译，参考译文包括已命中的句子和相似句子
+        """
+        target = self.memory.lookup(text, self.source_language, self.target_language)
+        if target is not None:
+            return target, []
+
+        segments = segment_sentences(text)
+        targets = []
+        references = []
+
+        for sentence, _ in segments:
+            target = self.memory.lookup(sentence, self.source_language, self.target_language)
+            targets.append(target)
+            if target is not None:
+                references.append({'source': sentence, 'target': target, 'score': 1.0})
+            else:
+                references.extend(self.memory.find_similar(
+                    sentence, self.source_language, self.target_language
+                ))
+
+        # 去重后保留相似度最高的若干条
+        unique = {}
+        for ref in sorted(references, key=lambda r: r['score'], reverse=True):
+            unique.setdefault(ref['source'], {'source': ref['source'], 'target': ref['target']})
+        references = list(unique.values())[:Config.MEMORY_MAX_REFERENCES]
+
+        missing = [i for i, target in enumerate(targets) if target is None]
+        if not segments or len(missing) * 2 > len(segments):
+            return None, references
+
+        if len(missing) == 1:
+            sentence = segments[missing[0]][0]
+            targets[missing[0]] = self.translate_text(sentence, references=references)
+        elif missing:
+            translated, errors = self.translate_batch([segments[i][0] for i in missing])
+            # 缺失的句子有一句失败时整段按失败处理
+            for error in errors:
+                if error:
+                    raise error
+            for i, target in zip(missing, translated):
+                targets[i] = target
+
+        for i in missing:
+            self.memory.add(segments[i][0], targets[i], self.source_language, self.target_language)
+
+        return ''.join(target + trailing for target, (_, trailing) in zip(targets, segments)).strip(), []
+
+    def _run_requests(self, requests: List[List[str]], max_workers: int,
+                      on_request_done: Callable[[int, List[Optional[str]], List[Optional[Exception]]], None],
+                      cancel_event: threading.Event = None,
+                      on_request_delta: Callable[[int, str], None] = None,
+                      request_fields: List[Dict] = None):
+        """
+        并发执行翻译请求（每个请求包含一个或多个片段），
+        每完成一个请求就在调用线程中回调 on_request_done(序号, 各片段译文, 各片段异常)，
+        失败的片段译文为None、异常不为None，同一请求中的其他片段不受影响
+        传入on_request_delta时单片段请求改用流式接口，在工作线程中回调 on_request_delta(序号, 增量文本)
+        request_fields为每个请求附加到跟踪日志的关联字段（如页码、分块序号）
+        """
+        max_workers = max(1, max_workers or Config.MAX_CONCURRENCY)
+
+        def run(index, texts):
+            fields = request_fields[index] if request_fields else {}
+            try:
+                on_delta = None
+                if on_request_delta is not None and len(texts) == 1:
+                    on_delta = lambda delta: on_request_delta(index, delta)
+                with trace_context(**fields):
+                    return self._translate_texts(texts, on_delta)
+            except Exception as e:
+                return [None] * len(texts), [e] * len(texts)
+
+        def check_cancelled():
+            if cancel_event is not None and cancel_event.is_set():
+                raise TranslationCancelled("翻译已取消")
+
+        if max_workers == 1 or len(requests) <= 1:
+            for index, texts in enumerate(requests):
+                check_cancelled()
+                on_request_done(index, *run(index, texts))
+            return
+
+        executor = ThreadPoolExecutor(max_workers=min(max_workers, len(requests)))
+        try:
+            # 每个任务复制一份当前上下文，使工作线程继承job_id等跟踪字段
+            futures = {
+                executor.submit(contextvars.copy_context().run, run, index, texts): index
+                for index, texts in enumerate(requests)
+            }
+            pending = set(futures)
+            while pending:
+                check_cancelled()
+                done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in done:
+                    on_request_done(futures[future], *future.result())
+        finally:
+            # 取消或出错时丢弃尚未开始的请求
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+_translator = None
+_translator_lock = threading.Lock()
+
+
+def get_translator() -> PDFTranslator:
+    """
+    获取进程内共享的翻译器（无请求级状态，可被多个线程同时使用）
+    """
+    global _translator
 
-        return '\n\n'.join(translated_chunks)
+    with _translator_lock:
+        if _translator is None:
+            _translator = PDFTranslator()
+        return _translator
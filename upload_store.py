@@ -0,0 +1,230 @@
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import BinaryIO, Dict, Optional, Tuple
+
+from config import Config
+
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    """上传请求不合法（偏移不一致、超出声明大小、不是PDF等）"""
+
+    def __init__(self, message: str, status: int = 400, offset: int = None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+class UploadStore:
+    """
+    按内容哈希保存上传文件（UPLOAD_FOLDER/<sha256>.pdf），相同内容只保存一份
+    支持可续传的分块上传：会话记录在SQLite中，已接收的数据追加写入 .partial/<upload_id>.part，
+    边接收边计算SHA-256，整个过程内存占用与文件大小无关
+    """
+
+    def __init__(self, upload_folder: str, db_path: str, session_ttl: float = 24 * 3600):
+        self.upload_folder = upload_folder
+        self.partial_folder = os.path.join(upload_folder, '.partial')
+        self.session_ttl = session_ttl
+        self._lock = threading.Lock()
+        self._upload_locks = {}
+        # 进行中会话的增量哈希 upload_id -> (已哈希的字节数, hashlib对象)，进程重启后从分块文件重建
+        self._hashers = {}
+
+        os.makedirs(self.partial_folder, exist_ok=True)
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS uploads ('
+            ' upload_id TEXT PRIMARY KEY,'
+            ' filename TEXT NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' received INTEGER NOT NULL DEFAULT 0,'
+            ' created_at REAL NOT NULL,'
+            ' updated_at REAL NOT NULL)'
+        )
+        self._conn.commit()
+
+    def content_path(self, file_id: str) -> str:
+        return os.path.join(self.upload_folder, f"{file_id}.pdf")
+
+    def has_content(self, file_id: str) -> bool:
+        return os.path.exists(self.content_path(file_id))
+
+    def save_stream(self, stream: BinaryIO) -> Tuple[str, str]:
+        """
+        一次性上传：从流中按块读取，边写临时文件边计算哈希，返回 (file_id, 文件路径)
+        """
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=self.partial_folder, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for block in iter(lambda: stream.read(READ_BLOCK_SIZE), b''):
+                    digest.update(block)
+                    f.write(block)
+            return self._store(temp_path, digest.hexdigest())
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def create_session(self, filename: str, size: int) -> Dict:
+        """创建分块上传会话"""
+        if size <= 0:
+            raise UploadError('文件大小无效')
+        if size > Config.MAX_UPLOAD_SIZE:
+            raise UploadError(f"文件超过大小上限（{Config.MAX_UPLOAD_SIZE // (1024 * 1024)}MB）", status=413)
+
+        self.cleanup_expired()
+        upload_id = uuid.uuid4().hex
+        now = time.time()
+        open(self._partial_path(upload_id), 'wb').close()
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO uploads (upload_id, filename, size, received, created_at, updated_at) '
+                'VALUES (?, ?, ?, 0, ?, ?)',
+                (upload_id, filename, size, now, now)
+            )
+            self._conn.commit()
+        return {'upload_id': upload_id, 'filename': filename, 'size': size, 'offset': 0}
+
+    def get_session(self, upload_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT filename, size, received FROM uploads WHERE upload_id = ?', (upload_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'upload_id': upload_id, 'filename': row[0], 'size': row[1], 'offset': row[2]}
+
+    def append(self, upload_id: str, offset: int, stream: BinaryIO) -> Dict:
+        """
+        从offset处追加一个分块，offset必须等于已接收的字节数（否则返回409和服务端的偏移，客户端据此续传）
+        全部接收后返回的会话中带有file_id
+        """
+        with self._upload_lock(upload_id):
+            session = self.get_session(upload_id)
+            if session is None:
+                with self._lock:
+                    self._upload_locks.pop(upload_id, None)
+                raise UploadError('上传会话不存在或已过期', status=404)
+            if offset != session['offset']:
+                raise UploadError('上传偏移不一致', status=409, offset=session['offset'])
+
+            hasher = self._get_hasher(upload_id, session['offset'])
+            received = session['offset']
+            try:
+                with open(self._partial_path(upload_id), 'r+b') as f:
+                    # 丢弃上次中断时可能写入但未记录的数据
+                    f.truncate(received)
+                    f.seek(received)
+                    for block in iter(lambda: stream.read(READ_BLOCK_SIZE), b''):
+                        if received + len(block) > session['size']:
+                            raise UploadError('上传数据超过声明的文件大小')
+                        f.write(block)
+                        hasher.update(block)
+                        received += len(block)
+            finally:
+                # 连接中断时保留已写入的数据，客户端查询偏移后从断点续传
+                self._hashers[upload_id] = (received, hasher)
+                with self._lock:
+                    self._conn.execute(
+                        'UPDATE uploads SET received = ?, updated_at = ? WHERE upload_id = ?',
+                        (received, time.time(), upload_id)
+                    )
+                    self._conn.commit()
+            session['offset'] = received
+
+            if received == session['size']:
+                session['file_id'], _ = self._complete(upload_id, hasher.hexdigest())
+            return session
+
+    def _complete(self, upload_id: str, file_id: str) -> Tuple[str, str]:
+        try:
+            return self._store(self._partial_path(upload_id), file_id)
+        finally:
+            self._discard(upload_id)
+
+    def _store(self, temp_path: str, file_id: str) -> Tuple[str, str]:
+        """校验PDF文件头后按哈希落盘，已有相同内容时直接丢弃临时文件"""
+        with open(temp_path, 'rb') as f:
+            if not f.read(1024).lstrip().startswith(b'%PDF'):
+                raise UploadError('文件不是有效的PDF')
+
+        path = self.content_path(file_id)
+        if not os.path.exists(path):
+            shutil.move(temp_path, path)
+        return file_id, path
+
+    def _get_hasher(self, upload_id: str, offset: int):
+        cached = self._hashers.get(upload_id)
+        if cached and cached[0] == offset:
+            return cached[1]
+
+        # 进程重启或会话由其他进程处理过时，从已接收的数据重新计算
+        hasher = hashlib.sha256()
+        remaining = offset
+        with open(self._partial_path(upload_id), 'rb') as f:
+            while remaining > 0:
+                block = f.read(min(READ_BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                hasher.update(block)
+                remaining -= len(block)
+        return hasher
+
+    def cleanup_expired(self):
+        """删除超过session_ttl未更新的上传会话及其分块文件"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT upload_id FROM uploads WHERE updated_at < ?', (time.time() - self.session_ttl,)
+            ).fetchall()
+        for (upload_id,) in rows:
+            self._discard(upload_id)
+
+    def _discard(self, upload_id: str):
+        self._hashers.pop(upload_id, None)
+        with self._lock:
+            self._conn.execute('DELETE FROM uploads WHERE upload_id = ?', (upload_id,))
+            self._conn.commit()
+            self._upload_locks.pop(upload_id, None)
+        path = self._partial_path(upload_id)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def _partial_path(self, upload_id: str) -> str:
+        return os.path.join(self.partial_folder, f"{upload_id}.part")
+
+    def _upload_lock(self, upload_id: str) -> threading.Lock:
+        with self._lock:
+            return self._upload_locks.setdefault(upload_id, threading.Lock())
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_upload_store() -> UploadStore:
+    """
+    获取进程内共享的上传存储
+    """
+    global _store
+
+    with _store_lock:
+        if _store is None:
+            _store = UploadStore(
+                Config.UPLOAD_FOLDER,
+                os.path.join(Config.DATA_FOLDER, 'uploads.db'),
+                session_ttl=Config.UPLOAD_SESSION_TTL
+            )
+        return _store
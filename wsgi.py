@@ -0,0 +1,55 @@
+"""
+生产环境入口：gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import threading
+
+from app import SHUTDOWN_EVENT, app
+from chunker import estimate_tokens
+from client_pool import close_client_pool, get_client_pool
+from config import Config
+from document_store import get_document_store
+from job_manager import get_job_manager, shutdown_job_manager
+from translator import get_translator
+from upload_store import get_upload_store
+
+_drain_thread = None
+
+
+def warm_up():
+    """
+    启动预热：创建共享客户端（连接池和代理检查）、翻译器、缓存和各存储，并加载分词器，
+    使第一个请求不承担初始化开销；任务管理器创建时从检查点继续上次中断的任务
+    """
+    get_document_store()
+    get_upload_store()
+    if Config.API_KEY:
+        get_client_pool()
+        get_translator()
+        get_job_manager()
+    estimate_tokens('warm up', Config.MODEL)
+
+
+def begin_shutdown():
+    """
+    开始平滑停止（收到SIGTERM时调用）：结束SSE连接，并在后台线程中等待进行中的后台任务
+    最多SERVER_GRACEFUL_TIMEOUT秒，与gunicorn等待进行中的请求同时进行；
+    仍未完成的任务保留检查点、下次启动时自动继续
+    信号处理和worker_exit都在主线程中执行，不需要加锁
+    """
+    global _drain_thread
+
+    if _drain_thread is None:
+        SHUTDOWN_EVENT.set()
+        _drain_thread = threading.Thread(
+            target=shutdown_job_manager, args=(Config.SERVER_GRACEFUL_TIMEOUT,), daemon=True
+        )
+        _drain_thread.start()
+
+
+def shutdown():
+    """
+    进程退出前执行：等待后台任务停止（未收到SIGTERM时在这里开始），然后关闭共享客户端
+    """
+    begin_shutdown()
+    _drain_thread.join()
+    close_client_pool()